@@ -7,6 +7,7 @@ from langgraph.store.base import BaseStore  # NEW
 
 from my_agent.features.web_search import llm_and_messages_for_config  # existing
 from my_agent.utils.checkpointer import make_checkpointer              # existing
+from my_agent.utils.tracing import TRACER, trace_from_config
 
 # NEW: long-term memory helpers
 from my_agent.features.lt_memory import (
@@ -39,37 +40,43 @@ def chat_node(
     - Optionally prepends memory system tip based on semantic search (pgvector).
     - Decides which LLM to use (with or without web_search bound).
     - Invokes the LLM and, after completion, writes new memories (user + episodic).
+    Each step is a span under the gateway's trace when one was passed in config.
     """
-    # 0) Derive config bits (user/thread)
+    # 0) Derive config bits (user/thread/trace)
     cfg = (config or {}).get("configurable") or {}
     user_id: Optional[str] = cfg.get("user_id")
     thread_id: Optional[str] = cfg.get("thread_id")
 
-    # 1) Choose LLM (web_search feature unchanged)
-    llm, messages = llm_and_messages_for_config(config, state["messages"])
+    with TRACER.span("chat_node", trace_from_config(config), thread_id=thread_id) as trace:
+        # 1) Choose LLM (web_search feature unchanged)
+        llm, messages = llm_and_messages_for_config(config, state["messages"])
 
-    # 2) Retrieve memories (semantic search) and prepend as a compact system tip
-    last_user_text = _last_user_text(state["messages"])
-    if store is not None and user_id and last_user_text:
-        hits = search_relevant_memories(store, user_id, last_user_text, k_user=4, k_episodic=4)
-        tip = memory_context_system_message(hits, max_chars=900)
-        if tip is not None:
-            messages = [tip] + list(messages)
+        # 2) Retrieve memories (semantic search) and prepend as a compact system tip
+        last_user_text = _last_user_text(state["messages"])
+        if store is not None and user_id and last_user_text:
+            with TRACER.span("memory_search", trace):
+                hits = search_relevant_memories(store, user_id, last_user_text, k_user=4, k_episodic=4)
+            tip = memory_context_system_message(hits, max_chars=900)
+            if tip is not None:
+                messages = [tip] + list(messages)
 
-    # 3) Invoke LLM with full message list (preserve config!)
-    ai_msg = llm.invoke(messages, config=config)
+        # 3) Invoke LLM with full message list (preserve config!)
+        with TRACER.span("llm", trace, web_search=bool(cfg.get("web_search"))):
+            ai_msg = llm.invoke(messages, config=config)
 
-    # 4) After completion, write memories (best-effort; never block)
-    if store is not None and user_id and last_user_text:
-        try:
-            maybe_write_user_memories(store, user_id, thread_id, last_user_text)
-        except Exception:
-            pass
-        try:
-            ai_text = getattr(ai_msg, "content", "") or ""
-            write_episodic_summary(store, user_id, thread_id, last_user_text, ai_text)
-        except Exception:
-            pass
+        # 4) After completion, write memories (best-effort; never block)
+        if store is not None and user_id and last_user_text:
+            try:
+                with TRACER.span("maybe_write_user_memories", trace):
+                    maybe_write_user_memories(store, user_id, thread_id, last_user_text)
+            except Exception:
+                pass
+            try:
+                ai_text = getattr(ai_msg, "content", "") or ""
+                with TRACER.span("write_episodic_summary", trace):
+                    write_episodic_summary(store, user_id, thread_id, last_user_text, ai_text)
+            except Exception:
+                pass
 
     return {"messages": [ai_msg]}
 
@@ -0,0 +1,129 @@
+# apps/agent-langgraph/my_agent/utils/tracing.py
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import secrets
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator, Mapping, Optional
+
+# Agent-side spans for the trace the gateway started.
+#
+# This is a self-contained copy of the agent half of prynai_shared.trace. The
+# LangGraph Platform build only packages this project directory, so the agent
+# can't depend on ../../packages. The two sides share only a wire contract:
+#   - config["configurable"]["trace_id"] / ["parent_span_id"], set by the gateway;
+#   - one JSON object per span, in the shape of prynai_shared.trace.Span.to_dict()
+#     (trace_id, span_id, parent_id, name, service, start, duration_ms, status, attrs).
+# Keep both in step with packages/prynai_shared/src/prynai_shared/trace.py.
+#
+# Runs started without a trace id (Studio, direct SDK calls) are not traced.
+# Export (env, same names as the gateway):
+#   PRYNAI_TRACE_EXPORT          "jsonl" (default) | "off"
+#   PRYNAI_TRACE_FILE            default $TMPDIR/prynai-traces.jsonl
+#   PRYNAI_TRACE_FILE_MAX_BYTES  rotate to <path>.1 past this size (default 32 MiB)
+# Share the file with the gateway (same PRYNAI_TRACE_FILE) and its
+# /debug/traces/{trace_id} shows both halves of a turn. Otherwise ship it next
+# to the gateway's and join on trace_id.
+
+CONFIG_TRACE_ID = "trace_id"
+CONFIG_PARENT_SPAN_ID = "parent_span_id"
+
+TRACE_EXPORT = os.getenv("PRYNAI_TRACE_EXPORT", "jsonl").lower()
+TRACE_FILE = os.getenv("PRYNAI_TRACE_FILE") or os.path.join(tempfile.gettempdir(), "prynai-traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("PRYNAI_TRACE_FILE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+@dataclass(frozen=True)
+class TraceContext:
+    """Where new spans attach: a trace id plus the span that will be their parent."""
+
+    trace_id: str
+    span_id: Optional[str] = None
+
+    def child(self) -> "TraceContext":
+        return TraceContext(self.trace_id, secrets.token_hex(8))
+
+
+def trace_from_config(config: Optional[Mapping[str, Any]]) -> Optional[TraceContext]:
+    cfg = (config or {}).get("configurable") or {}
+    tid = cfg.get(CONFIG_TRACE_ID)
+    if not tid:
+        return None
+    return TraceContext(str(tid), cfg.get(CONFIG_PARENT_SPAN_ID) or None)
+
+
+class _JsonlFile:
+    """Append-only span file, rotated to <path>.1 past max_bytes; opened on first use."""
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max(1, max_bytes)
+        self._lock = threading.Lock()  # nodes may run in worker threads
+        self._f = None
+
+    def write(self, line: str) -> None:
+        with self._lock:
+            if self._f is not None:
+                st = os.fstat(self._f.fileno())
+                try:
+                    moved = os.stat(self.path).st_ino != st.st_ino
+                except OSError:
+                    moved = True
+                if st.st_size >= self.max_bytes or moved:
+                    self._f.close()
+                    self._f = None
+                    try:
+                        if os.path.getsize(self.path) >= self.max_bytes:
+                            os.replace(self.path, self.path + ".1")
+                    except OSError:
+                        pass
+            if self._f is None:
+                self._f = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._f.write(line)
+
+
+class Tracer:
+    def __init__(self, service: str, out: Optional[_JsonlFile]) -> None:
+        self.service = service
+        self.out = out
+
+    @contextmanager
+    def span(self, name: str, ctx: Optional[TraceContext], **attrs: Any) -> Iterator[Optional[TraceContext]]:
+        """Time the block as a child of `ctx`; yields the context for nested spans (None if untraced)."""
+        if ctx is None or self.out is None:
+            yield None
+            return
+        inner = ctx.child()
+        wall, t0 = time.time(), time.perf_counter()
+        status = "ok"
+        try:
+            yield inner
+        except BaseException as e:
+            status = "error"
+            attrs.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            span = {
+                "trace_id": ctx.trace_id,
+                "span_id": inner.span_id,
+                "parent_id": ctx.span_id,
+                "name": name,
+                "service": self.service,
+                "start": round(wall, 6),
+                "duration_ms": round((time.perf_counter() - t0) * 1000.0, 3),
+                "status": status,
+                "attrs": {k: v for k, v in attrs.items() if v is not None},
+            }
+            try:
+                self.out.write(json.dumps(span, separators=(",", ":"), default=str) + "\n")
+            except Exception as e:  # tracing must never break a run
+                print(json.dumps({"type": "trace_export_error", "err": str(e)}), file=sys.stderr, flush=True)
+
+
+TRACER = Tracer("agent", None if TRACE_EXPORT == "off" else _JsonlFile(TRACE_FILE, TRACE_FILE_MAX_BYTES))
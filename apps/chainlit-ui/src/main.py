@@ -2,25 +2,29 @@ import os, json, mimetypes
 import httpx
 import chainlit as cl
 from threads_client import ensure_active_thread, get_thread, ensure_title, list_messages
-from threads_client import APIError
+from threads_client import APIError, cancel_run
 
 from settings_websearch import inject_settings_ui, is_web_search_enabled
 from threads_client import ensure_active_thread, get_thread, ensure_title, list_messages
 from sse_utils import iter_sse_events
 
 GATEWAY_BASE = os.environ.get("GATEWAY_URL", "http://localhost:8080")
+RESUME_MESSAGES = int(os.environ.get("UI_RESUME_MESSAGES", "20"))  # one screenful
 
 def _active_thread_id() -> str | None: return cl.user_session.get("thread_id")
 def _set_active_thread_id(tid: str | None) -> None: cl.user_session.set("thread_id", tid if tid else None)
 
 async def _render_transcript(thread_id: str):
     try:
-        msgs = await list_messages(thread_id)
+        page = await list_messages(thread_id, limit=RESUME_MESSAGES)
     except APIError as e:
         # Auth expired: show a clear call to action; don't switch threads.
         await cl.Message("Your session expired. Please **[sign in again](/auth/)** to load this conversation.").send()
         return
+    msgs = page.messages
     if not msgs: return
+    if page.before is not None:
+        await cl.Message(content=f"_Showing the last {len(msgs)} of {page.total} messages._").send()
     for m in msgs:
         role = (m.get("role") or "").lower()
         content = m.get("content") or ""
@@ -67,6 +71,23 @@ def _collect_uploads(message: cl.Message):
         out.append({"name": name, "path": p, "mime": mime})
     return out
 
+def _resume_url(resp) -> str | None:
+    """Where to reconnect (with Last-Event-ID) if this chat stream drops mid-answer."""
+    sid = resp.headers.get("x-stream-id")
+    return f"{GATEWAY_BASE.rstrip('/')}/api/chat/streams/{sid}" if sid else None
+
+async def _queue_notice(notice, data: str):
+    """Show / clear the 'waiting for a slot' note driven by the gateway's `queued` events."""
+    try: pos = int(json.loads(data).get("position") or 0)
+    except Exception: pos = 0
+    if pos:
+        if notice is None:
+            notice = cl.Message(content=f"_The assistant is busy; you're #{pos} in line…_")
+            await notice.send()
+        return notice
+    if notice is not None: await notice.remove()
+    return None
+
 @cl.on_message
 async def handle_message(message: cl.Message):
     if not _active_thread_id():
@@ -88,6 +109,7 @@ async def handle_message(message: cl.Message):
 
     uploads = _collect_uploads(message)
     out = cl.Message(content=""); await out.send()
+    notice = None  # queue position note (gateway admission control)
 
     try:
         async with httpx.AsyncClient(timeout=None) as client:
@@ -100,12 +122,18 @@ async def handle_message(message: cl.Message):
                 form = {"payload": json.dumps(payload)}
                 url = f"{GATEWAY_BASE.rstrip('/')}/api/chat/stream_files"
                 async with client.stream("POST", url, data=form, files=files, headers=headers) as resp:
+                    if resp.status_code == 429:
+                        wait = resp.headers.get("retry-after") or "a few"
+                        await cl.Message(content=f"**The assistant is busy.** Please try again in {wait} seconds.").send()
+                        return
                     if resp.status_code >= 400:
                         body = (await resp.aread()).decode("utf-8", errors="ignore")[:500]
                         await cl.Message(content=f"**Gateway error {resp.status_code}:** {body}").send()
                         return
-                    async for event, data in iter_sse_events(resp):
+                    async for event, data in iter_sse_events(resp, client=client, resume_url=_resume_url(resp), headers=headers):
                         if event == "done": break
+                        elif event == "run": cl.user_session.set("run_id", data)
+                        elif event == "queued": notice = await _queue_notice(notice, data)
                         elif event == "policy": await cl.Message(content=f"**Safety notice:** {data}").send()
                         elif event == "error": await cl.Message(content=f"**Error:** {data}").send()
                         else: await out.stream_token(data)
@@ -113,12 +141,18 @@ async def handle_message(message: cl.Message):
                 # Existing JSON streaming path (unchanged)
                 url = f"{GATEWAY_BASE.rstrip('/')}/api/chat/stream"
                 async with client.stream("POST", url, json=payload, headers=headers) as resp:
+                    if resp.status_code == 429:
+                        wait = resp.headers.get("retry-after") or "a few"
+                        await cl.Message(content=f"**The assistant is busy.** Please try again in {wait} seconds.").send()
+                        return
                     if resp.status_code >= 400:
                         body = (await resp.aread()).decode("utf-8", errors="ignore")[:500]
                         await cl.Message(content=f"**Gateway error {resp.status_code}:** {body}").send()
                         return
-                    async for event, data in iter_sse_events(resp):
+                    async for event, data in iter_sse_events(resp, client=client, resume_url=_resume_url(resp), headers=headers):
                         if event == "done": break
+                        elif event == "run": cl.user_session.set("run_id", data)
+                        elif event == "queued": notice = await _queue_notice(notice, data)
                         elif event == "policy": await cl.Message(content=f"**Safety notice:** {data}").send()
                         elif event == "error": await cl.Message(content=f"**Error:** {data}").send()
                         else: await out.stream_token(data)
@@ -126,7 +160,18 @@ async def handle_message(message: cl.Message):
     except Exception as e:
         await cl.Message(content=f"**Error:** {e}").send()
     finally:
+        cl.user_session.set("run_id", None)
+        if notice is not None:
+            try: await notice.remove()
+            except Exception: pass
         # Clean up Chainlit temp files immediately (session-only ingestion)
         for u in uploads:
             try: os.remove(u["path"])
-            except Exception: pass
\ No newline at end of file
+            except Exception: pass
+
+@cl.on_stop
+async def on_stop():
+    # Stop button: cancel the agent run upstream (closing the stream alone also does it)
+    run_id = cl.user_session.get("run_id")
+    if run_id:
+        await cancel_run(run_id, _active_thread_id())
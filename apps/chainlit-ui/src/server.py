@@ -127,9 +127,19 @@ async def ui_list_threads(request: Request):
     authz = _bearer_from_request(request)
     if not authz:
         return JSONResponse({"error": "unauthenticated"}, status_code=401)
+    # Pass paging + conditional-GET through: an unchanged sidebar is a bodiless 304
+    params = {"limit": request.query_params.get("limit") or "50"}
+    if request.query_params.get("cursor"):
+        params["cursor"] = request.query_params["cursor"]
+    headers = {"authorization": authz}
+    if request.headers.get("if-none-match"):
+        headers["if-none-match"] = request.headers["if-none-match"]
     async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(f"{GATEWAY}/api/threads?limit=50", headers={"authorization": authz})
-    return JSONResponse(r.json(), status_code=r.status_code)
+        r = await client.get(f"{GATEWAY}/api/threads", params=params, headers=headers)
+    passthrough = {k: r.headers[k] for k in ("etag", "x-next-cursor", "cache-control") if k in r.headers}
+    if r.status_code == 304:
+        return Response(status_code=304, headers=passthrough)
+    return JSONResponse(r.json(), status_code=r.status_code, headers=passthrough)
 
 @app.post("/ui/threads")
 async def ui_create_thread(request: Request):
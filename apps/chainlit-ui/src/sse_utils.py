@@ -1,19 +1,28 @@
 # apps/chainlit-ui/src/sse_utils.py
 from __future__ import annotations
-from typing import AsyncGenerator, Tuple
+import asyncio
+from dataclasses import dataclass
+from typing import AsyncGenerator, Dict, Optional, Tuple
 
-async def iter_sse_events(resp) -> AsyncGenerator[Tuple[str, str], None]:
-    """
-    Parse a Server-Sent Events (SSE) stream and yield (event, data) tuples.
+import httpx
 
-    Behavior:
-    - Collects consecutive 'data:' lines and flushes on a blank line.
-    - Preserves all original newlines and spaces inside the event data.
-    - Trims at most a single space after 'data:' per SSE spec.
-    - Defaults to event='message' if none is set.
-    """
+# Transport failures that mean "the connection dropped", not "the gateway said no"
+_DROPPED = (httpx.RemoteProtocolError, httpx.ReadError, httpx.ReadTimeout, httpx.ConnectError, httpx.WriteError)
+
+
+@dataclass
+class SSEState:
+    """Per-stream parser state that survives reconnects (SSE 'last event ID')."""
+    last_event_id: Optional[str] = None
+    retry_ms: Optional[int] = None
+    done: bool = False
+
+
+async def _parse(resp, state: SSEState) -> AsyncGenerator[Tuple[str, str], None]:
     event = "message"
     buf: list[str] = []
+    has_data = False
+    pending_id: Optional[str] = None
 
     async for raw in resp.aiter_lines():
         if raw is None:
@@ -22,9 +31,17 @@ async def iter_sse_events(resp) -> AsyncGenerator[Tuple[str, str], None]:
 
         if line == "":
             # Blank line: end of the current event
-            data = "\n".join(buf)
-            yield event, data
-            event, buf = "message", []
+            if pending_id is not None:
+                state.last_event_id = pending_id
+                pending_id = None
+            if has_data:
+                if event == "done":
+                    state.done = True
+                yield event, "\n".join(buf)
+            event, buf, has_data = "message", [], False
+            continue
+
+        if line.startswith(":"):
             continue
 
         if line.startswith("event:"):
@@ -38,8 +55,90 @@ async def iter_sse_events(resp) -> AsyncGenerator[Tuple[str, str], None]:
             if val.startswith(" "):
                 val = val[1:]
             buf.append(val)
+            has_data = True
+            continue
+
+        if line.startswith("id:"):
+            val = line[3:].lstrip(" ")
+            if "\0" not in val:
+                pending_id = val
+            continue
+
+        if line.startswith("retry:"):
+            val = line[6:].strip()
+            if val.isdigit():
+                state.retry_ms = int(val)
             continue
 
     # Flush any trailing buffered data if stream ends without a blank line
-    if buf:
-        yield event, "\n".join(buf)
\ No newline at end of file
+    if has_data:
+        if pending_id is not None:
+            state.last_event_id = pending_id
+        if event == "done":
+            state.done = True
+        yield event, "\n".join(buf)
+
+
+async def iter_sse_events(
+    resp,
+    *,
+    client: Optional[httpx.AsyncClient] = None,
+    resume_url: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    max_reconnects: int = 5,
+) -> AsyncGenerator[Tuple[str, str], None]:
+    """
+    Parse a Server-Sent Events (SSE) stream and yield (event, data) tuples.
+
+    Behavior:
+    - Collects consecutive 'data:' lines and flushes on a blank line.
+    - Preserves all original newlines and spaces inside the event data.
+    - Trims at most a single space after 'data:' per SSE spec.
+    - Defaults to event='message' if none is set.
+    - Comment lines (': keep-alive' heartbeats) are ignored; a block without any
+      'data:' line is not dispatched (per spec).
+    - Tracks 'id:' (last event id) and 'retry:'.
+
+    Reconnect: with `client` and `resume_url` (the gateway's
+    /api/chat/streams/{X-Stream-Id}), a connection that drops before the 'done'
+    event is reopened with Last-Event-ID, up to `max_reconnects` times in a row;
+    the gateway replays only the missed events, so nothing is seen twice.
+    """
+    state = SSEState()
+    attempts = 0
+    owned = None  # reconnected responses are closed here; the first one by the caller
+    try:
+        while True:
+            try:
+                async for item in _parse(resp, state):
+                    attempts = 0
+                    yield item
+            except _DROPPED:
+                if client is None or not resume_url:
+                    raise
+            if state.done or client is None or not resume_url:
+                return
+            if attempts >= max_reconnects:
+                raise httpx.RemoteProtocolError("stream dropped; resume attempts exhausted")
+            attempts += 1
+            await asyncio.sleep(min(5.0, (state.retry_ms or 500) / 1000.0 * attempts))
+            if owned is not None:
+                await owned.aclose()
+                owned = None
+            h = dict(headers or {})
+            h["accept"] = "text/event-stream"
+            if state.last_event_id:
+                h["last-event-id"] = state.last_event_id
+            try:
+                owned = await client.send(client.build_request("GET", resume_url, headers=h), stream=True)
+            except _DROPPED:
+                continue
+            if owned.status_code >= 500:
+                continue
+            if owned.status_code != 200:
+                # 404: the buffer is gone (evicted, or this is another gateway replica)
+                raise httpx.RemoteProtocolError(f"stream lost (resume status {owned.status_code})")
+            resp = owned
+    finally:
+        if owned is not None:
+            await owned.aclose()
@@ -145,12 +145,41 @@ async def ensure_title(thread_id: str, user_prompt: str) -> Optional[str]:
 
 # ---------- Transcript ----------
 
-async def list_messages(thread_id: str) -> list[dict]:
+@dataclass
+class MessagePage:
+    messages: List[dict]
+    total: int = 0
+    before: Optional[int] = None  # pass back as `before` for the previous page
+
+async def list_messages(thread_id: str, limit: int = 50, before: Optional[int] = None) -> MessagePage:
+    """Newest `limit` messages (oldest first), or the page before `before`. The gateway gzips big pages."""
     headers = _auth_headers()
+    params: Dict[str, int] = {"limit": limit}
+    if before is not None:
+        params["before"] = before
     async with httpx.AsyncClient(timeout=20) as client:
-        r = await client.get(f"{GATEWAY_BASE}/api/threads/{thread_id}/messages", headers=headers)
+        r = await client.get(f"{GATEWAY_BASE}/api/threads/{thread_id}/messages", params=params, headers=headers)
         if r.status_code in (401, 403):
             raise APIError(r.status_code, r.text or "")
         if r.status_code != 200:
-            return []
-        return r.json() or []
\ No newline at end of file
+            return MessagePage(messages=[])
+        msgs = r.json() or []
+        cursor = r.headers.get("x-before-cursor")
+        return MessagePage(
+            messages=msgs,
+            total=int(r.headers.get("x-total-count") or len(msgs)),
+            before=int(cursor) if cursor else None,
+        )
+
+# ---------- Runs ----------
+
+async def cancel_run(run_id: str, thread_id: Optional[str] = None) -> bool:
+    """Ask the gateway to cancel an in-flight agent run (best-effort)."""
+    headers = _auth_headers()
+    params = {"thread_id": thread_id} if thread_id else None
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            r = await client.post(f"{GATEWAY_BASE}/api/chat/runs/{run_id}/cancel", params=params, headers=headers)
+            return r.status_code == 200
+    except Exception:
+        return False
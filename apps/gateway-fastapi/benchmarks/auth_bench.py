@@ -0,0 +1,147 @@
+# apps/gateway-fastapi/benchmarks/auth_bench.py
+"""
+Token verification cost per gateway request, before and after the claims cache.
+
+Signs RS256 tokens with a throwaway RSA key, serves a matching discovery doc +
+JWKS (with a few decoy keys, as Entra publishes several) to src.auth.entra's
+KeyManager from memory, and times one "UI turn" worth of requests: each request
+asks for the user `--calls-per-request` times, and each turn sends
+`--requests-per-turn` requests with the same token (get_thread, ensure_title,
+the stream, ...).
+
+  legacy    the old verify_jwt: header parse + linear kid scan + jwt.decode on
+            the raw JWK dict, on every call
+  indexed   verify_jwt with the claims cache off: kid -> parsed key index only
+  cached    verify_jwt with the claims cache on (first call per token verifies)
+  request   get_current_user (per-request memo + claims cache), per request
+
+  cd apps/gateway-fastapi
+  python benchmarks/auth_bench.py --tokens 50 --requests-per-turn 3 --out auth.json
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+os.environ.setdefault("OIDC_DISCOVERY_URL", "https://login.example.test/v2.0/.well-known/openid-configuration")
+os.environ.setdefault("OIDC_AUDIENCE", "api://gateway-bench")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from cryptography.hazmat.primitives import serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from jose import jwk, jwt  # noqa: E402
+
+from src.auth import entra  # noqa: E402
+from src.auth.keys import KeyManager  # noqa: E402
+
+ISSUER = "https://login.example.test/tenant/v2.0"
+
+
+def _keypair(kid: str):
+    priv = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = priv.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    pub = jwk.construct(priv.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo), "RS256").to_dict()
+    pub.update({"kid": kid, "use": "sig"})
+    return pem, pub
+
+
+async def _install(jwks: Dict[str, Any]) -> None:
+    # Serve discovery + JWKS from memory instead of the identity provider
+    docs = {entra.DISCOVERY: {"issuer": ISSUER, "jwks_uri": "https://login.example.test/keys"}, "https://login.example.test/keys": jwks}
+
+    async def get_json(url: str) -> Dict[str, Any]:
+        return docs[url]
+
+    entra.KEYS = KeyManager(entra.DISCOVERY, get_json, algorithms=tuple(entra.ALGORITHMS), on_rotate=entra.CLAIMS.clear)
+    await entra.KEYS.jwks.refresh()
+
+
+async def _legacy_verify(token: str) -> Dict[str, Any]:
+    # verify_jwt as it was before the kid index / claims cache
+    cfg, jwks = entra.KEYS.discovery.value, entra.KEYS.jwks.value
+    kid = jwt.get_unverified_header(token).get("kid")
+    key = next((k for k in jwks.get("keys", []) if k.get("kid") == kid), None)
+    return jwt.decode(token, key, algorithms=["RS256", "RS512"], audience=entra.AUDIENCE, issuer=cfg["issuer"])
+
+
+class _Request:
+    def __init__(self, token: str) -> None:
+        self.headers = {"authorization": f"Bearer {token}"}
+        self.state = SimpleNamespace()
+
+
+async def _time(label: str, tokens: List[str], per_token: int, call: Callable[[str], Any]) -> Dict[str, Any]:
+    n = 0
+    t0 = time.perf_counter()
+    for tok in tokens:
+        for _ in range(per_token):
+            await call(tok)
+            n += 1
+    total = time.perf_counter() - t0
+    return {"label": label, "calls": n, "total_ms": round(total * 1000, 2), "us_per_call": round(total / n * 1e6, 1)}
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tokens", type=int, default=50, help="distinct tokens (users / turns)")
+    ap.add_argument("--requests-per-turn", type=int, default=3)
+    ap.add_argument("--calls-per-request", type=int, default=2, help="get_current_user calls within one request")
+    ap.add_argument("--decoy-keys", type=int, default=3)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    pem, pub = _keypair("bench-signing")
+    decoys = [_keypair(f"decoy-{i}")[1] for i in range(args.decoy_keys)]
+    await _install({"keys": decoys + [pub]})
+
+    now = int(time.time())
+    tokens = [
+        jwt.encode(
+            {"sub": f"user-{i}", "iss": ISSUER, "aud": entra.AUDIENCE, "iat": now, "exp": now + 3600, "name": f"User {i}"},
+            pem, algorithm="RS256", headers={"kid": "bench-signing"},
+        )
+        for i in range(args.tokens)
+    ]
+    per_turn = args.requests_per_turn * args.calls_per_request
+
+    async def request_path(tok: str) -> None:
+        req = _Request(tok)
+        for _ in range(args.calls_per_request):
+            await entra.get_current_user(req)
+
+    results = [await _time("legacy", tokens, per_turn, _legacy_verify)]
+    size = entra.CLAIMS.maxsize
+    entra.CLAIMS.maxsize = 0
+    results.append(await _time("indexed", tokens, per_turn, entra.verify_jwt))
+    entra.CLAIMS.maxsize = size
+    entra.CLAIMS.clear()
+    results.append(await _time("cached", tokens, per_turn, entra.verify_jwt))
+    entra.CLAIMS.clear()
+    req = await _time("request", tokens, args.requests_per_turn, request_path)
+    req["us_per_request"] = req.pop("us_per_call")
+    results.append(req)
+
+    legacy_per_request = results[0]["total_ms"] * 1000 / (args.tokens * args.requests_per_turn)
+    report = {
+        "config": vars(args),
+        "results": results,
+        "legacy_us_per_request": round(legacy_per_request, 1),
+        "speedup_per_request": round(legacy_per_request / max(req["us_per_request"], 1e-9), 1),
+        "claims_cache": entra.claims_cache_stats(),
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,436 @@
+# apps/gateway-fastapi/benchmarks/fake_langgraph.py
+"""
+Local stand-in for the LangGraph Platform HTTP API + the OpenAI Moderation API.
+
+Implements just what the gateway calls through langgraph_sdk / AsyncOpenAI:
+  threads:  POST /threads, POST /threads/search, POST /threads/count, GET|PATCH|DELETE /threads/{id}
+  store:    GET|PUT|DELETE /store/items, POST /store/items/search
+  runs:     POST /threads/{id}/runs/stream, POST /runs/stream  (messages-tuple SSE)
+            POST /threads/{id}/runs/{run_id}/cancel
+            POST /threads/{id}/runs (background), GET /threads/{id}/runs/{run_id}[/join|/stream],
+            GET /threads/{id}/state
+  openai:   POST /v1/moderations   (text containing FAKE_MOD_FLAG_WORD is flagged)
+
+State is in memory. Latency knobs (env):
+  FAKE_LG_LATENCY_MS      base latency of every non-streaming call        (5)
+  FAKE_LG_TTFT_MS         delay before the first token of a run            (300)
+  FAKE_LG_TOKENS          tokens per run                                   (120)
+  FAKE_LG_TOKEN_RATE      tokens per second after the first               (60)
+  FAKE_MOD_LATENCY_MS     moderation round trip                            (80)
+  FAKE_MOD_FLAG_WORD      flag any text containing this word               (FLAGME)
+
+Run standalone:  python benchmarks/fake_langgraph.py --port 8765
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import uuid
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, Response
+
+LATENCY_MS = float(os.getenv("FAKE_LG_LATENCY_MS", "5"))
+TTFT_MS = float(os.getenv("FAKE_LG_TTFT_MS", "300"))
+TOKENS = int(os.getenv("FAKE_LG_TOKENS", "120"))
+TOKEN_RATE = float(os.getenv("FAKE_LG_TOKEN_RATE", "60"))
+MOD_LATENCY_MS = float(os.getenv("FAKE_MOD_LATENCY_MS", "80"))
+MOD_FLAG_WORD = os.getenv("FAKE_MOD_FLAG_WORD", "FLAGME")
+
+_WORDS = (
+    "the gateway streams tokens from the agent while moderation runs in the background "
+    "and transcripts are written once the turn completes so latency stays low under load"
+).split()
+
+MOD_CATEGORIES = (
+    "harassment", "harassment/threatening", "hate", "hate/threatening", "illicit",
+    "illicit/violent", "self-harm", "self-harm/instructions", "self-harm/intent",
+    "sexual", "sexual/minors", "violence", "violence/graphic",
+)
+
+app = FastAPI(title="fake-langgraph")
+
+THREADS: Dict[str, dict] = {}
+STORE: Dict[Tuple[Tuple[str, ...], str], dict] = {}
+CANCELLED: set[str] = set()
+BG_RUNS: Dict[str, dict] = {}  # background runs: run dict + buffered SSE events
+MESSAGES: Dict[str, List[dict]] = {}  # thread_id -> checkpointed `messages` (state values)
+CHECKPOINTS: Dict[str, int] = {}  # thread_id -> checkpoint counter
+COUNTS: Dict[str, int] = {}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _count(name: str) -> None:
+    COUNTS[name] = COUNTS.get(name, 0) + 1
+
+
+async def _latency(ms: float = LATENCY_MS) -> None:
+    if ms > 0:
+        await asyncio.sleep(ms / 1000.0)
+
+
+def _new_thread(thread_id: Optional[str] = None, metadata: Optional[dict] = None) -> dict:
+    now = _now()
+    t = {
+        "thread_id": thread_id or str(uuid.uuid4()),
+        "created_at": now,
+        "updated_at": now,
+        "metadata": dict(metadata or {}),
+        "status": "idle",
+        "values": None,
+    }
+    THREADS[t["thread_id"]] = t
+    return t
+
+
+def _matches(meta: dict, want: Optional[dict]) -> bool:
+    return all(meta.get(k) == v for k, v in (want or {}).items())
+
+
+# ---- Threads ----
+
+@app.post("/threads")
+async def create_thread(request: Request):
+    _count("threads.create")
+    body = await request.json() if await request.body() else {}
+    await _latency()
+    tid = body.get("thread_id")
+    if tid and tid in THREADS:
+        if body.get("if_exists") == "do_nothing":
+            return THREADS[tid]
+        raise HTTPException(status_code=409, detail="thread exists")
+    return _new_thread(tid, body.get("metadata"))
+
+
+@app.post("/threads/search")
+async def search_threads(request: Request):
+    _count("threads.search")
+    body = await request.json()
+    await _latency()
+    items = [t for t in THREADS.values() if _matches(t["metadata"], body.get("metadata"))]
+    key = body.get("sort_by") or "created_at"
+    items.sort(key=lambda t: t.get(key) or "", reverse=(body.get("sort_order") or "desc") == "desc")
+    offset = int(body.get("offset") or 0)
+    return items[offset: offset + int(body.get("limit") or 10)]
+
+
+@app.post("/threads/count")
+async def count_threads(request: Request):
+    _count("threads.count")
+    body = await request.json()
+    await _latency()
+    return sum(1 for t in THREADS.values() if _matches(t["metadata"], body.get("metadata")))
+
+
+@app.get("/threads/{thread_id}")
+async def get_thread(thread_id: str):
+    _count("threads.get")
+    await _latency()
+    t = THREADS.get(thread_id)
+    if t is None:
+        raise HTTPException(status_code=404, detail="not found")
+    return t
+
+
+@app.patch("/threads/{thread_id}")
+async def update_thread(thread_id: str, request: Request):
+    _count("threads.update")
+    body = await request.json()
+    await _latency()
+    t = THREADS.get(thread_id)
+    if t is None:
+        raise HTTPException(status_code=404, detail="not found")
+    t["metadata"].update(body.get("metadata") or {})
+    t["updated_at"] = _now()
+    return t
+
+
+@app.delete("/threads/{thread_id}")
+async def delete_thread(thread_id: str):
+    _count("threads.delete")
+    await _latency()
+    if THREADS.pop(thread_id, None) is None:
+        raise HTTPException(status_code=404, detail="not found")
+    MESSAGES.pop(thread_id, None)
+    return Response(status_code=204)
+
+
+# ---- Store ----
+
+@app.get("/store/items")
+async def get_item(namespace: str, key: str):
+    _count("store.get")
+    await _latency()
+    item = STORE.get((tuple(namespace.split(".")), key))
+    if item is None:
+        raise HTTPException(status_code=404, detail="not found")
+    return item
+
+
+@app.put("/store/items")
+async def put_item(request: Request):
+    _count("store.put")
+    body = await request.json()
+    await _latency()
+    ns = tuple(body["namespace"])
+    now = _now()
+    prev = STORE.get((ns, body["key"]))
+    STORE[(ns, body["key"])] = {
+        "namespace": list(ns),
+        "key": body["key"],
+        "value": body["value"],
+        "created_at": prev["created_at"] if prev else now,
+        "updated_at": now,
+    }
+    return Response(status_code=204)
+
+
+@app.delete("/store/items")
+async def delete_item(request: Request):
+    _count("store.delete")
+    body = await request.json()
+    await _latency()
+    STORE.pop((tuple(body["namespace"]), body["key"]), None)
+    return Response(status_code=204)
+
+
+@app.post("/store/items/search")
+async def search_items(request: Request):
+    _count("store.search")
+    body = await request.json()
+    await _latency()
+    prefix = tuple(body.get("namespace_prefix") or ())
+    flt = body.get("filter") or {}
+    items = [
+        v for (ns, _), v in STORE.items()
+        if ns[: len(prefix)] == prefix and _matches(v["value"] if isinstance(v["value"], dict) else {}, flt)
+    ]
+    items.sort(key=lambda v: v["updated_at"], reverse=True)
+    offset = int(body.get("offset") or 0)
+    return {"items": items[offset: offset + int(body.get("limit") or 10)]}
+
+
+# ---- Runs ----
+
+def _sse(event: str, data: Any) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+async def _run_events(thread_id: Optional[str], run_id: str):
+    yield _sse("metadata", {"run_id": run_id, "attempt": 1})
+    await asyncio.sleep(TTFT_MS / 1000.0)
+    gap = 1.0 / TOKEN_RATE if TOKEN_RATE > 0 else 0.0
+    offset = int(run_id[:8], 16)
+    msg_id = f"run-{run_id}"
+    words: List[str] = []
+    try:
+        for i in range(TOKENS):
+            if run_id in CANCELLED:
+                break
+            if i:
+                await asyncio.sleep(gap)
+            tok = ("" if i == 0 else " ") + _WORDS[(offset + i) % len(_WORDS)]
+            words.append(tok)
+            chunk = {"type": "AIMessageChunk", "content": tok, "id": msg_id}
+            yield _sse("messages", [chunk, {"langgraph_node": "chat", "thread_id": thread_id}])
+    finally:
+        CANCELLED.discard(run_id)
+        if thread_id in THREADS:
+            THREADS[thread_id]["updated_at"] = _now()
+            if words:
+                _checkpoint(thread_id, [{"type": "ai", "content": "".join(words), "id": msg_id}])
+
+
+def _checkpoint(thread_id: str, msgs: List[dict]) -> None:
+    MESSAGES.setdefault(thread_id, []).extend(msgs)
+    CHECKPOINTS[thread_id] = CHECKPOINTS.get(thread_id, 0) + 1
+
+
+def _input_messages(body: dict) -> List[dict]:
+    # Run input as the checkpointer stores it: role -> message type
+    types = {"user": "human", "assistant": "ai", "system": "system"}
+    return [
+        {"type": types.get(m.get("role"), m.get("role")), "content": m.get("content"), "id": uuid.uuid4().hex}
+        for m in ((body.get("input") or {}).get("messages") or [])
+    ]
+
+
+@app.post("/threads/{thread_id}/runs/stream")
+async def stream_run(thread_id: str, request: Request):
+    _count("runs.stream")
+    body = await request.json()
+    if thread_id not in THREADS:
+        if body.get("if_not_exists") != "create":
+            raise HTTPException(status_code=404, detail="thread not found")
+        _new_thread(thread_id)
+    _checkpoint(thread_id, _input_messages(body))
+    return StreamingResponse(_run_events(thread_id, uuid.uuid4().hex), media_type="text/event-stream")
+
+
+async def _background(run: dict) -> None:
+    run["status"] = "running"
+    words = []
+    async for ev in _run_events(run["thread_id"], run["run_id"]):
+        if ev.startswith(b"event: messages"):
+            words.append(json.loads(ev.split(b"data: ", 1)[1])[0]["content"])
+            run["events"].append(ev)
+        run["changed"].set()
+        run["changed"] = asyncio.Event()
+    run["text"] = "".join(words)
+    run["status"] = "interrupted" if len(words) < TOKENS else "success"
+    run["updated_at"] = _now()
+    run["done"].set()
+    run["changed"].set()
+
+
+def _bg_run(thread_id: str, run_id: str) -> dict:
+    run = BG_RUNS.get(run_id)
+    if run is None or run["thread_id"] != thread_id:
+        raise HTTPException(status_code=404, detail="run not found")
+    return run
+
+
+def _run_json(run: dict) -> dict:
+    return {k: run[k] for k in ("run_id", "thread_id", "assistant_id", "status", "created_at", "updated_at")}
+
+
+@app.post("/threads/{thread_id}/runs")
+async def create_run(thread_id: str, request: Request):
+    _count("runs.create")
+    body = await request.json()
+    await _latency()
+    if thread_id not in THREADS:
+        if body.get("if_not_exists") != "create":
+            raise HTTPException(status_code=404, detail="thread not found")
+        _new_thread(thread_id)
+    _checkpoint(thread_id, _input_messages(body))
+    run_id = uuid.uuid4().hex
+    run = BG_RUNS[run_id] = {
+        "run_id": run_id, "thread_id": thread_id, "assistant_id": body.get("assistant_id"),
+        "status": "pending", "created_at": _now(), "updated_at": _now(), "events": [], "text": "",
+        "done": asyncio.Event(), "changed": asyncio.Event(),
+    }
+    run["task"] = asyncio.create_task(_background(run))
+    return _run_json(run)
+
+
+@app.get("/threads/{thread_id}/runs/{run_id}")
+async def get_run(thread_id: str, run_id: str):
+    _count("runs.get")
+    await _latency()
+    return _run_json(_bg_run(thread_id, run_id))
+
+
+@app.get("/threads/{thread_id}/runs/{run_id}/join")
+async def join_run(thread_id: str, run_id: str):
+    _count("runs.join")
+    run = _bg_run(thread_id, run_id)
+    await run["done"].wait()
+    return {"messages": [{"type": "ai", "content": run["text"], "id": f"run-{run_id}"}]}
+
+
+@app.get("/threads/{thread_id}/runs/{run_id}/stream")
+async def join_stream(thread_id: str, run_id: str, request: Request):
+    _count("runs.join_stream")
+    run = _bg_run(thread_id, run_id)
+    # Like the resumable stream: no Last-Event-ID = new events only, "-1" = all
+    # of them, n = the ones after event n (ids are 1-based positions)
+    last = request.headers.get("last-event-id")
+    if last is None:
+        start = len(run["events"])
+    else:
+        try:
+            start = max(0, int(last))
+        except ValueError:
+            start = 0
+
+    async def events():
+        yield _sse("metadata", {"run_id": run_id, "attempt": 1})
+        pos = start
+        while True:
+            while pos < len(run["events"]):
+                pos += 1
+                yield b"id: %d\n" % pos + run["events"][pos - 1]
+            if run["done"].is_set():
+                return
+            await run["changed"].wait()
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/threads/{thread_id}/state")
+async def thread_state(thread_id: str):
+    _count("threads.get_state")
+    await _latency()
+    n = CHECKPOINTS.get(thread_id, 0)
+    return {
+        "values": {"messages": list(MESSAGES.get(thread_id, []))},
+        "next": [],
+        "checkpoint": {"thread_id": thread_id, "checkpoint_ns": "", "checkpoint_id": f"{thread_id}:{n}"},
+        "metadata": {},
+        "created_at": _now(),
+    }
+
+
+@app.post("/runs/stream")
+async def stream_stateless_run(request: Request):
+    _count("runs.stream")
+    return StreamingResponse(_run_events(None, uuid.uuid4().hex), media_type="text/event-stream")
+
+
+@app.post("/threads/{thread_id}/runs/{run_id}/cancel")
+async def cancel_run(thread_id: str, run_id: str):
+    _count("runs.cancel")
+    CANCELLED.add(run_id)
+    return Response(status_code=204)
+
+
+# ---- OpenAI moderation ----
+
+@app.post("/v1/moderations")
+async def moderations(request: Request):
+    _count("moderations")
+    body = await request.json()
+    await _latency(MOD_LATENCY_MS)
+    inputs = body.get("input")
+    texts: List[str] = inputs if isinstance(inputs, list) else [inputs]
+    results = []
+    for t in texts:
+        flagged = MOD_FLAG_WORD in str(t)
+        results.append({
+            "flagged": flagged,
+            "categories": {c: flagged and c == "violence" for c in MOD_CATEGORIES},
+            "category_scores": {c: 0.99 if flagged and c == "violence" else 0.0001 for c in MOD_CATEGORIES},
+            "category_applied_input_types": {c: ["text"] for c in MOD_CATEGORIES},
+        })
+    return {"id": f"modr-{uuid.uuid4().hex}", "model": body.get("model"), "results": results}
+
+
+# ---- Bench plumbing ----
+
+@app.get("/ok")
+async def ok():
+    return {"ok": True}
+
+
+@app.get("/__bench/counts")
+async def counts():
+    return {"calls": COUNTS, "threads": len(THREADS), "store_items": len(STORE)}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
@@ -0,0 +1,76 @@
+# apps/gateway-fastapi/benchmarks/gateway_server.py
+"""
+Serve the real gateway app (src.main:app) with an event-loop lag probe attached.
+
+The probe (started by the first /__bench/loop_lag call) sleeps for
+LOOP_LAG_INTERVAL_MS in a loop and records how late each wake-up is; that
+overshoot is time the loop spent running other callbacks.
+  GET /__bench/loop_lag[?reset=1]   -> {samples, p50_ms, p95_ms, p99_ms, max_ms}
+
+Configure the gateway itself through its usual env (LANGGRAPH_URL,
+OPENAI_BASE_URL, AUTH_DEV_BYPASS=true, ...); run_bench.py does this for you.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import asyncio
+import argparse
+from collections import deque
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.main import app  # noqa: E402
+
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "20"))
+
+_LAGS: deque[float] = deque(maxlen=200_000)
+
+
+def _pct(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+async def _probe() -> None:
+    loop = asyncio.get_running_loop()
+    interval = LOOP_LAG_INTERVAL_MS / 1000.0
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        _LAGS.append(max(0.0, loop.time() - t0 - interval))
+
+
+_PROBE: "asyncio.Task | None" = None
+
+
+@app.get("/__bench/loop_lag", include_in_schema=False)
+async def loop_lag(reset: bool = False):
+    global _PROBE
+    # Started by the first call (independent of how the app wires its lifespan)
+    if _PROBE is None:
+        _PROBE = asyncio.create_task(_probe(), name="loop_lag_probe")
+    lags = [x * 1000.0 for x in _LAGS]
+    if reset:
+        _LAGS.clear()
+    return {
+        "samples": len(lags),
+        "interval_ms": LOOP_LAG_INTERVAL_MS,
+        "p50_ms": round(_pct(lags, 50), 3),
+        "p95_ms": round(_pct(lags, 95), 3),
+        "p99_ms": round(_pct(lags, 99), 3),
+        "max_ms": round(max(lags, default=0.0), 3),
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8780)
+    args = ap.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
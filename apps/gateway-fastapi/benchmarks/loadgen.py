@@ -0,0 +1,280 @@
+# apps/gateway-fastapi/benchmarks/loadgen.py
+"""
+Async load generator for the gateway (works against any gateway URL).
+
+Each of `concurrency` workers loops until the deadline, picking a route by the
+--mix weights and acting as one of `users` synthetic users (AUTH_DEV_BYPASS
+headers, so the gateway must run with AUTH_DEV_BYPASS=true):
+
+  stream        POST /api/chat/stream                 (SSE)
+  stream_files  POST /api/chat/stream_files           (SSE, one small .txt attachment)
+  threads       GET  /api/threads
+  messages      GET  /api/threads/{id}/messages
+
+Per route it records latency (full response), and for SSE routes TTFT (request
+sent -> first text frame) and inter-token latency (gap between text frames).
+
+  python benchmarks/loadgen.py --url http://127.0.0.1:8780 --concurrency 32 --duration 30
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+ROUTES = ("stream", "stream_files", "threads", "messages")
+DEFAULT_MIX = "stream=6,stream_files=1,threads=2,messages=2"
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    v = sorted(values)
+
+    def at(p: float) -> float:
+        return round(v[min(len(v) - 1, int(round(p / 100.0 * (len(v) - 1))))], 3)
+
+    return {"p50": at(50), "p95": at(95), "p99": at(99), "max": round(v[-1], 3)}
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    out = []
+    for part in spec.split(","):
+        name, _, w = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise SystemExit(f"unknown route in --mix: {name!r} (choose from {', '.join(ROUTES)})")
+        if float(w or 1) > 0:
+            out.append((name, float(w or 1)))
+    return out
+
+
+@dataclass
+class RouteStats:
+    requests: int = 0
+    errors: int = 0
+    policy: int = 0
+    rejected: int = 0  # 429 from admission control (not an error)
+    queued: int = 0    # streams that got a `queued` event
+    latency_ms: List[float] = field(default_factory=list)
+    ttft_ms: List[float] = field(default_factory=list)
+    itl_ms: List[float] = field(default_factory=list)
+    frames: int = 0
+    error_samples: List[str] = field(default_factory=list)
+
+    def error(self, msg: str) -> None:
+        self.errors += 1
+        if len(self.error_samples) < 5:
+            self.error_samples.append(msg[:200])
+
+    def report(self, duration_s: float, streaming: bool) -> dict:
+        out = {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected_429": self.rejected,
+            "rps": round(self.requests / duration_s, 2) if duration_s > 0 else 0.0,
+            "latency_ms": percentiles(self.latency_ms),
+        }
+        if streaming:
+            out.update({
+                "ttft_ms": percentiles(self.ttft_ms),
+                "itl_ms": percentiles(self.itl_ms),
+                "frames": self.frames,
+                "policy_events": self.policy,
+                "queued": self.queued,
+            })
+        if self.error_samples:
+            out["error_samples"] = self.error_samples
+        return out
+
+
+class LoadGen:
+    def __init__(
+        self,
+        url: str,
+        *,
+        concurrency: int,
+        users: int,
+        mix: List[Tuple[str, float]],
+        timeout_s: float = 120.0,
+        seed: int = 7,
+    ) -> None:
+        self.url = url.rstrip("/")
+        self.concurrency = concurrency
+        self.users = [f"bench-user-{i}" for i in range(max(1, users))]
+        self.mix = mix
+        self.rng = random.Random(seed)
+        self.threads: Dict[str, str] = {}
+        self.stats: Dict[str, RouteStats] = {name: RouteStats() for name, _ in mix}
+        self.http = httpx.AsyncClient(
+            base_url=self.url,
+            timeout=httpx.Timeout(timeout_s, connect=10.0),
+            limits=httpx.Limits(max_connections=concurrency + 8, max_keepalive_connections=concurrency + 8),
+        )
+        self._seq = 0
+
+    @staticmethod
+    def headers(user: str) -> Dict[str, str]:
+        return {"X-Debug-Sub": user, "X-User-Name": user}
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    async def setup(self) -> None:
+        """One thread per synthetic user (used by stream and messages)."""
+        async def one(user: str) -> None:
+            r = await self.http.post("/api/threads", json={"title": "bench"}, headers=self.headers(user))
+            r.raise_for_status()
+            self.threads[user] = r.json()["thread_id"]
+
+        await asyncio.gather(*(one(u) for u in self.users))
+
+    def reset(self) -> None:
+        self.stats = {name: RouteStats() for name, _ in self.mix}
+
+    def _prompt(self) -> str:
+        # Unique text per request so moderation verdicts aren't all cache hits
+        self._seq += 1
+        return f"bench prompt #{self._seq}: summarize how the gateway streams a reply."
+
+    # ---- Route drivers ----
+
+    async def _sse(self, st: RouteStats, method: str, path: str, **kwargs) -> None:
+        t0 = time.perf_counter()
+        last: Optional[float] = None
+        event, has_data, queued = "", False, False
+        async with self.http.stream(method, path, **kwargs) as r:
+            if r.status_code == 429:
+                await r.aread()
+                st.rejected += 1
+                return
+            if r.status_code != 200:
+                await r.aread()
+                st.error(f"{r.status_code} {r.text}")
+                return
+            async for line in r.aiter_lines():
+                if line == "":
+                    if has_data:
+                        now = time.perf_counter()
+                        if event in ("", "message"):
+                            st.frames += 1
+                            if last is None:
+                                st.ttft_ms.append((now - t0) * 1000.0)
+                            else:
+                                st.itl_ms.append((now - last) * 1000.0)
+                            last = now
+                        elif event == "policy":
+                            st.policy += 1
+                        elif event == "queued":
+                            queued = True
+                        elif event == "error":
+                            st.error("sse error event")
+                    event, has_data = "", False
+                elif line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    has_data = True
+        st.queued += queued
+        st.latency_ms.append((time.perf_counter() - t0) * 1000.0)
+
+    async def _stream(self, st: RouteStats, user: str) -> None:
+        body = {"message": self._prompt(), "thread_id": self.threads.get(user)}
+        await self._sse(st, "POST", "/api/chat/stream", json=body, headers=self.headers(user))
+
+    async def _stream_files(self, st: RouteStats, user: str) -> None:
+        payload = json.dumps({"message": self._prompt(), "thread_id": self.threads.get(user)})
+        files = [("files", ("notes.txt", b"quarterly numbers\n" * 64, "text/plain"))]
+        await self._sse(
+            st, "POST", "/api/chat/stream_files",
+            data={"payload": payload}, files=files, headers=self.headers(user),
+        )
+
+    async def _get(self, st: RouteStats, path: str, user: str) -> None:
+        t0 = time.perf_counter()
+        r = await self.http.get(path, headers=self.headers(user))
+        if r.status_code != 200:
+            st.error(f"{r.status_code} {r.text}")
+            return
+        st.latency_ms.append((time.perf_counter() - t0) * 1000.0)
+
+    async def one(self, route: str, user: str) -> None:
+        st = self.stats[route]
+        st.requests += 1
+        try:
+            if route == "stream":
+                await self._stream(st, user)
+            elif route == "stream_files":
+                await self._stream_files(st, user)
+            elif route == "threads":
+                await self._get(st, "/api/threads", user)
+            else:
+                await self._get(st, f"/api/threads/{self.threads.get(user)}/messages", user)
+        except Exception as e:
+            st.error(f"{type(e).__name__}: {e}")
+
+    # ---- Driver loop ----
+
+    async def run(self, duration_s: float) -> float:
+        names = [n for n, _ in self.mix]
+        weights = [w for _, w in self.mix]
+        deadline = time.perf_counter() + duration_s
+
+        async def worker(i: int) -> None:
+            while time.perf_counter() < deadline:
+                route = self.rng.choices(names, weights)[0]
+                await self.one(route, self.users[(i + self.rng.randrange(len(self.users))) % len(self.users)])
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(self.concurrency)))
+        return time.perf_counter() - t0
+
+    def report(self, duration_s: float) -> dict:
+        routes = {
+            name: st.report(duration_s, streaming=name in ("stream", "stream_files"))
+            for name, st in self.stats.items()
+        }
+        total = sum(st.requests for st in self.stats.values())
+        return {
+            "routes": routes,
+            "totals": {
+                "requests": total,
+                "errors": sum(st.errors for st in self.stats.values()),
+                "rps": round(total / duration_s, 2) if duration_s > 0 else 0.0,
+                "duration_s": round(duration_s, 3),
+            },
+        }
+
+
+async def _main(args: argparse.Namespace) -> None:
+    lg = LoadGen(args.url, concurrency=args.concurrency, users=args.users, mix=parse_mix(args.mix))
+    try:
+        await lg.setup()
+        if args.warmup > 0:
+            await lg.run(args.warmup)
+            lg.reset()
+        duration = await lg.run(args.duration)
+        print(json.dumps(lg.report(duration), indent=2))
+    finally:
+        await lg.aclose()
+
+
+def add_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--users", type=int, default=8, help="distinct synthetic user ids")
+    ap.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    ap.add_argument("--warmup", type=float, default=3.0, help="seconds run before measuring (discarded)")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help=f"route weights (default {DEFAULT_MIX})")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://127.0.0.1:8780")
+    add_args(ap)
+    asyncio.run(_main(ap.parse_args()))
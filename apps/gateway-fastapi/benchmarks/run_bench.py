@@ -0,0 +1,201 @@
+# apps/gateway-fastapi/benchmarks/run_bench.py
+"""
+Offline gateway load test: fake LangGraph + fake moderation + real gateway + load.
+
+  cd apps/gateway-fastapi
+  python benchmarks/run_bench.py --concurrency 32 --duration 30 --out bench.json
+  python benchmarks/run_bench.py ... --compare bench.json     # deltas vs an older report
+  python benchmarks/run_bench.py ... --metrics metrics.txt     # final GET /metrics scrape
+
+Starts two local processes:
+  - benchmarks/fake_langgraph.py  (LangGraph HTTP API + /v1/moderations; FAKE_* env knobs)
+  - benchmarks/gateway_server.py  (src.main:app + event-loop lag probe) with
+    LANGGRAPH_URL / OPENAI_BASE_URL pointed at the fake and AUTH_DEV_BYPASS=true
+then drives the gateway with benchmarks/loadgen.py and writes one JSON report:
+  routes.<route>.{rps, latency_ms, ttft_ms, itl_ms, ...}, totals, loop_lag_ms,
+  upstream_calls, config. Percentiles are p50/p95/p99/max in milliseconds.
+
+Any extra gateway env (e.g. SSE_COALESCE_ENABLED=false) is inherited from the
+calling shell, so two configurations can be compared on the same machine.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import asyncio
+import argparse
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import LoadGen, add_args, parse_mix  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GATEWAY_DIR = os.path.dirname(HERE)
+
+# Metrics compared by --compare (lower is better for all but rps)
+_COMPARE = ("rps", "ttft_ms.p50", "ttft_ms.p95", "ttft_ms.p99", "itl_ms.p50", "itl_ms.p99", "latency_ms.p50", "latency_ms.p99")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=GATEWAY_DIR, capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _spawn(script: str, port: int, env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log = open(log_path, "ab")
+    return subprocess.Popen(
+        [sys.executable, os.path.join(HERE, script), "--port", str(port)],
+        cwd=GATEWAY_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+async def _wait_ready(url: str, proc: subprocess.Popen, timeout_s: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    async with httpx.AsyncClient(timeout=2.0) as http:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise SystemExit(f"{url} exited with code {proc.returncode} (see the log file)")
+            try:
+                if (await http.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"timed out waiting for {url}")
+
+
+def _get(d: Dict[str, Any], dotted: str) -> Optional[float]:
+    for part in dotted.split("."):
+        if not isinstance(d, dict) or part not in d:
+            return None
+        d = d[part]
+    return d if isinstance(d, (int, float)) else None
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-route % change for the headline metrics (+ = higher in `new`)."""
+    out: Dict[str, Any] = {"baseline_git": (old.get("config") or {}).get("git")}
+    for route, cur in (new.get("routes") or {}).items():
+        prev = (old.get("routes") or {}).get(route)
+        if not prev:
+            continue
+        deltas = {}
+        for m in _COMPARE:
+            a, b = _get(prev, m), _get(cur, m)
+            if a and b is not None:
+                deltas[m] = round((b - a) / a * 100.0, 1)
+        out[route] = deltas
+    a, b = _get(old, "loop_lag_ms.p99"), _get(new, "loop_lag_ms.p99")
+    if a and b is not None:
+        out["loop_lag_ms.p99"] = round((b - a) / a * 100.0, 1)
+    return out
+
+
+async def _main(args: argparse.Namespace) -> Dict[str, Any]:
+    fake_port, gw_port = _free_port(), _free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    gw_url = f"http://127.0.0.1:{gw_port}"
+    log_path = args.log or os.path.join(tempfile.gettempdir(), "prynai-gateway-bench.log")
+
+    fake_env = {**os.environ}
+    gw_env = {
+        **os.environ,
+        "LANGGRAPH_URL": fake_url,
+        "OPENAI_BASE_URL": f"{fake_url}/v1",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "bench"),
+        "AUTH_DEV_BYPASS": "true",
+        # /metrics is closed without a token; open it for the scrape below
+        "METRICS_PUBLIC": os.environ.get("METRICS_PUBLIC", "true"),
+        "PYTHONUNBUFFERED": "1",
+    }
+    fake = _spawn("fake_langgraph.py", fake_port, fake_env, log_path)
+    gw = _spawn("gateway_server.py", gw_port, gw_env, log_path)
+    lg: Optional[LoadGen] = None
+    try:
+        await _wait_ready(f"{fake_url}/ok", fake)
+        await _wait_ready(f"{gw_url}/healthz", gw)
+
+        lg = LoadGen(gw_url, concurrency=args.concurrency, users=args.users, mix=parse_mix(args.mix))
+        await lg.setup()
+        if args.warmup > 0:
+            await lg.run(args.warmup)
+            lg.reset()
+        async with httpx.AsyncClient(timeout=10.0) as http:
+            await http.get(f"{gw_url}/__bench/loop_lag", params={"reset": "true"})
+            duration = await lg.run(args.duration)
+            loop_lag = (await http.get(f"{gw_url}/__bench/loop_lag")).json()
+            upstream = (await http.get(f"{fake_url}/__bench/counts")).json()
+            if args.metrics:
+                token = os.environ.get("METRICS_TOKEN")
+                r = await http.get(f"{gw_url}/metrics", headers={"Authorization": f"Bearer {token}"} if token else None)
+                r.raise_for_status()
+                with open(args.metrics, "w") as f:
+                    f.write(r.text)
+
+        report = {
+            "version": 1,
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "config": {
+                "git": _git_rev(),
+                "python": sys.version.split()[0],
+                "concurrency": args.concurrency,
+                "users": args.users,
+                "duration_s": args.duration,
+                "warmup_s": args.warmup,
+                "mix": args.mix,
+                "fake": {k: v for k, v in os.environ.items() if k.startswith("FAKE_")},
+            },
+            **lg.report(duration),
+            "loop_lag_ms": {k: v for k, v in loop_lag.items() if k != "interval_ms"},
+            "upstream_calls": upstream.get("calls", {}),
+        }
+        if args.compare:
+            with open(args.compare) as f:
+                report["compare"] = compare(json.load(f), report)
+        return report
+    finally:
+        if lg is not None:
+            await lg.aclose()
+        for p in (gw, fake):
+            p.terminate()
+        for p in (gw, fake):
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_args(ap)
+    ap.add_argument("--out", help="write the JSON report here (also printed)")
+    ap.add_argument("--compare", help="older report to diff against")
+    ap.add_argument("--metrics", help="save the gateway's /metrics text here after the run")
+    ap.add_argument("--log", help="server log file (default $TMPDIR/prynai-gateway-bench.log)")
+    args = ap.parse_args()
+
+    report = asyncio.run(_main(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
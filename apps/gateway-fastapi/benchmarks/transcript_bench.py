@@ -0,0 +1,162 @@
+# apps/gateway-fastapi/benchmarks/transcript_bench.py
+"""
+Transcript append cost as a thread grows: single-item transcript vs pages.
+
+Appends `--messages` chat messages (alternating user / assistant, `--chars`
+characters each) to one thread through an in-memory Store that JSON-encodes
+every value on the way in and out, like the HTTP API does. Every
+`--sample-every` messages it records the mean wall time, bytes written and
+bytes read per append over the last window.
+
+  legacy   the old append_transcript: read the whole "transcript" item, append,
+           write it all back (O(n) bytes per append, O(n^2) per thread)
+  paged    src.features.transcript.append_transcript (head + sealed pages)
+
+It finishes with one full read of each transcript and checks both return the
+same messages in order.
+
+  cd apps/gateway-fastapi
+  python benchmarks/transcript_bench.py --messages 2000 --out transcript.json
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.features import transcript  # noqa: E402
+from src.features.transcript import TranscriptMessage  # noqa: E402
+
+
+class _NotFound(Exception):
+    # Shaped like httpx.HTTPStatusError as far as the gateway's 404 checks go
+    response = SimpleNamespace(status_code=404)
+
+
+class MemoryStore:
+    """get_item / put_item with wire-format encoding, call and byte counters."""
+
+    def __init__(self, latency_ms: float = 0.0) -> None:
+        self.items: Dict[tuple, str] = {}
+        self.latency_s = latency_ms / 1000
+        self.reset()
+
+    def reset(self) -> None:
+        self.gets = self.puts = self.bytes_in = self.bytes_out = 0
+
+    async def get_item(self, namespace, /, key: str, **kwargs: Any) -> Optional[dict]:
+        self.gets += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        raw = self.items.get((tuple(namespace), key))
+        if raw is None:
+            raise _NotFound()
+        self.bytes_in += len(raw)
+        return {"namespace": list(namespace), "key": key, "value": json.loads(raw)}
+
+    async def put_item(self, namespace, /, key: str, value: dict, **kwargs: Any) -> None:
+        self.puts += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        raw = json.dumps(value)
+        self.bytes_out += len(raw)
+        self.items[(tuple(namespace), key)] = raw
+
+
+async def _legacy_append(client, user_id: str, thread_id: str, msg: TranscriptMessage) -> None:
+    # append_transcript as it was before pages (with the Item-dict read fixed,
+    # so the document actually grows the way it does in production)
+    ns = ["threads", user_id, thread_id]
+    try:
+        item = await client.store.get_item(ns, key="transcript")
+        msgs = list((item.get("value") or {}).get("messages") or [])
+    except _NotFound:
+        msgs = []
+    msgs.append(msg.model_dump())
+    await client.store.put_item(ns, key="transcript", value={"user_id": user_id, "thread_id": thread_id, "messages": msgs}, index=["$"])
+
+
+async def _run(
+    label: str,
+    append: Callable[[Any, str, str, TranscriptMessage], Awaitable[None]],
+    args: argparse.Namespace,
+) -> Dict[str, Any]:
+    store = MemoryStore(args.latency_ms)
+    client = SimpleNamespace(store=store)
+    body = "x" * args.chars
+    samples: List[Dict[str, Any]] = []
+    window_t = 0.0
+    total_t = 0.0
+    for i in range(1, args.messages + 1):
+        msg = TranscriptMessage(role="user" if i % 2 else "assistant", content=f"{i} {body}")
+        t0 = time.perf_counter()
+        await append(client, "bench-user", "bench-thread", msg)
+        dt = time.perf_counter() - t0
+        window_t += dt
+        total_t += dt
+        if i % args.sample_every == 0:
+            n = args.sample_every
+            samples.append({
+                "messages": i,
+                "ms_per_append": round(window_t / n * 1000, 3),
+                "store_calls_per_append": round((store.gets + store.puts) / n, 2),
+                "bytes_written_per_append": store.bytes_out // n,
+                "bytes_read_per_append": store.bytes_in // n,
+            })
+            window_t = 0.0
+            store.reset()
+
+    t0 = time.perf_counter()
+    msgs = await transcript._get_transcript(client, "bench-user", "bench-thread")
+    read_ms = (time.perf_counter() - t0) * 1000
+    return {
+        "label": label,
+        "total_append_s": round(total_t, 3),
+        "full_read_ms": round(read_ms, 2),
+        "full_read_store_calls": store.gets,
+        "messages_read": len(msgs),
+        "contents": [m["content"].split(" ", 1)[0] for m in msgs],
+        "samples": samples,
+    }
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--messages", type=int, default=2000)
+    ap.add_argument("--chars", type=int, default=400, help="characters per message")
+    ap.add_argument("--sample-every", type=int, default=250)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="simulated store round trip")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    legacy = await _run("legacy", _legacy_append, args)
+    paged = await _run("paged", transcript.append_transcript, args)
+    same = legacy.pop("contents") == paged.pop("contents")
+
+    first, last = paged["samples"][0], paged["samples"][-1]
+    report = {
+        "config": {**vars(args), "page_size": transcript.TRANSCRIPT_PAGE_SIZE},
+        "results": [legacy, paged],
+        "same_messages": same,
+        # ~1.0 = flat: the last window costs what the first did
+        "paged_growth_ms": round(last["ms_per_append"] / max(first["ms_per_append"], 1e-9), 2),
+        "paged_growth_bytes": round(last["bytes_written_per_append"] / max(first["bytes_written_per_append"], 1), 2),
+        "legacy_growth_ms": round(legacy["samples"][-1]["ms_per_append"] / max(legacy["samples"][0]["ms_per_append"], 1e-9), 2),
+        "speedup_total": round(legacy["total_append_s"] / max(paged["total_append_s"], 1e-9), 1),
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
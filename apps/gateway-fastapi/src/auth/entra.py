@@ -12,77 +12,117 @@ Env you must set:
   OIDC_AUDIENCE      = api://<gateway-api-app-id>/chat.fullaccess    (or the API app client id)
 Optional:
   AUTH_DEV_BYPASS=true   (only for local dev) + header X-Debug-Sub: <user-id>
+  AUTH_CLAIMS_CACHE_SIZE=10000   verified tokens remembered (0 = verify every call)
+  AUTH_CLAIMS_CACHE_MAX_TTL_S=3600
+
+Verification cost:
+- Discovery and JWKS are kept fresh by a background KeyManager (src/auth/keys.py):
+  single-flight, stale-while-revalidate, so the IdP stays off the request path.
+  The JWKS is parsed once per fetch into a kid -> key index (no per-request scan
+  or JWK construction).
+- Verified claims are cached by sha256(token) until the token's `exp` (capped by
+  AUTH_CLAIMS_CACHE_MAX_TTL_S), so the UI's several calls per turn with the same
+  token pay for one RS256 check. The cache is cleared when the JWKS key set changes.
+- get_current_user() memoizes on request.state, so a request verifies at most
+  once however many handlers/dependencies ask (require_user is the Depends form).
 """
 
 from __future__ import annotations
 from typing import Optional, Dict, Any
-import os, time, httpx
+import os, time, hashlib, httpx
+from fastapi import HTTPException, Request
 from jose import jwt
 from jose.exceptions import JWTError, ExpiredSignatureError, JWTClaimsError, JWKError
 
+from src.auth.keys import KeyManager
+from src.utils.ttl_cache import TTLCache, MISSING
+
 class AuthError(Exception):
     pass
 
-_OIDC: Dict[str, Any] = {"cfg": None, "cfg_exp": 0, "jwks": None, "jwks_exp": 0}
-
 DISCOVERY = os.getenv("OIDC_DISCOVERY_URL")
 AUDIENCE  = os.getenv("OIDC_AUDIENCE")
+ALGORITHMS = ["RS256", "RS512"]
+
+CLAIMS_CACHE_SIZE = int(os.getenv("AUTH_CLAIMS_CACHE_SIZE", "10000"))
+CLAIMS_CACHE_MAX_TTL_S = float(os.getenv("AUTH_CLAIMS_CACHE_MAX_TTL_S", "3600"))
+
+# sha256(token) -> verified claims; per-entry TTL = time left until `exp`
+CLAIMS: "TTLCache[str, Dict[str, Any]]" = TTLCache(maxsize=CLAIMS_CACHE_SIZE, ttl_s=CLAIMS_CACHE_MAX_TTL_S)
+
+def _http() -> httpx.AsyncClient:
+    # Shared identity pool (created by the gateway lifespan, see src/features/clients.py)
+    from src.features.clients import CLIENTS
+    if CLIENTS.identity is None:
+        raise AuthError("identity client not started")
+    return CLIENTS.identity
 
 def extract_bearer_token(authorization: Optional[str]) -> Optional[str]:
     if not authorization: return None
     p = authorization.split()
     return p[1] if len(p) == 2 and p[0].lower() == "bearer" else None
 
+async def _get_json(url: str) -> Dict[str, Any]:
+    r = await _http().get(url)
+    r.raise_for_status()
+    return r.json()
+
+# Discovery + JWKS, refreshed in the background (see src/auth/keys.py); a key
+# rotation invalidates every cached verification
+KEYS = KeyManager(DISCOVERY, _get_json, algorithms=tuple(ALGORITHMS), on_rotate=CLAIMS.clear)
+
+async def start_key_refresh() -> None:
+    await KEYS.start()
+
+async def stop_key_refresh() -> None:
+    await KEYS.aclose()
+
+def key_manager_stats() -> Dict[str, Any]:
+    return KEYS.stats()
+
 async def _get_openid_config() -> Dict[str, Any]:
     if not DISCOVERY:
         raise AuthError("OIDC_DISCOVERY_URL not configured")
-    if _OIDC["cfg"] and _OIDC["cfg_exp"] > time.time():
-        return _OIDC["cfg"]
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.get(DISCOVERY)
-        r.raise_for_status()
-        cfg = r.json()
-    _OIDC["cfg"] = cfg
-    _OIDC["cfg_exp"] = time.time() + 3600
-    return cfg
-
-async def _get_jwks() -> Dict[str, Any]:
-    if _OIDC["jwks"] and _OIDC["jwks_exp"] > time.time():
-        return _OIDC["jwks"]
-    cfg = await _get_openid_config()
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.get(cfg["jwks_uri"])
-        r.raise_for_status()
-        jwks = r.json()
-    _OIDC["jwks"] = jwks
-    _OIDC["jwks_exp"] = time.time() + 3600
-    return jwks
+    return await KEYS.config()
+
+async def _signing_key(kid: Optional[str], alg: Optional[str]) -> Any:
+    if alg not in ALGORITHMS:
+        raise AuthError("invalid_token")
+    key = await KEYS.key(kid, alg)
+    if key is None:
+        raise AuthError("JWK for token kid not found")
+    return key
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def claims_cache_stats() -> Dict[str, int]:
+    return CLAIMS.stats()
 
 async def verify_jwt(token: str) -> Dict[str, Any]:
-    cfg  = await _get_openid_config()
-    jwks = await _get_jwks()
+    ck = _token_key(token) if CLAIMS.enabled else ""
+    if ck:
+        cached = CLAIMS.get(ck)
+        if cached is not MISSING:
+            return cached
 
-    unverified = jwt.get_unverified_header(token)
-    kid = unverified.get("kid")
-    key = next((k for k in jwks.get("keys", []) if k.get("kid") == kid), None)
-    if key is None:
-        # Key rotation retry
-        jwks = await _get_jwks()
-        key = next((k for k in jwks.get("keys", []) if k.get("kid") == kid), None)
-        if key is None:
-            raise AuthError("JWK for token kid not found")
+    cfg = await _get_openid_config()
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError as e:
+        raise AuthError("invalid_token") from e
+    key = await _signing_key(header.get("kid"), header.get("alg"))
 
     options = {"verify_aud": bool(AUDIENCE)}
     try:
         claims = jwt.decode(
             token,
             key,
-            algorithms=["RS256", "RS512"],
+            algorithms=ALGORITHMS,
             audience=AUDIENCE,
             issuer=cfg["issuer"],  # issuer comes from the discovery doc
             options=options,
         )
-        return claims
     except ExpiredSignatureError as e:
         raise AuthError("token_expired") from e
     except JWTClaimsError as e:
@@ -90,7 +130,15 @@ async def verify_jwt(token: str) -> Dict[str, Any]:
     except (JWKError, JWTError) as e:
         raise AuthError("invalid_token") from e
 
-async def get_current_user(request) -> Optional[Dict[str, Any]]:
+    exp = claims.get("exp")
+    if ck and isinstance(exp, (int, float)):
+        # Never served past `exp`: an expired token misses and fails verification
+        CLAIMS.put(ck, claims, ttl_s=min(CLAIMS_CACHE_MAX_TTL_S, exp - time.time()))
+    return claims
+
+_UNSET: Any = object()
+
+async def _resolve_user(request) -> Optional[Dict[str, Any]]:
     # Dev bypass for local smoke tests
     if os.getenv("AUTH_DEV_BYPASS", "false").lower() == "true":
         dev = request.headers.get("x-debug-sub")
@@ -101,5 +149,29 @@ async def get_current_user(request) -> Optional[Dict[str, Any]]:
         return None
     return await verify_jwt(token)
 
+async def get_current_user(request: Request) -> Optional[Dict[str, Any]]:
+    # Memoized per request (auth errors too), so repeated calls verify once
+    state = request.state
+    done = getattr(state, "auth_claims", _UNSET)
+    if done is _UNSET:
+        try:
+            done = await _resolve_user(request)
+        except AuthError as e:
+            done = e
+        state.auth_claims = done
+    if isinstance(done, AuthError):
+        raise done
+    return done
+
+async def require_user(request: Request) -> Dict[str, Any]:
+    """FastAPI dependency: verified claims, or 401."""
+    try:
+        claims = await get_current_user(request)
+    except AuthError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    if not claims:
+        raise HTTPException(status_code=401, detail="unauthenticated")
+    return claims
+
 def user_id_from_claims(claims: Dict[str, Any]) -> str:
     return claims.get("sub")
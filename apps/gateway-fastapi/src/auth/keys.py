@@ -0,0 +1,238 @@
+# apps/gateway-fastapi/src/auth/keys.py
+"""
+OIDC discovery + JWKS kept fresh off the request path.
+
+Each remote document (discovery, JWKS) is a SharedDoc:
+- fresh:   served from memory;
+- within OIDC_REFRESH_AHEAD_S of expiry, or expired but younger than
+  OIDC_MAX_STALE_S: served as-is while one background refresh runs
+  (stale-while-revalidate);
+- missing / too stale: callers wait, but all of them share one in-flight fetch
+  (single-flight), so an expiry under load costs one request to the IdP.
+A failed refresh keeps the old copy and is retried after OIDC_RETRY_S.
+
+KeyManager.start() (gateway lifespan) fetches both once and then refreshes them
+ahead of expiry in a background task, so requests normally never wait on the
+identity provider. An unknown `kid` forces a JWKS refetch, at most once every
+JWKS_MIN_REFRESH_S (a flood of forged kids can't hammer the IdP).
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from jose import jwk
+from jose.exceptions import JWKError
+
+OIDC_CACHE_TTL_S = float(os.getenv("OIDC_CACHE_TTL_S", "3600"))
+OIDC_REFRESH_AHEAD_S = float(os.getenv("OIDC_REFRESH_AHEAD_S", "300"))
+OIDC_MAX_STALE_S = float(os.getenv("OIDC_MAX_STALE_S", "86400"))
+OIDC_RETRY_S = float(os.getenv("OIDC_RETRY_S", "10"))
+JWKS_MIN_REFRESH_S = float(os.getenv("JWKS_MIN_REFRESH_S", "30"))
+
+GetJson = Callable[[str], Awaitable[Dict[str, Any]]]
+
+
+class SharedDoc:
+    """One remote JSON document with single-flight, stale-while-revalidate refresh."""
+
+    def __init__(
+        self,
+        name: str,
+        fetch: Callable[[], Awaitable[Dict[str, Any]]],
+        *,
+        ttl_s: float = OIDC_CACHE_TTL_S,
+        refresh_ahead_s: float = OIDC_REFRESH_AHEAD_S,
+        max_stale_s: float = OIDC_MAX_STALE_S,
+        retry_s: float = OIDC_RETRY_S,
+        on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> None:
+        self.name = name
+        self._fetch = fetch
+        self.ttl_s = ttl_s
+        self.refresh_ahead_s = min(refresh_ahead_s, ttl_s / 2)
+        self.max_stale_s = max_stale_s
+        self.retry_s = retry_s
+        self._on_update = on_update
+        self.value: Optional[Dict[str, Any]] = None
+        self.fetched_at = 0.0  # monotonic
+        self._failed_at = float("-inf")
+        self._inflight: Optional[asyncio.Task] = None
+        self.fetches = 0
+        self.failures = 0
+        self.waits = 0
+        self.stale_served = 0
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    def due_in(self) -> float:
+        """Seconds until a refresh should start (<= 0: now)."""
+        if self.value is None:
+            return 0.0
+        due = self.ttl_s - self.refresh_ahead_s - self.age()
+        if self._failed_at > self.fetched_at:
+            due = max(due, self.retry_s - (time.monotonic() - self._failed_at))
+        return due
+
+    async def get(self) -> Dict[str, Any]:
+        if self.value is not None:
+            age = self.age()
+            if age < self.ttl_s - self.refresh_ahead_s:
+                return self.value
+            if age < self.ttl_s + self.max_stale_s:
+                if age >= self.ttl_s:
+                    self.stale_served += 1
+                if self.due_in() <= 0:
+                    self._start()
+                return self.value
+        self.waits += 1
+        return await self.refresh()
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Fetch now (joining a fetch already in flight); raises if there's nothing to serve."""
+        task = self._start()
+        return await asyncio.shield(task)
+
+    def _start(self) -> asyncio.Task:
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._run())
+            self._inflight.set_name(f"oidc_refresh:{self.name}")
+        return self._inflight
+
+    async def _run(self) -> Dict[str, Any]:
+        try:
+            value = await self._fetch()
+            if self._on_update is not None:
+                self._on_update(value)
+            self.fetches += 1
+            self.value = value
+            self.fetched_at = time.monotonic()
+            return value
+        except Exception as e:
+            self.failures += 1
+            self._failed_at = time.monotonic()
+            print(json.dumps({"type": "oidc_refresh_error", "doc": self.name, "err": str(e), "stale_s": round(self.age(), 1) if self.value else None}), flush=True)
+            if self.value is None or self.age() >= self.ttl_s + self.max_stale_s:
+                raise
+            return self.value
+        finally:
+            self._inflight = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "age_s": round(self.age(), 1) if self.value is not None else None,
+            "fetches": self.fetches,
+            "failures": self.failures,
+            "waits": self.waits,
+            "stale_served": self.stale_served,
+        }
+
+
+class KeyManager:
+    """Discovery doc + JWKS for one issuer, with a (kid, alg) -> parsed key index."""
+
+    def __init__(
+        self,
+        discovery_url: Optional[str],
+        get_json: GetJson,
+        *,
+        algorithms: tuple = ("RS256", "RS512"),
+        on_rotate: Optional[Callable[[], None]] = None,
+        min_forced_refresh_s: float = JWKS_MIN_REFRESH_S,
+    ) -> None:
+        self.discovery_url = discovery_url
+        self.algorithms = algorithms
+        self.min_forced_refresh_s = min_forced_refresh_s
+        self._get_json = get_json
+        self._on_rotate = on_rotate
+        self.keys: Dict[tuple, Any] = {}
+        self.forced = 0
+        self._forced_at = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+        self.discovery = SharedDoc("discovery", self._fetch_discovery)
+        self.jwks = SharedDoc("jwks", self._fetch_jwks, on_update=self._index)
+
+    async def _fetch_discovery(self) -> Dict[str, Any]:
+        if not self.discovery_url:
+            raise RuntimeError("OIDC_DISCOVERY_URL not configured")
+        return await self._get_json(self.discovery_url)
+
+    async def _fetch_jwks(self) -> Dict[str, Any]:
+        cfg = await self.discovery.get()
+        return await self._get_json(cfg["jwks_uri"])
+
+    def _index(self, jwks: Dict[str, Any]) -> None:
+        keys: Dict[tuple, Any] = {}
+        for k in jwks.get("keys", []):
+            kid = k.get("kid")
+            if not kid or k.get("use", "sig") != "sig":
+                continue
+            for alg in ([k["alg"]] if k.get("alg") else self.algorithms):
+                try:
+                    keys[(kid, alg)] = jwk.construct(k, alg)
+                except JWKError:
+                    continue
+        rotated = bool(self.keys) and set(keys) != set(self.keys)
+        self.keys = keys
+        if rotated:
+            print(json.dumps({"type": "jwks_rotated", "kids": sorted({kid for kid, _ in keys})}), flush=True)
+            if self._on_rotate is not None:
+                self._on_rotate()
+
+    async def config(self) -> Dict[str, Any]:
+        return await self.discovery.get()
+
+    async def key(self, kid: Optional[str], alg: str) -> Optional[Any]:
+        """Parsed key for (kid, alg), or None when the IdP doesn't publish it."""
+        await self.jwks.get()
+        key = self.keys.get((kid, alg))
+        if key is None and time.monotonic() - self._forced_at >= self.min_forced_refresh_s:
+            # Unknown kid: maybe a rotation we haven't seen yet
+            self._forced_at = time.monotonic()
+            self.forced += 1
+            await self.jwks.refresh()
+            key = self.keys.get((kid, alg))
+        return key
+
+    # ---- Background refresh ----
+
+    async def start(self) -> None:
+        """Warm both documents (best-effort) and keep them refreshed ahead of expiry."""
+        if not self.discovery_url or self._task is not None:
+            return
+        try:
+            await self.jwks.refresh()
+        except Exception:
+            pass  # logged; requests will retry through get()
+        self._task = asyncio.ensure_future(self._loop())
+        self._task.set_name("oidc_key_refresh")
+
+    async def _loop(self) -> None:
+        while True:
+            wait = min(self.discovery.due_in(), self.jwks.due_in())
+            await asyncio.sleep(max(1.0, wait))
+            for doc in (self.discovery, self.jwks):
+                if doc.due_in() <= 0:
+                    try:
+                        await doc.refresh()
+                    except Exception:
+                        pass  # logged; retried after OIDC_RETRY_S
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "discovery": self.discovery.stats(),
+            "jwks": self.jwks.stats(),
+            "keys": len(self.keys),
+            "forced_refreshes": self.forced,
+        }
@@ -0,0 +1,238 @@
+# apps/gateway-fastapi/src/features/admission.py
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+
+from src.utils.histogram import Histogram
+
+# Admission control for agent runs (/api/chat/stream and /api/chat/stream_files).
+#
+# - At most ADMISSION_MAX_INFLIGHT runs per gateway process, and at most
+#   ADMISSION_MAX_PER_USER of them for any one user_id.
+# - Requests over either cap wait in a bounded queue. Waiters are kept per user
+#   and dequeued round-robin across users, so one heavy user (or a UI retry
+#   storm) can't push everyone else to the back.
+# - When the queue (global or the user's share of it) is full, the route answers
+#   429 + Retry-After right away, before any other work is done.
+# - Waiting is bounded by ADMISSION_QUEUE_TIMEOUT_S; the chat routes stream an SSE
+#   `queued` event while a request waits, so the UI can show it.
+#
+# Slots are taken inside the SSE generator (never before the response starts), so
+# a client that disappears early can't leak one.
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "64"))
+ADMISSION_MAX_PER_USER = int(os.getenv("ADMISSION_MAX_PER_USER", "2"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "128"))
+ADMISSION_MAX_QUEUE_PER_USER = int(os.getenv("ADMISSION_MAX_QUEUE_PER_USER", "4"))
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "30"))
+ADMISSION_RETRY_AFTER_S = int(os.getenv("ADMISSION_RETRY_AFTER_S", "5"))
+
+BUSY_MESSAGE = "The assistant is busy right now. Please try again in a moment."
+
+
+class AdmissionRejected(Exception):
+    """No slot: the queue is full or the wait timed out."""
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(BUSY_MESSAGE)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """One admission; release() must run exactly once when the run is over."""
+
+    def __init__(self, ctl: Optional["AdmissionController"], user_id: str) -> None:
+        self._ctl = ctl
+        self.user_id = user_id
+        self.position = 0  # 1-based queue position at enqueue time (0 = admitted at once)
+        self.waited_s = 0.0
+        self._fut: Optional[asyncio.Future] = None
+        self._released = False
+
+    @property
+    def admitted(self) -> bool:
+        return self._fut is None or (self._fut.done() and not self._fut.cancelled())
+
+    async def wait(self, timeout: Optional[float] = None) -> None:
+        """Wait for a slot (no-op if admitted already). Raises AdmissionRejected on timeout."""
+        if self._fut is None:
+            return
+        ctl = self._ctl
+        t0 = time.perf_counter()
+        timeout = ctl.queue_timeout_s if timeout is None else timeout
+        try:
+            await asyncio.wait_for(asyncio.shield(self._fut), timeout=timeout)
+        except asyncio.TimeoutError:
+            ctl._abandon(self)
+            ctl.timeouts += 1
+            raise AdmissionRejected("queue_timeout", ctl.retry_after_s) from None
+        except asyncio.CancelledError:
+            ctl._abandon(self)
+            raise
+        finally:
+            self.waited_s = time.perf_counter() - t0
+        ctl.wait_hist.observe(self.waited_s)
+        self._fut = None
+
+    def release(self) -> None:
+        if self._released or self._ctl is None:
+            return
+        self._released = True
+        if self._fut is not None:
+            # Never admitted (e.g. the generator closed while queued)
+            self._ctl._abandon(self)
+            return
+        self._ctl._release(self.user_id)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        *,
+        enabled: bool = ADMISSION_ENABLED,
+        max_inflight: int = ADMISSION_MAX_INFLIGHT,
+        max_per_user: int = ADMISSION_MAX_PER_USER,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        max_queue_per_user: int = ADMISSION_MAX_QUEUE_PER_USER,
+        queue_timeout_s: float = ADMISSION_QUEUE_TIMEOUT_S,
+        retry_after_s: int = ADMISSION_RETRY_AFTER_S,
+    ) -> None:
+        self.enabled = enabled
+        self.max_inflight = max_inflight
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout_s = queue_timeout_s
+        self.retry_after_s = retry_after_s
+
+        self.inflight = 0
+        self.per_user: Dict[str, int] = {}
+        # user_id -> FIFO of waiters; dict order is the round-robin order
+        self.waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.queued = 0
+
+        self.admitted_total = 0
+        self.timeouts = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "user_queue_full": 0}
+        self.wait_hist = Histogram()
+
+    # ---- Decisions ----
+
+    def _can_run_now(self, user_id: str) -> bool:
+        return (
+            self.inflight < self.max_inflight
+            and self.per_user.get(user_id, 0) < self.max_per_user
+            and user_id not in self.waiting  # don't overtake this user's own waiters
+        )
+
+    def check(self, user_id: str) -> None:
+        """Fast pre-check for the route handler: raise if this request couldn't even queue."""
+        if not self.enabled or self._can_run_now(user_id):
+            return
+        if self.queued >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            raise AdmissionRejected("queue_full", self.retry_after_s)
+        if len(self.waiting.get(user_id, ())) >= self.max_queue_per_user:
+            self.rejected["user_queue_full"] += 1
+            raise AdmissionRejected("user_queue_full", self.retry_after_s)
+
+    def enter(self, user_id: str) -> Ticket:
+        """Take a slot now, or join the queue (then `await ticket.wait()`)."""
+        if not self.enabled:
+            return Ticket(None, user_id)
+        ticket = Ticket(self, user_id)
+        if self._can_run_now(user_id):
+            self._take(user_id)
+            self.wait_hist.observe(0.0)
+            return ticket
+        self.check(user_id)
+        fut = asyncio.get_running_loop().create_future()
+        self.waiting.setdefault(user_id, deque()).append(fut)
+        self.queued += 1
+        ticket._fut = fut
+        ticket.position = self.queued
+        return ticket
+
+    # ---- Bookkeeping ----
+
+    def _take(self, user_id: str) -> None:
+        self.inflight += 1
+        self.per_user[user_id] = self.per_user.get(user_id, 0) + 1
+        self.admitted_total += 1
+
+    def _release(self, user_id: str) -> None:
+        self.inflight -= 1
+        n = self.per_user.get(user_id, 0) - 1
+        if n > 0:
+            self.per_user[user_id] = n
+        else:
+            self.per_user.pop(user_id, None)
+        self._dispatch()
+
+    def _abandon(self, ticket: Ticket) -> None:
+        # The ticket is finished either way: a later release() must not free a
+        # slot it never held (or one handed on just below)
+        ticket._released = True
+        fut = ticket._fut
+        ticket._fut = None
+        if fut is None:
+            return
+        if fut.done() and not fut.cancelled():
+            # Granted in the same tick the waiter gave up: hand the slot on
+            self._release(ticket.user_id)
+            return
+        q = self.waiting.get(ticket.user_id)
+        if q is not None and fut in q:
+            q.remove(fut)
+            self.queued -= 1
+            if not q:
+                del self.waiting[ticket.user_id]
+        fut.cancel()
+
+    def _dispatch(self) -> None:
+        """Grant free slots round-robin: one waiter per user per pass."""
+        progressed = True
+        while progressed and self.waiting and self.inflight < self.max_inflight:
+            progressed = False
+            for user_id in list(self.waiting):
+                if self.inflight >= self.max_inflight:
+                    break
+                if self.per_user.get(user_id, 0) >= self.max_per_user:
+                    continue
+                q = self.waiting[user_id]
+                fut = q.popleft()
+                self.queued -= 1
+                if q:
+                    self.waiting.move_to_end(user_id)
+                else:
+                    del self.waiting[user_id]
+                self._take(user_id)
+                fut.set_result(None)
+                progressed = True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "inflight": self.inflight,
+            "queue_depth": self.queued,
+            "users_inflight": len(self.per_user),
+            "users_waiting": len(self.waiting),
+            "admitted": self.admitted_total,
+            "rejected": dict(self.rejected),
+            "timeouts": self.timeouts,
+            "wait_s": self.wait_hist.snapshot(),
+        }
+
+
+# One controller per gateway process, shared by both chat routes
+ADMISSION = AdmissionController()
+
+
+def admission_stats() -> Dict[str, Any]:
+    return ADMISSION.stats()
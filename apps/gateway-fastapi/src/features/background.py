@@ -0,0 +1,419 @@
+# apps/gateway-fastapi/src/features/background.py
+from __future__ import annotations
+
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from prynai_shared.streaming import chunk_to_text, sse_data, sse_event, DONE_FRAME
+
+from src.features.websearch import ChatIn, build_langgraph_config
+from src.features.threads import latest_or_new_thread
+from src.features.ownership import owned_thread, unowned_thread
+from src.features.transcript import append_transcript, flush_transcript, last_message, TranscriptMessage
+from src.features.moderation import (
+    start_input_moderation,
+    is_flagged,
+    OutputFlagged,
+    OutputModerator,
+    INPUT_BLOCKED_MESSAGE,
+    OUTPUT_BLOCKED_MESSAGE,
+)
+from src.features.runs import ACTIVE_RUNS, stream_text
+from src.features.sse import coalesce, supervise
+from src.features.pipeline import StageTimer, spawn
+from src.features.admission import ADMISSION, AdmissionRejected
+from src.features.metrics import upstream_error, STREAMS_INFLIGHT
+from src.features.replay import resume_after
+from src.utils.ttl_cache import TTLCache, MISSING
+
+# Background-run chat mode: the agent run is decoupled from the HTTP connection.
+#
+#   POST /api/chat/runs                  start a run (runs.create), write the user
+#                                        turn, answer 202 {run_id, thread_id} at once
+#   GET  /api/chat/runs/{run_id}/stream  attach to the run's output (SSE, from the
+#                                        start: runs are created stream_resumable)
+#   GET  /api/chat/runs/{run_id}         status + final answer once it's done
+#
+# Nothing is cancelled when a client detaches; POST /api/chat/runs/{run_id}/cancel
+# (runs.py) still works. A watcher task on the gateway that started the run joins
+# it (runs.join), moderates the final answer and appends the assistant turn to the
+# transcript whether or not anybody is attached. A run keeps its admission slot
+# until the watcher sees it finish.
+#
+# BG_RUNS is per process (like ACTIVE_RUNS): on another replica, GET needs
+# ?thread_id= so ownership can be checked through the Threads API.
+#
+# The watcher only lives on the replica that started the run. A graceful
+# shutdown drains it, but a crash mid-run loses the assistant turn, and the held
+# user turn with it. GET /{run_id} then persists the turn from the thread state.
+# The run must have ended at least BG_PERSIST_AFTER_S ago, so a live watcher
+# elsewhere has had its chance. It is skipped when the transcript already ends
+# with the answer, and the user turn is written too unless the transcript ends
+# with it. Only a GET writes it: a run nobody asks about stays out of the
+# transcript.
+#
+# Attach ids: every data frame has `id: <n>`, where n is the number of answer
+# characters sent so far. The SDK's stream parts don't expose upstream event
+# ids, so attach always joins with the replay-all sentinel (Last-Event-ID -1) and
+# drops the first n characters the client already has (its Last-Event-ID).
+
+GRAPH_NAME = os.environ.get("LANGGRAPH_GRAPH", "chat")
+BG_RUN_TTL_S = float(os.getenv("BG_RUN_TTL_S", "3600"))  # finished entries kept for GET
+BG_RUN_MAX = int(os.getenv("BG_RUN_MAX", "10000"))
+BG_PERSIST_AFTER_S = float(os.getenv("BG_PERSIST_AFTER_S", "30"))
+
+ROUTE = "/api/chat/runs"
+_RUNNING = ("pending", "running")
+REPLAY_ALL = "-1"  # Last-Event-ID for join_stream: every event since the run began
+
+
+class BackgroundRun:
+    """What this gateway knows about one background run it started."""
+
+    def __init__(self, run_id: str, thread_id: str, user_id: str) -> None:
+        self.run_id = run_id
+        self.thread_id = thread_id
+        self.user_id = user_id
+        self.status = "pending"
+        self.answer: Optional[str] = None
+        self.flagged = False
+        self.error: Optional[str] = None
+        self.done = False
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"run_id": self.run_id, "thread_id": self.thread_id, "status": self.status}
+        if self.done:
+            out["answer"] = None if self.flagged else self.answer
+        if self.flagged:
+            out["policy"] = OUTPUT_BLOCKED_MESSAGE
+        if self.error:
+            out["error"] = self.error
+        return out
+
+
+# run_id -> BackgroundRun, oldest first
+BG_RUNS: "OrderedDict[str, BackgroundRun]" = OrderedDict()
+# Runs whose orphaned answer a GET here already considered (persisted or not)
+PERSISTED: "TTLCache[str, bool]" = TTLCache(maxsize=BG_RUN_MAX, ttl_s=BG_RUN_TTL_S)
+
+
+def _prune() -> None:
+    now = time.monotonic()
+    for rid, r in list(BG_RUNS.items()):
+        if r.done and now - (r.finished_at or now) >= BG_RUN_TTL_S:
+            del BG_RUNS[rid]
+    # Over the cap: drop the oldest finished entries (live ones still need their watcher)
+    for rid, r in list(BG_RUNS.items()):
+        if len(BG_RUNS) <= BG_RUN_MAX:
+            break
+        if r.done:
+            del BG_RUNS[rid]
+
+
+def background_stats() -> Dict[str, int]:
+    return {"runs": len(BG_RUNS), "live": sum(1 for r in BG_RUNS.values() if not r.done)}
+
+
+def _kind(msg: Any) -> Optional[str]:
+    if isinstance(msg, dict):
+        return msg.get("type") or msg.get("role")
+    return getattr(msg, "type", None)
+
+
+def _final_text(values: Any) -> Optional[str]:
+    """The answer in a thread's final values: the last message, if it is the AI's."""
+    msgs = (values or {}).get("messages") if isinstance(values, dict) else None
+    if not msgs or _kind(msgs[-1]) not in ("ai", "assistant"):
+        return None
+    return chunk_to_text(msgs[-1]) or None
+
+
+def _final_question(values: Any) -> Optional[str]:
+    """The user message the final answer replies to."""
+    msgs = (values or {}).get("messages") if isinstance(values, dict) else None
+    for m in reversed(msgs or []):
+        if _kind(m) in ("human", "user"):
+            return chunk_to_text(m) or None
+    return None
+
+
+def _ended_ago_s(run: Dict[str, Any]) -> Optional[float]:
+    raw = run.get("updated_at")
+    try:
+        ended = datetime.fromisoformat(raw) if isinstance(raw, str) else None
+    except ValueError:
+        return None
+    if ended is None:
+        return None
+    if ended.tzinfo is None:
+        ended = ended.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - ended).total_seconds()
+
+
+async def _persist_orphan(
+    client, user_id: str, thread_id: str, run: Dict[str, Any], question: Optional[str], answer: str,
+) -> bool:
+    """Write the turn of a run whose watcher is gone (see the module comment)."""
+    run_id = run.get("run_id") or ""
+    if PERSISTED.get(run_id) is not MISSING:
+        return False
+    ago = _ended_ago_s(run)
+    if ago is not None and ago < BG_PERSIST_AFTER_S:
+        return False
+    PERSISTED.put(run_id, True)
+    try:
+        last = await last_message(client, user_id, thread_id) or {}
+        if last.get("role") == "assistant" and last.get("content") == answer:
+            return False
+        if question and not (last.get("role") == "user" and last.get("content") == question):
+            await append_transcript(client, user_id, thread_id, TranscriptMessage(role="user", content=question), hold=True)
+        await append_transcript(client, user_id, thread_id, TranscriptMessage(role="assistant", content=answer))
+    except BaseException:
+        PERSISTED.pop(run_id)  # let the next GET retry
+        raise
+    print(json.dumps({"type": "background_run_persisted", "tid": thread_id, "run_id": run_id, "chars": len(answer)}), flush=True)
+    return True
+
+
+async def _skip_chars(texts: AsyncIterator[str], n: int) -> AsyncIterator[str]:
+    """`texts` without its first n characters (what a re-attaching client already has)."""
+    async for t in texts:
+        if n >= len(t):
+            n -= len(t)
+            continue
+        yield t[n:]
+        n = 0
+
+
+async def _join(client, thread_id: str, run_id: str) -> Any:
+    # join blocks until the run ends; a read timeout only means it's still running
+    while True:
+        try:
+            return await client.runs.join(thread_id, run_id)
+        except httpx.ReadTimeout:
+            continue
+
+
+async def _watch(client, bg: BackgroundRun, ticket, timer: StageTimer, user_write: "asyncio.Task", run_start: float) -> None:
+    """Follow the run to its end, then persist the assistant turn (no client needed)."""
+    try:
+        try:
+            values = await timer.run("run", _join(client, bg.thread_id, bg.run_id))
+            run = await client.runs.get(bg.thread_id, bg.run_id)
+            bg.status = run.get("status") or "success"
+            bg.answer = _final_text(values) if bg.status == "success" else None
+        except Exception as e:
+            upstream_error(ROUTE, "langgraph")
+            bg.status, bg.error = "error", str(e)
+        timer.span("agent_run", run_start, run_id=bg.run_id, status="ok" if bg.status == "success" else "error")
+
+        if bg.answer:
+            bg.flagged = await timer.run("moderation_output", is_flagged(bg.answer, kind="output", route=ROUTE))
+        # The assistant turn goes after the (held) user turn, in the same store write
+        await user_write
+        try:
+            if bg.answer and not bg.flagged:
+                await timer.run("transcript_assistant", append_transcript(
+                    client, bg.user_id, bg.thread_id,
+                    TranscriptMessage(role="assistant", content=bg.answer)
+                ))
+            else:
+                await timer.run("transcript_assistant", flush_transcript(bg.user_id, bg.thread_id))
+        except Exception as e:
+            upstream_error(ROUTE, "store")
+            print(json.dumps({"type": "transcript_write_error", "when": "assistant", "tid": bg.thread_id, "err": str(e)}), flush=True)
+    finally:
+        ticket.release()
+        ACTIVE_RUNS.pop(bg.run_id, None)
+        bg.done = True
+        bg.finished_at = time.monotonic()
+        timer.log(tid=bg.thread_id, run_id=bg.run_id, status=bg.status, chars=len(bg.answer or ""), flagged=bg.flagged)
+
+
+def make_background_runs_router(client, get_current_user, user_id_from_claims) -> APIRouter:
+    """
+    Endpoints:
+      POST /api/chat/runs                             -> 202 {run_id, thread_id, status}
+      GET  /api/chat/runs/{run_id}[?thread_id=...]    -> {run_id, thread_id, status, answer}
+      GET  /api/chat/runs/{run_id}/stream[?thread_id=...]  -> SSE (run, data..., done); data frames
+           carry `id:` = answer characters so far, and Last-Event-ID resumes after them
+    """
+    router = APIRouter(prefix=ROUTE, tags=["chat"])
+
+    async def _user(request: Request) -> str:
+        claims = await get_current_user(request)
+        if not claims:
+            raise HTTPException(status_code=401, detail="unauthenticated")
+        return user_id_from_claims(claims)
+
+    async def _owned_thread(run_id: str, user_id: str, thread_id: Optional[str]) -> str:
+        # Same rule as the cancel endpoint: local entry, else thread ownership
+        bg = BG_RUNS.get(run_id)
+        if bg is not None:
+            if bg.user_id != user_id:
+                raise HTTPException(status_code=404, detail="not_found")
+            return bg.thread_id
+        if not thread_id:
+            raise HTTPException(status_code=404, detail="not_found")
+        if await owned_thread(client, thread_id, user_id) is None:
+            raise HTTPException(status_code=404, detail="not_found")
+        return thread_id
+
+    @router.post("", status_code=202)
+    async def start_run(payload: ChatIn, request: Request):
+        timer = StageTimer(ROUTE)
+        user_id = await timer.run("auth", _user(request))
+
+        # A background run holds a run slot like a streamed one, but nothing waits in
+        # a queue here: without a free slot the caller gets 429 and retries.
+        try:
+            ADMISSION.check(user_id)
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+        ticket = ADMISSION.enter(user_id)
+        if not ticket.admitted:
+            ticket.release()
+            raise HTTPException(status_code=429, detail="busy", headers={"Retry-After": str(ADMISSION.retry_after_s)})
+
+        try:
+            # No client is there to gate tokens on, so the verdict comes first
+            if await timer.run("moderation_input", start_input_moderation(payload.message, route=ROUTE)):
+                raise HTTPException(status_code=400, detail=INPUT_BLOCKED_MESSAGE)
+
+            config = build_langgraph_config(payload)
+            config.setdefault("configurable", {})["user_id"] = user_id
+            thread_id = config["configurable"].get("thread_id")
+            if thread_id:
+                try:
+                    unowned = await timer.run("thread_owner", unowned_thread(client, thread_id, user_id))
+                except Exception:
+                    upstream_error(ROUTE, "langgraph")
+                    raise HTTPException(status_code=502, detail="thread_lookup_failed")
+                if unowned:
+                    raise HTTPException(status_code=404, detail="thread_not_found")
+            else:
+                try:
+                    thread_id = await timer.run("thread", latest_or_new_thread(client, user_id))
+                except Exception:
+                    upstream_error(ROUTE, "langgraph")
+                    raise HTTPException(status_code=502, detail="thread_unavailable")
+                config["configurable"]["thread_id"] = thread_id
+            agent_span = timer.trace.child()
+            config["configurable"].update(agent_span.to_configurable())
+
+            run_start = time.perf_counter()
+            try:
+                run = await timer.run("create", client.runs.create(
+                    thread_id, GRAPH_NAME,
+                    input={"messages": [{"role": "user", "content": payload.message}]},
+                    config=config,
+                    stream_mode="messages-tuple",
+                    stream_resumable=True,
+                ))
+            except Exception as e:
+                upstream_error(ROUTE, "langgraph")
+                raise HTTPException(status_code=502, detail=f"run_create_failed:{e}")
+        except BaseException:
+            ticket.release()
+            raise
+
+        run_id = run["run_id"]
+        _prune()
+        bg = BG_RUNS[run_id] = BackgroundRun(run_id, thread_id, user_id)
+        bg.status = run.get("status") or "pending"
+        ACTIVE_RUNS[run_id] = (user_id, thread_id)
+
+        async def write_user_turn():
+            try:
+                await timer.run("transcript_user", append_transcript(
+                    client, user_id, thread_id,
+                    TranscriptMessage(role="user", content=payload.message), hold=True,
+                ))
+            except Exception as e:
+                upstream_error(ROUTE, "store")
+                print(json.dumps({"type": "transcript_write_error", "when": "user", "tid": thread_id, "err": str(e)}), flush=True)
+
+        user_write = spawn(write_user_turn(), name="transcript_user")
+        spawn(_watch(client, bg, ticket, timer, user_write, run_start), name="background_run")
+        print(json.dumps({"type": "background_run_started", "tid": thread_id, "run_id": run_id, "trace": timer.trace_id}), flush=True)
+        return JSONResponse(bg.to_dict(), status_code=202, headers={"X-Trace-Id": timer.trace_id})
+
+    @router.get("/{run_id}")
+    async def get_run(run_id: str, request: Request, thread_id: Optional[str] = None) -> Dict[str, Any]:
+        user_id = await _user(request)
+        tid = await _owned_thread(run_id, user_id, thread_id)
+        bg = BG_RUNS.get(run_id)
+        if bg is not None and bg.done:
+            return bg.to_dict()
+        try:
+            run = await client.runs.get(tid, run_id)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                raise HTTPException(status_code=404, detail="not_found")
+            upstream_error(ROUTE, "langgraph")
+            raise HTTPException(status_code=502, detail="upstream_error")
+        status = run.get("status") or "pending"
+        out: Dict[str, Any] = {"run_id": run_id, "thread_id": tid, "status": status}
+        if status in _RUNNING or bg is not None:
+            # Still running, or finished a moment ago and our watcher is persisting it
+            return out
+        # Started elsewhere (another replica): read the answer from the thread state
+        answer = None
+        if status == "success":
+            state = await client.threads.get_state(tid)
+            values = state.get("values")
+            answer = _final_text(values)
+            if answer and await is_flagged(answer, kind="output", route=ROUTE):
+                answer = None
+                out["policy"] = OUTPUT_BLOCKED_MESSAGE
+            if answer:
+                try:
+                    await _persist_orphan(client, user_id, tid, run, _final_question(values), answer)
+                except Exception as e:
+                    upstream_error(ROUTE, "store")
+                    print(json.dumps({"type": "transcript_write_error", "when": "orphan", "tid": tid, "err": str(e)}), flush=True)
+        out["answer"] = answer
+        return out
+
+    @router.get("/{run_id}/stream")
+    async def attach(run_id: str, request: Request, thread_id: Optional[str] = None, last_event_id: Optional[str] = None):
+        user_id = await _user(request)
+        tid = await _owned_thread(run_id, user_id, thread_id)
+        after = resume_after(request, last_event_id)
+
+        async def event_gen() -> AsyncIterator[bytes]:
+            inflight = STREAMS_INFLIGHT.labels(ROUTE)
+            inflight.inc()
+            try:
+                yield sse_event("run", run_id)
+                parts = client.runs.join_stream(tid, run_id, stream_mode="messages-tuple", last_event_id=REPLAY_ALL)
+                # The moderator sees the whole answer; the client gets what it lacks
+                moderated = OutputModerator(route=ROUTE).watch(stream_text(parts, chunk_to_text))
+                sent = after
+                async for text in coalesce(_skip_chars(moderated, after)):
+                    sent += len(text)
+                    yield b"id: %d\n" % sent + sse_data(text)
+            except OutputFlagged:
+                yield sse_event("policy", OUTPUT_BLOCKED_MESSAGE)
+            except Exception as e:
+                upstream_error(ROUTE, "langgraph")
+                yield sse_event("error", str(e))
+            finally:
+                inflight.dec()
+            yield DONE_FRAME
+
+        headers = {"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"}
+        # Heartbeats only: detaching leaves the run (and its watcher) alone
+        return StreamingResponse(supervise(event_gen(), request), media_type="text/event-stream", headers=headers)
+
+    return router
@@ -0,0 +1,154 @@
+# apps/gateway-fastapi/src/features/chat_stream.py
+from __future__ import annotations
+
+import json
+import time
+import asyncio
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from prynai_shared.streaming import chunk_to_text, sse_data, sse_event, DONE_FRAME
+
+from src.features.transcript import append_transcript, flush_transcript, TranscriptMessage
+from src.features.moderation import (
+    gate_stream,
+    InputFlagged,
+    OutputFlagged,
+    OutputModerator,
+    INPUT_BLOCKED_MESSAGE,
+    OUTPUT_BLOCKED_MESSAGE,
+)
+from src.features.sse import coalesce, CoalesceStats
+from src.features.runs import AgentRun
+from src.features.pipeline import StageTimer, spawn
+from src.features.admission import ADMISSION, AdmissionRejected, BUSY_MESSAGE
+from src.features.metrics import record_stream, upstream_error, STREAMS_INFLIGHT
+from src.features.replay import serve_stream
+
+# The streaming half of the chat routes (/api/chat/stream, /api/chat/stream_files).
+#
+# A route authenticates, checks thread ownership, starts input moderation and
+# builds the agent input/config; stream_chat_run() does the rest the same way for
+# both: queue the user turn once the input is cleared, take a fair run slot,
+# stream the agent run through output moderation and SSE coalescing, and on the
+# way out (also after a disconnect) release the slot, record metrics and the
+# agent_run span, and write the assistant turn after the user turn.
+
+
+def stream_chat_run(
+    client,
+    request: Request,
+    *,
+    route: str,
+    timer: StageTimer,
+    graph: str,
+    user_id: str,
+    message: str,
+    messages: List[Dict[str, Any]],
+    config: Dict[str, Any],
+    mod_task: "asyncio.Task[bool]",
+    **log_extra: Any,
+) -> StreamingResponse:
+    """Run `graph` on `messages` and stream the reply as SSE; `message` is the user turn persisted."""
+    configurable = config.setdefault("configurable", {})
+    # The agent's spans (chat_node) nest under this request's agent_run span
+    agent_span = timer.trace.child()
+    configurable.update(agent_span.to_configurable())
+    thread_id = configurable.get("thread_id")
+
+    # Queue the user turn as soon as the input is cleared (flagged input is never persisted);
+    # it is held in the transcript writer and lands together with the assistant turn
+    async def write_user_turn():
+        if not thread_id or await mod_task:
+            return
+        try:
+            await timer.run("transcript_user", append_transcript(
+                client, user_id, thread_id,
+                TranscriptMessage(role="user", content=message), hold=True,
+            ))
+        except Exception as e:
+            upstream_error(route, "store")
+            print(json.dumps({"type": "transcript_write_error", "when": "user", "tid": thread_id, "err": str(e)}), flush=True)
+
+    user_write = spawn(write_user_turn(), name="transcript_user")
+
+    # Agent run via the SDK runs API (run_id known -> cancellable on disconnect)
+    run = AgentRun(
+        client, graph,
+        user_id=user_id, thread_id=thread_id,
+        input={"messages": messages}, config=config,
+    )
+
+    async def event_gen() -> AsyncGenerator[bytes, None]:
+        acc: list[str] = []
+        frames = CoalesceStats()
+        ticket = None
+        run_start: Optional[float] = None
+        inflight = STREAMS_INFLIGHT.labels(route)
+        inflight.inc()
+        try:
+            # Run slot (fair per-user queue); taken here so a vanished client can't leak it
+            ticket = ADMISSION.enter(user_id)
+            if not ticket.admitted:
+                yield sse_event("queued", json.dumps({"position": ticket.position}))
+                await timer.run("queue", ticket.wait())
+                yield sse_event("queued", json.dumps({"position": 0, "waited_ms": round(ticket.waited_s * 1000)}))
+            run_start = time.perf_counter()
+            # Output windows are moderated in the background while tokens stream;
+            # chunks are then coalesced into fewer SSE frames (first token goes out at once).
+            moderated = OutputModerator(route=route).watch(gate_stream(run.text(chunk_to_text), mod_task))
+            async for kind, text in run.announced(coalesce(moderated, stats=frames)):
+                if kind == "run":
+                    # Lets the UI call POST /api/chat/runs/{run_id}/cancel (before any token)
+                    yield sse_event("run", text)
+                    continue
+                if not acc:
+                    timer.mark("ttft")
+                acc.append(text)
+                yield sse_data(text)
+        except AdmissionRejected:
+            yield sse_event("error", BUSY_MESSAGE)
+        except InputFlagged:
+            yield sse_event("policy", INPUT_BLOCKED_MESSAGE)
+        except OutputFlagged:
+            yield sse_event("policy", OUTPUT_BLOCKED_MESSAGE)
+        except Exception as e:
+            upstream_error(route, "langgraph")
+            yield sse_event("error", str(e))
+        finally:
+            # Also runs when the client went away (generator closed/cancelled):
+            # persist what was produced, but never yield from here.
+            if ticket is not None:
+                ticket.release()
+            inflight.dec()
+            timer.mark("stream")
+            record_stream(route, timer.stages, frames)
+            if run_start is not None:
+                timer.span("agent_run", run_start, span_id=agent_span.span_id, run_id=run.run_id, chunks=frames.chunks_in)
+            # The assistant turn goes after the user turn, in the same store write;
+            # with no answer the held user turn is flushed on its own
+            await user_write
+            if thread_id:
+                try:
+                    if acc:
+                        await timer.run("transcript_assistant", append_transcript(
+                            client, user_id, thread_id,
+                            TranscriptMessage(role="assistant", content="".join(acc))
+                        ))
+                    else:
+                        await timer.run("transcript_assistant", flush_transcript(user_id, thread_id))
+                except Exception as e:
+                    upstream_error(route, "store")
+                    print(json.dumps({"type": "transcript_write_error", "when": "assistant", "tid": thread_id, "err": str(e)}), flush=True)
+            timer.log(tid=thread_id, run_id=run.run_id, **log_extra, chars=sum(len(t) for t in acc), **frames.as_dict())
+        yield DONE_FRAME
+
+    headers = {"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no", "X-Trace-Id": timer.trace_id}
+    # Heartbeats + disconnect detection; a vanished client cancels the run upstream
+    # (after the resume grace period when streams are resumable, see replay.py)
+    stream, stream_id = serve_stream(event_gen(), request, user_id=user_id, on_disconnect=run.cancel)
+    if stream_id:
+        headers["X-Stream-Id"] = stream_id
+    return StreamingResponse(stream, media_type="text/event-stream", headers=headers)
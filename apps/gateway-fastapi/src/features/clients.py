@@ -0,0 +1,249 @@
+# apps/gateway-fastapi/src/features/clients.py
+from __future__ import annotations
+
+import os
+import json
+import asyncio
+import importlib.util
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from langgraph_sdk import get_client
+from langgraph_sdk.client import LangGraphClient
+
+from src.features.store_cache import with_cached_store
+
+# Outbound clients for the whole gateway process, created once by the FastAPI
+# lifespan (CLIENTS.start()) and closed on shutdown (CLIENTS.aclose()):
+#
+#   langgraph  LangGraph SDK client on one tuned pool (HTTP/2 when `h2` is installed,
+#              negotiated via ALPN, i.e. against the https deployment);
+#              routers get it through CLIENTS.langgraph_handle(), which also serves
+#              .store from the process-wide Store cache
+#   openai     AsyncOpenAI (moderation) on its own pool
+#   identity   httpx.AsyncClient for OIDC discovery / JWKS fetches
+#
+# Pool sizes and timeouts come from env (below). Each client runs on a transport
+# we build and keep: _CountingTransport wraps httpx.AsyncHTTPTransport through
+# httpx's public transport API and counts requests in flight, from send until
+# the response body is closed (a streamed run counts for its whole length).
+# pool_stats() reports that next to max_connections, plus the peak since the last
+# POOL_STATS_LOG_S log line so saturation shows up even between scrapes. Over
+# HTTP/1.1, in_flight above max_connections means requests are queued for a
+# connection; over HTTP/2 they share connections instead.
+
+LANGGRAPH_URL = os.environ.get("LANGGRAPH_URL", "")
+LANGGRAPH_HTTP2 = os.getenv("LANGGRAPH_HTTP2", "true").lower() == "true"
+LANGGRAPH_MAX_CONNECTIONS = int(os.getenv("LANGGRAPH_MAX_CONNECTIONS", "200"))
+LANGGRAPH_MAX_KEEPALIVE = int(os.getenv("LANGGRAPH_MAX_KEEPALIVE", "50"))
+LANGGRAPH_KEEPALIVE_EXPIRY_S = float(os.getenv("LANGGRAPH_KEEPALIVE_EXPIRY_S", "30"))
+LANGGRAPH_CONNECT_TIMEOUT_S = float(os.getenv("LANGGRAPH_CONNECT_TIMEOUT_S", "5"))
+LANGGRAPH_READ_TIMEOUT_S = float(os.getenv("LANGGRAPH_READ_TIMEOUT_S", "300"))  # long: run streams
+LANGGRAPH_POOL_TIMEOUT_S = float(os.getenv("LANGGRAPH_POOL_TIMEOUT_S", "10"))
+LANGGRAPH_RETRIES = int(os.getenv("LANGGRAPH_RETRIES", "3"))  # connect errors only
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "1"))
+
+IDENTITY_MAX_CONNECTIONS = int(os.getenv("IDENTITY_MAX_CONNECTIONS", "10"))
+IDENTITY_TIMEOUT_S = float(os.getenv("IDENTITY_TIMEOUT_S", "10"))
+
+POOL_STATS_LOG_S = float(os.getenv("POOL_STATS_LOG_S", "60"))  # 0 = don't log
+
+
+def _h2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class _CountedStream(httpx.AsyncByteStream):
+    """A response body that reports when it is closed (read to the end, or abandoned)."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]) -> None:
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_close()
+
+
+class _CountingTransport(httpx.AsyncBaseTransport):
+    """httpx.AsyncHTTPTransport plus a count of requests in flight."""
+
+    def __init__(self, limits: httpx.Limits, **kwargs: Any) -> None:
+        self.max_connections = limits.max_connections or 0
+        self._inner = httpx.AsyncHTTPTransport(limits=limits, **kwargs)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            resp = await self._inner.handle_async_request(request)
+        except BaseException:
+            self.in_flight -= 1
+            raise
+        closed = False
+
+        def on_close() -> None:
+            nonlocal closed
+            if not closed:
+                closed = True
+                self.in_flight -= 1
+
+        return httpx.Response(
+            status_code=resp.status_code,
+            headers=resp.headers,
+            stream=_CountedStream(resp.stream, on_close),
+            extensions=resp.extensions,
+            request=request,
+        )
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_connections": self.max_connections,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+        }
+
+
+class ClientRegistry:
+    """Process-wide outbound clients; attributes are valid between start() and aclose()."""
+
+    def __init__(self) -> None:
+        self.langgraph: Optional[LangGraphClient] = None
+        self.langgraph_cached: Any = None  # langgraph with the Store cache in front of .store
+        self.openai: Optional[AsyncOpenAI] = None
+        self.identity: Optional[httpx.AsyncClient] = None
+        self.http2 = False
+        self._transports: Dict[str, _CountingTransport] = {}
+        self._logger: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self.langgraph is not None
+
+    async def start(self, langgraph_url: str = LANGGRAPH_URL) -> None:
+        if self.started:
+            return
+        self.http2 = LANGGRAPH_HTTP2 and _h2_available()
+        if LANGGRAPH_HTTP2 and not self.http2:
+            print(json.dumps({"type": "langgraph_http2_unavailable", "hint": "pip install 'httpx[http2]'"}), flush=True)
+
+        self._transports = {
+            "langgraph": _CountingTransport(
+                httpx.Limits(
+                    max_connections=LANGGRAPH_MAX_CONNECTIONS,
+                    max_keepalive_connections=LANGGRAPH_MAX_KEEPALIVE,
+                    keepalive_expiry=LANGGRAPH_KEEPALIVE_EXPIRY_S,
+                ),
+                http2=self.http2,
+                retries=LANGGRAPH_RETRIES,
+            ),
+            "openai": _CountingTransport(httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+            )),
+            "identity": _CountingTransport(httpx.Limits(
+                max_connections=IDENTITY_MAX_CONNECTIONS,
+                max_keepalive_connections=IDENTITY_MAX_CONNECTIONS,
+            )),
+        }
+
+        # get_client() knows the SDK headers (api key, user agent); reuse them on our pool
+        sdk_default = get_client(url=langgraph_url)
+        headers = dict(sdk_default.http.client.headers)
+        await sdk_default.aclose()
+        self.langgraph = LangGraphClient(httpx.AsyncClient(
+            base_url=langgraph_url,
+            headers=headers,
+            timeout=httpx.Timeout(
+                connect=LANGGRAPH_CONNECT_TIMEOUT_S,
+                read=LANGGRAPH_READ_TIMEOUT_S,
+                write=LANGGRAPH_READ_TIMEOUT_S,
+                pool=LANGGRAPH_POOL_TIMEOUT_S,
+            ),
+            transport=self._transports["langgraph"],
+        ))
+        self.langgraph_cached = with_cached_store(self.langgraph)
+
+        self.openai = AsyncOpenAI(
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=DefaultAsyncHttpxClient(timeout=OPENAI_TIMEOUT_S, transport=self._transports["openai"]),
+        )
+        self.identity = httpx.AsyncClient(timeout=IDENTITY_TIMEOUT_S, transport=self._transports["identity"])
+        if POOL_STATS_LOG_S > 0:
+            self._logger = asyncio.create_task(self._log_stats(), name="pool_stats")
+
+    async def aclose(self) -> None:
+        if self._logger is not None:
+            self._logger.cancel()
+            await asyncio.gather(self._logger, return_exceptions=True)
+            self._logger = None
+        for closer in (
+            self.langgraph.aclose if self.langgraph else None,
+            self.openai.close if self.openai else None,
+            self.identity.aclose if self.identity else None,
+        ):
+            if closer is not None:
+                try:
+                    await closer()
+                except Exception as e:
+                    print(json.dumps({"type": "client_close_error", "err": str(e)}), flush=True)
+        self.langgraph = self.langgraph_cached = self.openai = self.identity = None
+
+    # ---- Pool metrics ----
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: t.stats() for name, t in self._transports.items()}
+
+    async def _log_stats(self) -> None:
+        while True:
+            await asyncio.sleep(POOL_STATS_LOG_S)
+            print(json.dumps({"type": "pool_stats", "http2": self.http2, **self.pool_stats()}), flush=True)
+            for t in self._transports.values():
+                t.peak_in_flight = t.in_flight
+
+    # ---- Injection ----
+
+    def langgraph_handle(self) -> "_Live":
+        """What the routers get as `client`: resolves to the live client on every use."""
+        return _Live(self, "langgraph_cached")
+
+
+class _Live:
+    """Forwards attribute access to a registry attribute that only exists after start()."""
+
+    def __init__(self, registry: ClientRegistry, attr: str) -> None:
+        self._registry = registry
+        self._attr = attr
+
+    def __getattr__(self, name: str) -> Any:
+        target = getattr(self._registry, self._attr)
+        if target is None:
+            raise RuntimeError("gateway clients are not started (FastAPI lifespan)")
+        return getattr(target, name)
+
+
+# One registry per gateway process
+CLIENTS = ClientRegistry()
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    return CLIENTS.pool_stats()
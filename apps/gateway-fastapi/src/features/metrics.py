@@ -0,0 +1,357 @@
+# apps/gateway-fastapi/src/features/metrics.py
+from __future__ import annotations
+
+import os
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from src.utils.histogram import Histogram, DEFAULT_BUCKETS_S
+
+# In-process metrics, exposed at GET /metrics in the Prometheus text format (0.0.4).
+#
+# Chat routes are labeled by route ("/api/chat/stream", "/api/chat/stream_files"):
+#   gateway_chat_stage_seconds{route,stage}      auth, queue, profile, moderation_input,
+#                                                 moderation_output, thread, transcript_user,
+#                                                 transcript_assistant, transcript_read, ttft, stream
+#   gateway_chat_tokens_per_second{route}        streamed chunks / (stream end - first token)
+#   gateway_sse_{chunks,frames,bytes}_total{route}
+#   gateway_moderation_flags_total{route,kind}
+#   gateway_upstream_errors_total{route,upstream}   langgraph | openai | store
+#   gateway_streams_inflight{route}
+# plus, collected at scrape time from the modules that own them: admission queue,
+# outbound connection pools, Store / moderation caches, Store writes and embedding
+# work per namespace, the transcript writer, background tasks and the SSE replay buffer.
+#
+# Stage timings are fed by StageTimer (src/features/pipeline.py) as each stage ends.
+# /metrics fails closed: it needs "Authorization: Bearer <METRICS_TOKEN>", and
+# without a token configured it answers 404. METRICS_PUBLIC=true serves it
+# unauthenticated when no token is set (local benches only).
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "false").lower() == "true"
+
+LabelValues = Tuple[str, ...]
+
+TOKENS_PER_SECOND_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 120, 160, 250, 500)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if isinstance(v, float):
+        return str(int(v)) if v.is_integer() else repr(v)
+    return str(v)
+
+
+class _Family:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, n: float = 1.0) -> None:
+        self.value += n
+
+    def dec(self, n: float = 1.0) -> None:
+        self.value -= n
+
+    def set(self, v: float) -> None:
+        self.value = v
+
+
+class CounterFamily(_Family):
+    kind = "counter"
+
+    def __init__(self, *a: Any, **kw: Any) -> None:
+        super().__init__(*a, **kw)
+        self._children: Dict[LabelValues, _Value] = {}
+
+    def labels(self, *values: str) -> _Value:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _Value()
+        return child
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, child in sorted(self._children.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_num(child.value)}")
+        return lines
+
+
+class GaugeFamily(CounterFamily):
+    kind = "gauge"
+
+
+class HistogramFamily(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS_S) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._children: Dict[LabelValues, Histogram] = {}
+
+    def labels(self, *values: str) -> Histogram:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = Histogram(self.buckets)
+        return child
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, h in sorted(self._children.items()):
+            lines.extend(_histogram_lines(self.name, self.labelnames, values, h))
+        return lines
+
+
+_INF_LE = 'le="+Inf"'
+
+
+def _histogram_lines(name: str, labelnames: Sequence[str], values: Sequence[str], h: Histogram) -> List[str]:
+    lines = []
+    running = 0
+    for bound, n in zip(h.buckets, h.counts):
+        running += n
+        le = 'le="%g"' % bound
+        lines.append(f"{name}_bucket{_labels(labelnames, values, le)} {running}")
+    lines.append(f"{name}_bucket{_labels(labelnames, values, _INF_LE)} {h.count}")
+    lines.append(f"{name}_sum{_labels(labelnames, values)} {_num(float(h.sum))}")
+    lines.append(f"{name}_count{_labels(labelnames, values)} {h.count}")
+    return lines
+
+
+# ---- Gateway metrics ----
+
+STAGE_SECONDS = HistogramFamily(
+    "gateway_chat_stage_seconds", "Duration of each chat request stage.", ("route", "stage"))
+TOKENS_PER_SECOND = HistogramFamily(
+    "gateway_chat_tokens_per_second", "Streamed chunks per second after the first token.", ("route",),
+    buckets=TOKENS_PER_SECOND_BUCKETS)
+SSE_CHUNKS = CounterFamily("gateway_sse_chunks_total", "Text chunks received from the agent.", ("route",))
+SSE_FRAMES = CounterFamily("gateway_sse_frames_total", "SSE text frames sent (after coalescing).", ("route",))
+SSE_BYTES = CounterFamily("gateway_sse_bytes_total", "SSE text payload bytes sent (UTF-8, before framing).", ("route",))
+MODERATION_FLAGS = CounterFamily("gateway_moderation_flags_total", "Flagged moderation verdicts.", ("route", "kind"))
+UPSTREAM_ERRORS = CounterFamily("gateway_upstream_errors_total", "Failed calls to upstream services.", ("route", "upstream"))
+STREAMS_INFLIGHT = GaugeFamily("gateway_streams_inflight", "Chat streams currently open.", ("route",))
+
+FAMILIES: List[_Family] = [
+    STAGE_SECONDS, TOKENS_PER_SECOND, SSE_CHUNKS, SSE_FRAMES, SSE_BYTES,
+    MODERATION_FLAGS, UPSTREAM_ERRORS, STREAMS_INFLIGHT,
+]
+
+
+def observe_stage(route: str, stage: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(route, stage).observe(seconds)
+
+
+def upstream_error(route: str, upstream: str) -> None:
+    UPSTREAM_ERRORS.labels(route, upstream).inc()
+
+
+def record_stream(route: str, stages_ms: Dict[str, float], frames: Any) -> None:
+    """Fold one finished stream (StageTimer stages + CoalesceStats) into the metrics."""
+    SSE_CHUNKS.labels(route).inc(frames.chunks_in)
+    SSE_FRAMES.labels(route).inc(frames.frames_out)
+    SSE_BYTES.labels(route).inc(frames.bytes_out)
+    ttft, end = stages_ms.get("ttft"), stages_ms.get("stream")
+    if ttft is not None and end is not None and end > ttft and frames.chunks_in > 1:
+        TOKENS_PER_SECOND.labels(route).observe((frames.chunks_in - 1) / ((end - ttft) / 1000.0))
+
+
+# ---- Scrape-time collectors (stats owned by other modules) ----
+
+def _gauge_lines(name: str, help: str, rows: Iterable[Tuple[Dict[str, str], float]], kind: str = "gauge") -> List[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in rows:
+        lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_num(value)}")
+    return lines
+
+
+def _collect_admission() -> List[str]:
+    from src.features.admission import ADMISSION
+    st = ADMISSION.stats()
+    out = _gauge_lines("gateway_admission_inflight", "Agent runs holding an admission slot.", [({}, st["inflight"])])
+    out += _gauge_lines("gateway_admission_queue_depth", "Requests waiting for an admission slot.", [({}, st["queue_depth"])])
+    out += _gauge_lines("gateway_admission_admitted_total", "Requests admitted.", [({}, st["admitted"])], kind="counter")
+    out += _gauge_lines(
+        "gateway_admission_rejected_total", "Requests rejected by admission control.",
+        [({"reason": r}, n) for r, n in sorted(st["rejected"].items())] + [({"reason": "queue_timeout"}, st["timeouts"])],
+        kind="counter")
+    out += ["# HELP gateway_admission_wait_seconds Time spent waiting for an admission slot.",
+            "# TYPE gateway_admission_wait_seconds histogram"]
+    out += _histogram_lines("gateway_admission_wait_seconds", (), (), ADMISSION.wait_hist)
+    return out
+
+
+def _collect_pools() -> List[str]:
+    from src.features.clients import CLIENTS
+    stats = CLIENTS.pool_stats()
+    out: List[str] = []
+    for field, help in (
+        ("in_flight", "Outbound requests in flight (sent, response not yet closed)."),
+        ("max_connections", "Configured pool size."),
+        ("peak_in_flight", "Peak requests in flight since the last pool_stats log line."),
+    ):
+        out += _gauge_lines(f"gateway_pool_{field}", help, [({"pool": p}, s.get(field, 0)) for p, s in sorted(stats.items())])
+    out += _gauge_lines(
+        "gateway_pool_requests_total", "Outbound requests sent.",
+        [({"pool": p}, s.get("requests", 0)) for p, s in sorted(stats.items())], kind="counter")
+    return out
+
+
+def _collect_caches() -> List[str]:
+    from src.features.store_cache import store_cache_stats
+    from src.features.moderation import cache_stats
+    from src.auth.entra import claims_cache_stats
+    from src.features.threads import deleted_index_stats
+    from src.features.ownership import ownership_stats
+    from src.features.transcript_checkpoint import checkpoint_view_stats
+    rows = [({"cache": f"store_{fam}"}, s) for fam, s in store_cache_stats().items()]
+    rows.append(({"cache": "moderation"}, cache_stats()))
+    rows.append(({"cache": "auth_claims"}, claims_cache_stats()))
+    rows.append(({"cache": "deleted_threads_index"}, deleted_index_stats()))
+    rows.append(({"cache": "thread_info"}, ownership_stats()))
+    rows += [({"cache": f"checkpoint_{name}"}, st) for name, st in checkpoint_view_stats().items()]
+    out: List[str] = []
+    for field, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("size", "gauge")):
+        name = f"gateway_cache_{field}" + ("_total" if kind == "counter" else "")
+        out += _gauge_lines(name, f"In-process cache {field}.", [(labels, s.get(field, 0)) for labels, s in rows], kind=kind)
+    return out
+
+
+def _collect_store_index() -> List[str]:
+    from src.features.store_index import store_index_stats
+    rows = sorted(store_index_stats().items())
+    out = _gauge_lines("gateway_store_puts_total", "Store writes by namespace family.", [({"namespace": f}, s["puts"]) for f, s in rows], kind="counter")
+    out += _gauge_lines(
+        "gateway_store_embeddings_total", "Texts sent to the store's embedder by namespace family.",
+        [({"namespace": f}, s["embeddings"]) for f, s in rows], kind="counter")
+    out += _gauge_lines(
+        "gateway_store_embedding_tokens_total", "Estimated embedding tokens (chars/4) by namespace family.",
+        [({"namespace": f}, s["tokens"]) for f, s in rows], kind="counter")
+    return out
+
+
+def _collect_transcripts() -> List[str]:
+    from src.features.transcript import transcript_writer_stats
+    st = transcript_writer_stats()
+    out = _gauge_lines("gateway_transcript_pending_messages", "Transcript messages held in memory, not yet written.", [({}, st["pending_messages"])])
+    out += _gauge_lines("gateway_transcript_writes_total", "Transcript store writes (head updates).", [({}, st["writes"])], kind="counter")
+    out += _gauge_lines("gateway_transcript_messages_total", "Transcript messages written.", [({}, st["messages"])], kind="counter")
+    out += _gauge_lines("gateway_transcript_write_failures_total", "Failed transcript writes (kept pending, retried).", [({}, st["failures"])], kind="counter")
+    out += _gauge_lines("gateway_transcript_read_retries_total", "Transcript reads redone because a flush of the thread overlapped them.", [({}, st["read_retries"])], kind="counter")
+    return out
+
+
+def _collect_oidc() -> List[str]:
+    from src.auth.entra import key_manager_stats
+    st = key_manager_stats()
+    docs = [(d, st[d]) for d in ("discovery", "jwks")]
+    out = _gauge_lines(
+        "gateway_oidc_doc_age_seconds", "Age of the cached OIDC document.",
+        [({"doc": d}, s["age_s"]) for d, s in docs if s["age_s"] is not None])
+    out += _gauge_lines(
+        "gateway_oidc_fetches_total", "OIDC document fetches.",
+        [({"doc": d, "result": r}, s[k]) for d, s in docs for r, k in (("ok", "fetches"), ("error", "failures"))], kind="counter")
+    out += _gauge_lines(
+        "gateway_oidc_waits_total", "Requests that had to wait for an OIDC fetch.",
+        [({"doc": d}, s["waits"]) for d, s in docs], kind="counter")
+    out += _gauge_lines("gateway_jwks_forced_refreshes_total", "JWKS refetches forced by an unknown kid.", [({}, st["forced_refreshes"])], kind="counter")
+    return out
+
+
+def _collect_background() -> List[str]:
+    from src.features.pipeline import pending_background
+    return _gauge_lines("gateway_background_tasks", "Best-effort background tasks still running.", [({}, pending_background())])
+
+
+def _collect_background_runs() -> List[str]:
+    from src.features.background import background_stats
+    st = background_stats()
+    return _gauge_lines(
+        "gateway_background_runs", "Background chat runs known to this gateway.",
+        [({"state": "live"}, st["live"]), ({"state": "finished"}, st["runs"] - st["live"])])
+
+
+def _collect_replay() -> List[str]:
+    from src.features.replay import replay_stats
+    st = replay_stats()
+    out = _gauge_lines("gateway_replay_streams", "Chat streams held in the replay buffer.", [({"state": "live"}, st["live"]), ({"state": "finished"}, st["streams"] - st["live"])])
+    out += _gauge_lines("gateway_replay_bytes", "Bytes held in the replay buffer.", [({}, st["bytes"])])
+    out += _gauge_lines(
+        "gateway_replay_resumes_total", "Resume requests (Last-Event-ID).",
+        [({"result": "hit"}, st["resumes"]), ({"result": "miss"}, st["resume_misses"])], kind="counter")
+    out += _gauge_lines("gateway_replay_evictions_total", "Replay buffers evicted (age or memory).", [({}, st["evictions"])], kind="counter")
+    return out
+
+
+COLLECTORS: List[Callable[[], List[str]]] = [
+    _collect_admission, _collect_pools, _collect_caches, _collect_store_index, _collect_transcripts, _collect_oidc, _collect_background, _collect_background_runs, _collect_replay,
+]
+
+
+def render() -> str:
+    lines: List[str] = []
+    for fam in FAMILIES:
+        lines.extend(fam.render())
+    for collect in COLLECTORS:
+        try:
+            lines.extend(collect())
+        except Exception as e:  # a broken collector must not take /metrics down
+            lines.append(f"# collector {collect.__name__} failed: {_escape(str(e))}")
+    return "\n".join(lines) + "\n"
+
+
+def require_ops_token(request: Request, *, allow_public: bool = True) -> None:
+    """
+    Ops endpoints (/metrics, /debug/traces) need Bearer METRICS_TOKEN.
+    With no token configured they 404, unless `allow_public` and METRICS_PUBLIC=true.
+    """
+    if not METRICS_TOKEN:
+        if allow_public and METRICS_PUBLIC:
+            return
+        raise HTTPException(status_code=404, detail="Not Found")
+    auth = request.headers.get("authorization") or ""
+    if auth != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="unauthenticated")
+
+
+def make_metrics_router() -> APIRouter:
+    """
+    Endpoints:
+      GET /metrics  -> Prometheus text exposition (Bearer METRICS_TOKEN; 404 without
+                       one unless METRICS_PUBLIC=true)
+    """
+    router = APIRouter(tags=["ops"])
+
+    @router.get("/metrics", include_in_schema=False)
+    async def metrics(request: Request):
+        require_ops_token(request)
+        return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    return router
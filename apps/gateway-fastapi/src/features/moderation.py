@@ -0,0 +1,366 @@
+# apps/gateway-fastapi/src/features/moderation.py
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+from typing import AsyncIterator, Dict, List, Optional
+
+from openai import AsyncOpenAI
+
+from src.utils.ttl_cache import TTLCache, MISSING
+from src.features.clients import CLIENTS
+from src.features.metrics import MODERATION_FLAGS, observe_stage, upstream_error
+
+# Async moderation engine shared by /api/chat/stream and /api/chat/stream_files.
+#
+# - One AsyncOpenAI client per process (CLIENTS.openai: pooled, never blocks the loop).
+# - Every call is bounded by MODERATION_TIMEOUT_S. Timeouts / API errors fail open
+#   (logged), so a slow Moderation API can't hold a chat stream hostage.
+# - Input moderation runs *concurrently* with the agent run: gate_stream() holds the
+#   first tokens back until the verdict arrives and closes the run if it is flagged.
+# - Output moderation is incremental: OutputModerator checks windows of new output in
+#   the background while tokens stream and stops the run as soon as one is flagged.
+# - Verdicts are cached in-process (LRU + TTL) by hash(model, normalized text), so
+#   resent prompts and retries skip the round trip. Errors are never cached.
+# - `route` (the chat route a call serves) labels the flag / upstream-error metrics.
+# - verdicts() checks many texts at once (stored history): cache hits first, then
+#   the misses in batched calls of up to MODERATION_BATCH_SIZE inputs. Its flags
+#   are counted under the caller's own `kind`, apart from live input/output.
+
+MOD_ENABLED = os.getenv("MODERATION_ENABLED", "true").lower() == "true"
+MOD_MODEL = os.getenv("MODERATION_MODEL", "omni-moderation-latest")
+MOD_TIMEOUT_S = float(os.getenv("MODERATION_TIMEOUT_S", "5"))
+# Max characters of agent output held back while the input verdict is pending
+MOD_GATE_MAX_BUFFER = int(os.getenv("MODERATION_GATE_MAX_BUFFER", "4000"))
+# Output windows: new chars per check, trailing context re-sent with the next window,
+# and max concurrent checks per stream (a backlog is merged into the next window).
+MOD_OUTPUT_WINDOW = int(os.getenv("MODERATION_OUTPUT_WINDOW", "1200"))
+MOD_OUTPUT_OVERLAP = int(os.getenv("MODERATION_OUTPUT_OVERLAP", "200"))
+MOD_OUTPUT_CONCURRENCY = int(os.getenv("MODERATION_OUTPUT_CONCURRENCY", "2"))
+# Verdict cache (MODERATION_CACHE_SIZE=0 also disables it)
+MOD_CACHE_ENABLED = os.getenv("MODERATION_CACHE_ENABLED", "true").lower() == "true"
+MOD_CACHE_SIZE = int(os.getenv("MODERATION_CACHE_SIZE", "4096"))
+MOD_CACHE_TTL_S = float(os.getenv("MODERATION_CACHE_TTL_S", "3600"))
+MOD_CACHE_FLAGGED_TTL_S = float(os.getenv("MODERATION_CACHE_FLAGGED_TTL_S", "300"))
+# Inputs per Moderation API call in verdicts()
+MOD_BATCH_SIZE = max(1, int(os.getenv("MODERATION_BATCH_SIZE", "32")))
+
+INPUT_BLOCKED_MESSAGE = "Your message appears unsafe. I can't help with that."
+OUTPUT_BLOCKED_MESSAGE = "A safety filter replaced part of the output."
+
+def _client() -> AsyncOpenAI:
+    if CLIENTS.openai is None:
+        raise RuntimeError("OpenAI client not started (FastAPI lifespan)")
+    return CLIENTS.openai
+
+
+class InputFlagged(Exception):
+    """Raised by gate_stream() when the user's input was flagged."""
+
+
+class OutputFlagged(Exception):
+    """Raised by OutputModerator.watch() once any window of the output was flagged."""
+
+
+# ---- Verdict cache -------------------------------------------------------------
+
+_WS = re.compile(r"\s+")
+
+
+def _cache_key(text: str) -> str:
+    norm = _WS.sub(" ", text).strip()
+    return hashlib.sha256(f"{MOD_MODEL}\x00{norm}".encode("utf-8")).hexdigest()
+
+
+# Flagged verdicts get their own (shorter) TTL; expired entries are dropped on
+# read, so a stale "flagged" never outlives MOD_CACHE_FLAGGED_TTL_S.
+VERDICTS: "TTLCache[str, bool]" = TTLCache(
+    maxsize=MOD_CACHE_SIZE if MOD_CACHE_ENABLED else 0,
+    ttl_s=MOD_CACHE_TTL_S,
+)
+
+
+def cache_stats() -> Dict[str, int]:
+    return VERDICTS.stats()
+
+
+# ---- Moderation calls -----------------------------------------------------------
+
+async def _moderate(text: str, *, kind: str, route: str = "") -> Optional[bool]:
+    # One round trip; None means "no verdict" (timeout / API error).
+    try:
+        resp = await asyncio.wait_for(
+            _client().moderations.create(model=MOD_MODEL, input=text),
+            timeout=MOD_TIMEOUT_S,
+        )
+    except Exception as e:
+        upstream_error(route, "openai")
+        print(json.dumps({"type": "moderation_error", "kind": kind, "err": str(e) or type(e).__name__}), flush=True)
+        return None
+    return bool(resp.results[0].flagged)
+
+
+async def is_flagged(text: str, *, kind: str = "input", route: str = "") -> bool:
+    """
+    Moderation verdict for `text`, served from the verdict cache when possible.
+    Returns True only on a positive verdict; disabled moderation, empty text,
+    timeouts and API errors all return False (and errors are not cached).
+    """
+    if not MOD_ENABLED or not text:
+        return False
+    use_cache = VERDICTS.enabled
+    key = _cache_key(text) if use_cache else ""
+    flagged = VERDICTS.get(key) if use_cache else MISSING
+    if flagged is MISSING:
+        flagged = await _moderate(text, kind=kind, route=route)
+        if flagged is None:
+            return False
+        if use_cache:
+            VERDICTS.put(key, flagged, ttl_s=MOD_CACHE_FLAGGED_TTL_S if flagged else None)
+    if flagged:
+        MODERATION_FLAGS.labels(route, kind).inc()
+        print(json.dumps({"type": f"moderation_{kind}_flag", "route": route}), flush=True)
+    return flagged
+
+
+async def _moderate_batch(texts: List[str], *, kind: str, route: str = "") -> Optional[List[bool]]:
+    # One round trip for several inputs; None means "no verdict" for all of them.
+    try:
+        resp = await asyncio.wait_for(
+            _client().moderations.create(model=MOD_MODEL, input=texts),
+            timeout=MOD_TIMEOUT_S,
+        )
+    except Exception as e:
+        upstream_error(route, "openai")
+        print(json.dumps({"type": "moderation_error", "kind": kind, "inputs": len(texts), "err": str(e) or type(e).__name__}), flush=True)
+        return None
+    return [bool(r.flagged) for r in resp.results]
+
+
+async def verdicts(texts: List[str], *, kind: str, route: str = "") -> List[Optional[bool]]:
+    """
+    Verdicts for many texts, in order: cached ones from the verdict cache, the
+    rest in batched calls. None marks a text left without a verdict (timeout /
+    API error), and the caller decides how to fail. Disabled moderation and
+    empty texts are False.
+    """
+    out: List[Optional[bool]] = [False] * len(texts)
+    if not MOD_ENABLED:
+        return out
+    misses: Dict[str, List[int]] = {}  # cache key -> positions of that text
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+        key = _cache_key(text)
+        hit = VERDICTS.get(key) if VERDICTS.enabled else MISSING
+        if hit is MISSING:
+            misses.setdefault(key, []).append(i)
+            out[i] = None
+        else:
+            out[i] = hit
+    keys = list(misses)
+    batches = [keys[i:i + MOD_BATCH_SIZE] for i in range(0, len(keys), MOD_BATCH_SIZE)]
+    results = await asyncio.gather(*(
+        _moderate_batch([texts[misses[k][0]] for k in batch], kind=kind, route=route) for batch in batches
+    ))
+    for batch, flags in zip(batches, results):
+        if flags is None:
+            continue
+        for key, flagged in zip(batch, flags):
+            if VERDICTS.enabled:
+                VERDICTS.put(key, flagged, ttl_s=MOD_CACHE_FLAGGED_TTL_S if flagged else None)
+            for i in misses[key]:
+                out[i] = flagged
+    n = sum(1 for f in out if f)
+    if n:
+        MODERATION_FLAGS.labels(route, kind).inc(n)
+        print(json.dumps({"type": f"moderation_{kind}_flag", "route": route, "count": n}), flush=True)
+    return out
+
+
+def start_input_moderation(text: str, *, route: str = "") -> "asyncio.Task[bool]":
+    """Kick off input moderation in the background; await the task for the verdict."""
+    return asyncio.create_task(is_flagged(text, kind="input", route=route))
+
+
+async def _drop(fut: Optional[asyncio.Future]) -> None:
+    # Cancel a pending __anext__() and let it unwind before the source is closed.
+    if fut is None or fut.done():
+        return
+    fut.cancel()
+    await asyncio.gather(fut, return_exceptions=True)
+
+
+async def gate_stream(source: AsyncIterator[str], verdict: "asyncio.Task[bool]") -> AsyncIterator[str]:
+    """
+    Pass text chunks from `source` through once the input verdict is known.
+
+    - While the verdict is pending, chunks are pulled and held back (up to
+      MOD_GATE_MAX_BUFFER chars; past that we simply wait for the verdict).
+    - Clean  -> release the held chunks, then pass through unchanged.
+    - Flagged -> close `source` (which tears down the upstream run) and raise InputFlagged.
+    """
+    it = source.__aiter__()
+    held: list[str] = []
+    held_chars = 0
+    pending: Optional[asyncio.Future] = None
+    exhausted = False
+    try:
+        while not verdict.done() and held_chars < MOD_GATE_MAX_BUFFER:
+            pending = pending or asyncio.ensure_future(it.__anext__())
+            await asyncio.wait((pending, verdict), return_when=asyncio.FIRST_COMPLETED)
+            if not pending.done():
+                break  # verdict arrived first
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                exhausted = True
+                break
+            finally:
+                pending = None
+            held.append(chunk)
+            held_chars += len(chunk)
+
+        if await verdict:
+            raise InputFlagged()
+
+        for chunk in held:
+            yield chunk
+        if pending is not None:
+            try:
+                chunk = await pending
+            except StopAsyncIteration:
+                return
+            finally:
+                pending = None
+            yield chunk
+        if not exhausted:
+            async for chunk in it:
+                yield chunk
+    finally:
+        await _drop(pending)
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class OutputModerator:
+    """
+    Incremental, windowed moderation of one assistant answer.
+
+    feed() collects streamed text; every MOD_OUTPUT_WINDOW new chars a background
+    check is started on (last MOD_OUTPUT_OVERLAP chars already sent) + (new text),
+    so cleared text is never re-checked except for that small boundary context.
+    At most MOD_OUTPUT_CONCURRENCY checks run at once; text arriving while all
+    slots are busy is merged into the next window instead of queueing calls.
+    """
+
+    def __init__(
+        self,
+        *,
+        window: int = MOD_OUTPUT_WINDOW,
+        overlap: int = MOD_OUTPUT_OVERLAP,
+        concurrency: int = MOD_OUTPUT_CONCURRENCY,
+        route: str = "",
+    ) -> None:
+        self.route = route
+        self.window = max(1, window)
+        self.overlap = max(0, overlap)
+        self.concurrency = max(1, concurrency)
+        self.flagged = asyncio.Event()
+        self.windows_checked = 0
+        self._pending: list[str] = []
+        self._pending_chars = 0
+        self._context = ""
+        self._tasks: set[asyncio.Task] = set()
+        self._closed = False
+
+    def feed(self, text: str) -> None:
+        if not MOD_ENABLED or not text:
+            return
+        self._pending.append(text)
+        self._pending_chars += len(text)
+        self._maybe_schedule()
+
+    def _maybe_schedule(self, *, final: bool = False) -> None:
+        if self._closed or self.flagged.is_set() or not self._pending_chars:
+            return
+        if len(self._tasks) >= self.concurrency:
+            return
+        if self._pending_chars < self.window and not final:
+            return
+        text = self._context + "".join(self._pending)
+        self._pending.clear()
+        self._pending_chars = 0
+        self._context = text[-self.overlap:] if self.overlap else ""
+        self.windows_checked += 1
+        task = asyncio.create_task(self._check(text))
+        self._tasks.add(task)
+        task.add_done_callback(self._on_done)
+
+    async def _check(self, text: str) -> None:
+        start = time.perf_counter()
+        flagged = await is_flagged(text, kind="output", route=self.route)
+        observe_stage(self.route, "moderation_output", time.perf_counter() - start)
+        if flagged:
+            self.flagged.set()
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._maybe_schedule()
+
+    async def finish(self) -> bool:
+        """Check whatever is left (short tail included) and return the overall verdict."""
+        while not self.flagged.is_set() and (self._pending_chars or self._tasks):
+            self._maybe_schedule(final=True)
+            if self._tasks:
+                await asyncio.wait(set(self._tasks), return_when=asyncio.FIRST_COMPLETED)
+        return self.flagged.is_set()
+
+    async def aclose(self) -> None:
+        self._closed = True
+        for task in list(self._tasks):
+            await _drop(task)
+        self._tasks.clear()
+
+    async def watch(self, source: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Pass chunks through while feeding them to the moderator. As soon as a window
+        is flagged, `source` is closed (stopping the upstream run) and OutputFlagged
+        is raised, even if the upstream is between tokens.
+        """
+        if not MOD_ENABLED:
+            async for chunk in source:
+                yield chunk
+            return
+
+        it = source.__aiter__()
+        flag = asyncio.ensure_future(self.flagged.wait())
+        pending: Optional[asyncio.Future] = None
+        try:
+            while True:
+                pending = pending or asyncio.ensure_future(it.__anext__())
+                await asyncio.wait((pending, flag), return_when=asyncio.FIRST_COMPLETED)
+                if self.flagged.is_set():
+                    raise OutputFlagged()
+                try:
+                    chunk = pending.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    pending = None
+                self.feed(chunk)
+                yield chunk
+            if await self.finish():
+                raise OutputFlagged()
+        finally:
+            await _drop(pending)
+            await _drop(flag)
+            await self.aclose()
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
@@ -0,0 +1,110 @@
+# apps/gateway-fastapi/src/features/ownership.py
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, NamedTuple, Optional
+
+from src.utils.ttl_cache import TTLCache, MISSING
+
+# Thread ownership without a Threads API call per request.
+#
+# Every per-thread endpoint (get/rename/delete, messages, run cancel/status, and
+# the chat routes when the client sends a thread_id) has to check that
+# metadata.user_id is the caller. THREAD_INFO remembers, per thread_id,
+# (owner, deleted, title, updated_at) from any thread dict the gateway already
+# sees: create, search (the sidebar list) and get responses. So in steady state
+# an ownership check costs nothing; a miss costs one threads.get.
+#
+# The owner of a thread never changes, so the only staleness is in the other
+# fields: renames and deletes through this replica update the entry at once,
+# other replicas catch up within THREAD_INFO_TTL_S. A thread hard-deleted
+# elsewhere may still pass the check here, after which the LangGraph call
+# itself 404s.
+#
+# The chat routes also reject a thread_id that doesn't exist (unowned_thread).
+# Only the Threads API creates threads, so each one carries metadata.user_id.
+
+THREAD_INFO_SIZE = int(os.getenv("THREAD_INFO_SIZE", "50000"))
+THREAD_INFO_TTL_S = float(os.getenv("THREAD_INFO_TTL_S", "600"))
+
+
+class ThreadInfo(NamedTuple):
+    owner: Optional[str]
+    deleted: bool
+    title: Optional[str]
+    updated_at: Optional[str]
+
+
+# thread_id -> ThreadInfo (None: the thread doesn't exist, cached briefly)
+THREAD_INFO: "TTLCache[str, Optional[ThreadInfo]]" = TTLCache(maxsize=THREAD_INFO_SIZE, ttl_s=THREAD_INFO_TTL_S)
+_MISSING_TTL_S = 5.0
+
+
+def _info(t: Dict[str, Any]) -> ThreadInfo:
+    meta = t.get("metadata") or {}
+    return ThreadInfo(
+        owner=meta.get("user_id"),
+        deleted=meta.get("deleted") is True,
+        title=meta.get("title"),
+        updated_at=t.get("updated_at"),
+    )
+
+
+def remember_thread(t: Optional[Dict[str, Any]]) -> None:
+    """Record a thread dict from any Threads API response (create/search/get/update)."""
+    if t and t.get("thread_id"):
+        THREAD_INFO.put(t["thread_id"], _info(t))
+
+
+def forget_thread(thread_id: str) -> None:
+    THREAD_INFO.pop(thread_id)
+
+
+def _is_not_found(e: Exception) -> bool:
+    resp = getattr(e, "response", None)
+    return getattr(resp, "status_code", None) == 404
+
+
+async def thread_info(client, thread_id: str, *, recheck_missing: bool = False) -> Optional[ThreadInfo]:
+    """
+    Cached (owner, deleted, title, updated_at), or None if the thread doesn't exist.
+    recheck_missing=True looks a cached "doesn't exist" up again (it may have been
+    created since, on another replica).
+    """
+    hit = THREAD_INFO.get(thread_id)
+    if hit is not MISSING and not (hit is None and recheck_missing):
+        return hit
+    try:
+        t = await client.threads.get(thread_id)
+    except Exception as e:
+        if not _is_not_found(e):
+            raise
+        t = None
+    if not t:
+        THREAD_INFO.put(thread_id, None, ttl_s=_MISSING_TTL_S)
+        return None
+    info = _info(t)
+    THREAD_INFO.put(thread_id, info)
+    return info
+
+
+async def owned_thread(client, thread_id: str, user_id: str) -> Optional[ThreadInfo]:
+    """The thread's info if `user_id` owns it and it isn't soft-deleted; else None."""
+    info = await thread_info(client, thread_id)
+    if info is None or info.owner != user_id or info.deleted:
+        return None
+    return info
+
+
+async def unowned_thread(client, thread_id: str, user_id: str) -> bool:
+    """
+    True unless the thread exists and is the caller's: the chat routes reject it
+    with a 404. A run must never create a thread, which would have no
+    metadata.user_id and so be invisible to its own user from then on.
+    """
+    info = await thread_info(client, thread_id, recheck_missing=True)
+    return info is None or info.owner != user_id
+
+
+def ownership_stats() -> Dict[str, int]:
+    return THREAD_INFO.stats()
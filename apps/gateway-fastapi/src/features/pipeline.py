@@ -0,0 +1,116 @@
+# apps/gateway-fastapi/src/features/pipeline.py
+from __future__ import annotations
+
+import json
+import time
+import asyncio
+from typing import Any, Awaitable, Dict, Optional, Set, TypeVar
+
+from prynai_shared.trace import TraceContext
+
+from src.features.metrics import observe_stage
+from src.features.tracing import TRACER
+
+# Pre-stream pipeline helpers for the chat routes.
+#
+# - StageTimer records how long each stage of one chat request took (ms), on or
+#   off the critical path, and logs them as one JSON line when the stream ends.
+#   Each stage is also observed into gateway_chat_stage_seconds{route,stage} and
+#   recorded as a child span of the request's trace (src/features/tracing.py).
+# - spawn() runs best-effort work (profile bootstrap, user-turn transcript write)
+#   as tracked background tasks: strong refs are held until completion, failures
+#   are logged, and drain() lets shutdown wait for them instead of dropping writes.
+
+T = TypeVar("T")
+
+_BACKGROUND: Set[asyncio.Task] = set()
+
+
+class StageTimer:
+    def __init__(self, route: str) -> None:
+        self.route = route
+        self.t0 = time.perf_counter()
+        self.wall0 = time.time()
+        self.stages: Dict[str, float] = {}
+        # Root span (the request); its id is fixed now so stages can attach to it
+        self.trace = TraceContext.new().child()
+        self._finished = False
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def _ms(self, since: float) -> float:
+        return round((time.perf_counter() - since) * 1000.0, 2)
+
+    def span(self, name: str, start: float, *, span_id: Optional[str] = None, **attrs: Any) -> None:
+        """Record a child span of the request from perf_counter() `start` to now."""
+        TRACER.record(
+            name, self.trace,
+            start=self.wall0 + (start - self.t0),
+            duration_ms=(time.perf_counter() - start) * 1000.0,
+            span_id=span_id, **attrs,
+        )
+
+    async def run(self, stage: str, aw: Awaitable[T]) -> T:
+        """Await `aw` and record its duration under `stage` (even if it raises)."""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            return await aw
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.stages[stage] = self._ms(start)
+            observe_stage(self.route, stage, time.perf_counter() - start)
+            self.span(stage, start, status=status)
+
+    def mark(self, stage: str) -> None:
+        """Record the time elapsed since the request started (e.g. 'ttft')."""
+        if stage not in self.stages:
+            self.stages[stage] = self._ms(self.t0)
+            observe_stage(self.route, stage, time.perf_counter() - self.t0)
+
+    def finish(self, **attrs: Any) -> None:
+        """Record the root span (request start -> now) with the stage marks; once."""
+        if self._finished:
+            return
+        self._finished = True
+        TRACER.record(
+            self.route, TraceContext(self.trace.trace_id), span_id=self.trace.span_id,
+            start=self.wall0, duration_ms=(time.perf_counter() - self.t0) * 1000.0,
+            **{f"{k}_ms": v for k, v in self.stages.items() if k in ("ttft", "stream")}, **attrs,
+        )
+
+    def log(self, **extra: Any) -> None:
+        self.finish(**extra)
+        print(json.dumps({"type": "chat_stages", "route": self.route, "trace": self.trace_id, **self.stages, **extra}), flush=True)
+
+
+def _on_background_done(task: asyncio.Task) -> None:
+    _BACKGROUND.discard(task)
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        print(json.dumps({"type": "background_task_error", "task": task.get_name(), "err": str(exc)}), flush=True)
+
+
+def spawn(aw: Awaitable[T], *, name: str) -> "asyncio.Task[T]":
+    """Run `aw` off the critical path; the task is tracked until it finishes."""
+    task = asyncio.ensure_future(aw)
+    task.set_name(name)
+    _BACKGROUND.add(task)
+    task.add_done_callback(_on_background_done)
+    return task
+
+
+def pending_background() -> int:
+    return len(_BACKGROUND)
+
+
+async def drain(timeout: Optional[float] = 10.0) -> None:
+    """Wait (bounded) for in-flight background tasks; used on gateway shutdown."""
+    if _BACKGROUND:
+        await asyncio.wait(set(_BACKGROUND), timeout=timeout)
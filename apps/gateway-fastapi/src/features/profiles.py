@@ -68,8 +68,7 @@ async def put_profile(client, profile: Profile) -> None:
         _ns(profile.user_id),
         key="profile",
         value=profile.model_dump(),
-        index=["user_id", "display_name"],  # enable future search/filter
-    )
+    )  # not embedded: read by key only (src/features/store_index.py)
 
 async def ensure_profile(client, user_id: str, claims: Optional[dict] = None) -> Profile:
     """
@@ -113,7 +112,7 @@ async def update_profile(client, user_id: str, patch: ProfileUpdate) -> Profile:
         data["settings"] = new_settings
 
     data["updated_at"] = _now_iso()
-    await client.store.put_item(_ns(user_id), key="profile", value=data, index=["user_id", "display_name"])
+    await client.store.put_item(_ns(user_id), key="profile", value=data)
     return Profile(**data)
 
 # ---- Router factory ----
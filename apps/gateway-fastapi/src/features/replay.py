@@ -0,0 +1,266 @@
+# apps/gateway-fastapi/src/features/replay.py
+from __future__ import annotations
+
+import os
+import json
+import time
+import asyncio
+import secrets
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from src.features.sse import supervise
+from src.features.pipeline import spawn
+
+# Resumable chat streams (SSE `id:` + Last-Event-ID).
+#
+# With SSE_RESUME_ENABLED, a chat route's frames are produced by a background task
+# (the "pump") into a per-stream replay buffer, and the HTTP response is just one
+# reader of that buffer:
+#
+#   - Every event gets `id: <n>` (1, 2, 3, ... per stream); the stream id is sent
+#     in the X-Stream-Id response header.
+#   - GET /api/chat/streams/{stream_id} with `Last-Event-ID: <n>` replays frames
+#     after n, then follows the live run (or ends, if it already finished).
+#   - A dropped connection no longer cancels the run at once: when the last reader
+#     is gone the run keeps going for SSE_RESUME_GRACE_S, and is cancelled only if
+#     nobody reattaches in that window.
+#   - Buffers are evicted by age (SSE_REPLAY_TTL_S after the stream finished) and
+#     by total size (SSE_REPLAY_MAX_BYTES across streams, oldest finished first).
+#
+# Buffers live in this gateway process: a resume must reach the same replica
+# (ingress session affinity); anywhere else it gets a 404 and the UI gives up.
+
+SSE_RESUME_ENABLED = os.getenv("SSE_RESUME_ENABLED", "true").lower() == "true"
+SSE_RESUME_GRACE_S = float(os.getenv("SSE_RESUME_GRACE_S", "30"))
+SSE_REPLAY_TTL_S = float(os.getenv("SSE_REPLAY_TTL_S", "300"))
+SSE_REPLAY_MAX_BYTES = int(os.getenv("SSE_REPLAY_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class ReplayStream:
+    """Frames of one chat stream, numbered from 1; readers follow it with follow()."""
+
+    def __init__(self, stream_id: str, user_id: str, registry: "ReplayRegistry") -> None:
+        self.stream_id = stream_id
+        self.user_id = user_id
+        self.frames: List[bytes] = []
+        self.nbytes = 0
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.readers = 0
+        # Set once the registry drops this stream: its bytes are no longer counted
+        self.evicted = False
+        self._registry = registry
+        self._changed = asyncio.Event()
+        self._pump: Optional[asyncio.Task] = None
+        self._grace: Optional[asyncio.Task] = None
+        self._on_abandon: Optional[Callable[[], Awaitable[Any]]] = None
+
+    # ---- Producer side ----
+
+    def _append(self, frame: bytes) -> None:
+        frame = b"id: %d\n" % (len(self.frames) + 1) + frame
+        self.frames.append(frame)
+        self.nbytes += len(frame)
+        if not self.evicted:
+            self._registry._grow(len(frame))
+        self._wake()
+
+    def _finish(self) -> None:
+        self.done = True
+        self.finished_at = time.monotonic()
+        if self._grace is not None:
+            self._grace.cancel()
+            self._grace = None
+        self._wake()
+        self._registry._evict()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _run(self, frames: AsyncIterator[bytes]) -> None:
+        try:
+            async for frame in frames:
+                self._append(frame)
+        finally:
+            self._finish()
+
+    # ---- Reader side ----
+
+    async def follow(self, after: int = 0) -> AsyncIterator[bytes]:
+        """Frames with id > `after`, then live ones until the stream is done."""
+        self.readers += 1
+        if self._grace is not None:
+            self._grace.cancel()
+            self._grace = None
+        pos = max(0, after)
+        try:
+            while True:
+                if pos < len(self.frames):
+                    frame = self.frames[pos]
+                    pos += 1
+                    yield frame
+                    continue
+                if self.done:
+                    return
+                await self._changed.wait()
+        finally:
+            self.readers -= 1
+            if self.readers == 0 and not self.done:
+                self._grace = asyncio.ensure_future(self._abandon_later())
+
+    async def _abandon_later(self) -> None:
+        await asyncio.sleep(self._registry.grace_s)
+        if self.readers or self.done:
+            return
+        print(json.dumps({"type": "stream_abandoned", "stream_id": self.stream_id, "frames": len(self.frames)}), flush=True)
+        self._grace = None
+        if self._on_abandon is not None:
+            spawn(self._on_abandon(), name="on_abandon")
+        if self._pump is not None:
+            self._pump.cancel()
+
+
+class ReplayRegistry:
+    def __init__(
+        self,
+        *,
+        enabled: bool = SSE_RESUME_ENABLED,
+        grace_s: float = SSE_RESUME_GRACE_S,
+        ttl_s: float = SSE_REPLAY_TTL_S,
+        max_bytes: int = SSE_REPLAY_MAX_BYTES,
+    ) -> None:
+        self.enabled = enabled
+        self.grace_s = grace_s
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.streams: "OrderedDict[str, ReplayStream]" = OrderedDict()
+        self.nbytes = 0
+        self.resumes = 0
+        self.resume_misses = 0
+        self.evictions = 0
+
+    def start(
+        self,
+        frames: AsyncIterator[bytes],
+        *,
+        user_id: str,
+        on_abandon: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> ReplayStream:
+        """Pump `frames` into a new replay buffer in the background."""
+        self._evict()
+        stream = ReplayStream(secrets.token_urlsafe(16), user_id, self)
+        stream._on_abandon = on_abandon
+        self.streams[stream.stream_id] = stream
+        stream._pump = spawn(stream._run(frames), name="sse_pump")
+        return stream
+
+    def get(self, stream_id: str, user_id: str) -> Optional[ReplayStream]:
+        self._evict()
+        stream = self.streams.get(stream_id)
+        if stream is None or stream.user_id != user_id:
+            self.resume_misses += 1
+            return None
+        self.resumes += 1
+        return stream
+
+    def _grow(self, n: int) -> None:
+        self.nbytes += n
+        if self.nbytes > self.max_bytes:
+            self._evict()
+
+    def _drop(self, stream_id: str) -> None:
+        stream = self.streams.pop(stream_id)
+        self.nbytes -= stream.nbytes
+        stream.evicted = True
+        self.evictions += 1
+        # Readers already attached keep their reference; only new resumes miss.
+        # A live stream evicted here keeps pumping for them, uncounted
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for sid, s in list(self.streams.items()):
+            if s.done and now - (s.finished_at or now) >= self.ttl_s:
+                self._drop(sid)
+        if self.nbytes <= self.max_bytes:
+            return
+        # Over budget: finished streams go first (oldest first), then live ones
+        for finished in (True, False):
+            for sid, s in list(self.streams.items()):
+                if self.nbytes <= self.max_bytes:
+                    return
+                if s.done == finished:
+                    self._drop(sid)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "streams": len(self.streams),
+            "live": sum(1 for s in self.streams.values() if not s.done),
+            "bytes": self.nbytes,
+            "resumes": self.resumes,
+            "resume_misses": self.resume_misses,
+            "evictions": self.evictions,
+        }
+
+
+# One registry per gateway process
+REPLAY = ReplayRegistry()
+
+
+def replay_stats() -> Dict[str, int]:
+    return REPLAY.stats()
+
+
+def serve_stream(
+    frames: AsyncIterator[bytes],
+    request: Request,
+    *,
+    user_id: str,
+    on_disconnect: Callable[[], Awaitable[Any]],
+) -> Tuple[AsyncIterator[bytes], Optional[str]]:
+    """
+    The response body for a chat route, plus its stream id (None when resume is off).
+    Without resume, a disconnect calls on_disconnect() right away (as before);
+    with it, only once the stream is abandoned (see SSE_RESUME_GRACE_S).
+    """
+    if not REPLAY.enabled:
+        return supervise(frames, request, on_disconnect=on_disconnect), None
+    stream = REPLAY.start(frames, user_id=user_id, on_abandon=on_disconnect)
+    return supervise(stream.follow(), request), stream.stream_id
+
+
+def resume_after(request: Request, last_event_id: Optional[str]) -> int:
+    """The client's Last-Event-ID (header, else ?last_event_id=) as an int; 0 if absent."""
+    raw = request.headers.get("last-event-id") or last_event_id or "0"
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return 0
+
+
+def make_replay_router(get_current_user, user_id_from_claims) -> APIRouter:
+    """
+    Endpoints:
+      GET /api/chat/streams/{stream_id}   (Last-Event-ID header or ?last_event_id=)
+          -> SSE: frames after that id, then the live remainder (owner-only)
+    """
+    router = APIRouter(prefix="/api/chat/streams", tags=["chat"])
+
+    @router.get("/{stream_id}")
+    async def resume(stream_id: str, request: Request, last_event_id: Optional[str] = None):
+        claims = await get_current_user(request)
+        if not claims:
+            raise HTTPException(status_code=401, detail="unauthenticated")
+        stream = REPLAY.get(stream_id, user_id_from_claims(claims))
+        if stream is None:
+            raise HTTPException(status_code=404, detail="stream_not_found")
+        after = resume_after(request, last_event_id)
+        print(json.dumps({"type": "stream_resumed", "stream_id": stream_id, "after": after, "done": stream.done}), flush=True)
+        headers = {"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no", "X-Stream-Id": stream_id}
+        return StreamingResponse(supervise(stream.follow(after), request), media_type="text/event-stream", headers=headers)
+
+    return router
@@ -0,0 +1,182 @@
+# apps/gateway-fastapi/src/features/runs.py
+from __future__ import annotations
+
+import json
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+
+from src.features.ownership import owned_thread
+
+# Agent runs driven through the LangGraph SDK runs API (client.runs.stream) rather
+# than RemoteGraph.astream, because we need the run_id:
+#   - to cancel the run when the client disconnects (runs.cancel), and
+#   - to expose POST /api/chat/runs/{run_id}/cancel to the UI.
+#
+# Runs are started with on_disconnect="cancel" as a second line of defence: if the
+# gateway drops the upstream connection, LangGraph cancels the run on its own.
+#
+# SDK reference (runs.stream / runs.cancel):
+# https://langchain-ai.github.io/langgraph/cloud/reference/sdk/python_sdk_ref/
+
+# run_id -> (user_id, thread_id) for runs streaming through *this* gateway process
+ACTIVE_RUNS: Dict[str, Tuple[str, Optional[str]]] = {}
+
+
+class RunError(Exception):
+    """An `error` event streamed by the LangGraph run."""
+
+
+async def stream_text(
+    parts: AsyncIterator[Any],
+    to_text: Callable[[Any], str],
+    on_metadata: Optional[Callable[[dict], None]] = None,
+) -> AsyncIterator[str]:
+    """Non-empty text chunks from SDK stream parts (runs.stream / runs.join_stream, messages mode)."""
+    async for part in parts:
+        event = part.event or ""
+        if event == "metadata":
+            if on_metadata is not None:
+                on_metadata(part.data or {})
+            continue
+        if event == "error":
+            data = part.data or {}
+            raise RunError(data.get("message") or data.get("error") or str(data))
+        if not event.startswith("messages"):
+            continue
+        data = part.data
+        msg_chunk = data[0] if isinstance(data, (list, tuple)) and data else data
+        t = to_text(msg_chunk)
+        if t:
+            yield t
+
+
+class AgentRun:
+    """One streamed agent run; `run_id` is known once the metadata event arrives."""
+
+    def __init__(
+        self,
+        client,
+        assistant_id: str,
+        *,
+        user_id: str,
+        thread_id: Optional[str],
+        input: dict,
+        config: dict,
+    ) -> None:
+        self.client = client
+        self.assistant_id = assistant_id
+        self.user_id = user_id
+        self.thread_id = thread_id
+        self.input = input
+        self.config = config
+        self.run_id: Optional[str] = None
+        self.cancelled = False
+        self.started = asyncio.Event()  # set once run_id is known
+
+    async def text(self, to_text: Callable[[Any], str]) -> AsyncIterator[str]:
+        """Stream the run in messages mode and yield non-empty text chunks."""
+        def on_metadata(data: dict) -> None:
+            self.run_id = data.get("run_id")
+            if self.run_id:
+                ACTIVE_RUNS[self.run_id] = (self.user_id, self.thread_id)
+                self.started.set()
+
+        parts = self.client.runs.stream(
+            self.thread_id,
+            self.assistant_id,
+            input=self.input,
+            config=self.config,
+            stream_mode="messages-tuple",
+            on_disconnect="cancel",
+        )
+        try:
+            async for t in stream_text(parts, to_text, on_metadata):
+                yield t
+        finally:
+            if self.run_id:
+                ACTIVE_RUNS.pop(self.run_id, None)
+
+    async def announced(self, texts: AsyncIterator[str]) -> AsyncIterator[Tuple[str, str]]:
+        """
+        ("run", run_id) as soon as the run's metadata arrives, then ("text", chunk)
+        for every chunk of `texts`, which wraps self.text(). The run id therefore
+        goes out (and the run becomes cancellable) before the first token, even
+        while the moderation gate or the coalescer is still holding text back.
+        """
+        it = texts.__aiter__()
+        pending: Optional[asyncio.Future] = asyncio.ensure_future(it.__anext__())
+        started = asyncio.ensure_future(self.started.wait())
+        announced = False
+        try:
+            await asyncio.wait((pending, started), return_when=asyncio.FIRST_COMPLETED)
+            while True:
+                if not announced and self.run_id:
+                    announced = True
+                    yield "run", self.run_id
+                try:
+                    text = await pending
+                except StopAsyncIteration:
+                    return
+                finally:
+                    pending = None
+                yield "text", text
+                pending = asyncio.ensure_future(it.__anext__())
+        finally:
+            started.cancel()
+            if pending is not None and not pending.done():
+                pending.cancel()
+
+    async def cancel(self) -> bool:
+        """Best-effort cancel through the runs API (needs both thread_id and run_id)."""
+        if self.cancelled or not (self.thread_id and self.run_id):
+            return False
+        self.cancelled = True
+        return await cancel_run(self.client, self.thread_id, self.run_id)
+
+
+async def cancel_run(client, thread_id: str, run_id: str) -> bool:
+    try:
+        await client.runs.cancel(thread_id, run_id)
+    except Exception as e:
+        print(json.dumps({"type": "run_cancel_error", "tid": thread_id, "run_id": run_id, "err": str(e)}), flush=True)
+        return False
+    print(json.dumps({"type": "run_cancelled", "tid": thread_id, "run_id": run_id}), flush=True)
+    return True
+
+
+def make_runs_router(client, get_current_user, user_id_from_claims) -> APIRouter:
+    """
+    Endpoints:
+      POST /api/chat/runs/{run_id}/cancel[?thread_id=...]  -> cancel an agent run (owner-only)
+
+    Runs streaming through this replica are found in ACTIVE_RUNS; otherwise the
+    caller must pass thread_id, and ownership is checked via the Threads API
+    (cached, see src/features/ownership.py).
+    """
+    router = APIRouter(prefix="/api/chat/runs", tags=["chat"])
+
+    @router.post("/{run_id}/cancel")
+    async def cancel(run_id: str, request: Request, thread_id: Optional[str] = None) -> Dict[str, Any]:
+        claims = await get_current_user(request)
+        if not claims:
+            raise HTTPException(status_code=401, detail="unauthenticated")
+        user_id = user_id_from_claims(claims)
+
+        active = ACTIVE_RUNS.get(run_id)
+        if active is not None:
+            owner, tid = active
+            if owner != user_id or not tid:
+                raise HTTPException(status_code=404, detail="not_found")
+        else:
+            if not thread_id:
+                raise HTTPException(status_code=404, detail="not_found")
+            if await owned_thread(client, thread_id, user_id) is None:
+                raise HTTPException(status_code=404, detail="not_found")
+            tid = thread_id
+
+        ok = await cancel_run(client, tid, run_id)
+        return {"ok": ok, "run_id": run_id}
+
+    return router
@@ -0,0 +1,235 @@
+# apps/gateway-fastapi/src/features/sse.py
+from __future__ import annotations
+
+import os
+import json
+import asyncio
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+# SSE frame coalescing for the chat routes.
+#
+# remote.astream yields one tiny chunk per token; sending each as its own SSE
+# event means one ASGI send (write + proxy flush) per token. coalesce() merges
+# chunks into one frame until SSE_COALESCE_MAX_BYTES is buffered or
+# SSE_COALESCE_INTERVAL_MS has passed since the first buffered chunk,
+# whichever comes first.
+#
+# - The first chunk is always sent immediately (TTFT is unaffected).
+# - Control events (policy / error / done) are emitted by the caller *after* this
+#   generator ends or raises, and buffered text is flushed before that happens,
+#   so they are never delayed and never overtake text.
+# - Merging N chunks into one frame saves N-1 frames and exactly
+#   SSE_FRAME_OVERHEAD bytes per saved frame ("data: " + blank line).
+#
+# supervise() wraps the final byte stream of a chat route: it sends an SSE comment
+# heartbeat after SSE_HEARTBEAT_S of silence (keeps idle-but-alive connections open
+# through the ACA ingress and surfaces dead ones as send failures), polls
+# request.is_disconnected() every SSE_DISCONNECT_POLL_S, and calls on_disconnect()
+# (e.g. cancel the LangGraph run) when the client is gone.
+
+SSE_COALESCE_ENABLED = os.getenv("SSE_COALESCE_ENABLED", "true").lower() == "true"
+SSE_COALESCE_MAX_BYTES = int(os.getenv("SSE_COALESCE_MAX_BYTES", "2048"))
+SSE_COALESCE_INTERVAL_MS = float(os.getenv("SSE_COALESCE_INTERVAL_MS", "30"))
+
+SSE_HEARTBEAT_S = float(os.getenv("SSE_HEARTBEAT_S", "15"))
+SSE_DISCONNECT_POLL_S = float(os.getenv("SSE_DISCONNECT_POLL_S", "1"))
+
+SSE_FRAME_OVERHEAD = len(b"data: ") + len(b"\n\n")
+HEARTBEAT_FRAME = b": keep-alive\n\n"
+
+
+@dataclass
+class CoalesceStats:
+    chunks_in: int = 0
+    frames_out: int = 0
+    bytes_out: int = 0  # payload bytes (UTF-8), before SSE framing
+
+    @property
+    def frames_saved(self) -> int:
+        return self.chunks_in - self.frames_out
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.frames_saved * SSE_FRAME_OVERHEAD
+
+    def add(self, other: "CoalesceStats") -> None:
+        self.chunks_in += other.chunks_in
+        self.frames_out += other.frames_out
+        self.bytes_out += other.bytes_out
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "chunks_in": self.chunks_in,
+            "frames_out": self.frames_out,
+            "frames_saved": self.frames_saved,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+# Process-wide totals (per-stream stats are folded in when a stream ends)
+TOTALS = CoalesceStats()
+
+
+def sse_stats() -> Dict[str, int]:
+    return TOTALS.as_dict()
+
+
+async def coalesce(
+    source: AsyncIterator[str],
+    *,
+    max_bytes: int = SSE_COALESCE_MAX_BYTES,
+    interval_ms: float = SSE_COALESCE_INTERVAL_MS,
+    stats: Optional[CoalesceStats] = None,
+) -> AsyncIterator[str]:
+    """Merge text chunks from `source` into fewer, larger chunks (one SSE frame each)."""
+    stats = stats if stats is not None else CoalesceStats()
+    loop = asyncio.get_running_loop()
+    interval_s = max(0.0, interval_ms) / 1000.0
+    enabled = SSE_COALESCE_ENABLED and interval_s > 0 and max_bytes > 0
+
+    it = source.__aiter__()
+    pending: Optional[asyncio.Future] = None
+    buf: list[str] = []
+    buf_bytes = 0
+    deadline = 0.0
+
+    def flush() -> str:
+        nonlocal buf_bytes
+        text = "".join(buf)
+        buf.clear()
+        stats.frames_out += 1
+        stats.bytes_out += buf_bytes
+        buf_bytes = 0
+        return text
+
+    try:
+        try:
+            while True:
+                if not buf:
+                    # Nothing buffered: no deadline to race, just wait for the next chunk
+                    if pending is None:
+                        try:
+                            chunk = await it.__anext__()
+                        except StopAsyncIteration:
+                            break
+                    else:
+                        try:
+                            chunk = await pending
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            pending = None
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        yield flush()
+                        continue
+                    pending = pending or asyncio.ensure_future(it.__anext__())
+                    done, _ = await asyncio.wait((pending,), timeout=timeout)
+                    if not done:
+                        yield flush()
+                        continue
+                    try:
+                        chunk = pending.result()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        pending = None
+
+                stats.chunks_in += 1
+                n = len(chunk.encode("utf-8"))
+                if not enabled or (stats.frames_out == 0 and not buf):
+                    # First token (or coalescing off): send right away
+                    stats.frames_out += 1
+                    stats.bytes_out += n
+                    yield chunk
+                    continue
+                if not buf:
+                    deadline = loop.time() + interval_s
+                buf.append(chunk)
+                buf_bytes += n
+                if buf_bytes >= max_bytes:
+                    yield flush()
+        except Exception:
+            # Deliver what we already have before the caller emits policy/error
+            if buf:
+                yield flush()
+            raise
+        if buf:
+            yield flush()
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        TOTALS.add(stats)
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+async def supervise(
+    frames: AsyncIterator[bytes],
+    request: Any,
+    *,
+    on_disconnect: Optional[Callable[[], Awaitable[Any]]] = None,
+    heartbeat_s: float = SSE_HEARTBEAT_S,
+    poll_s: float = SSE_DISCONNECT_POLL_S,
+) -> AsyncIterator[bytes]:
+    """
+    Forward SSE frames, adding heartbeats and client-disconnect handling.
+
+    A disconnect is either seen by polling or implied by this generator being
+    closed/cancelled before `frames` finished (Starlette does that when a send
+    fails). on_disconnect() then runs as a tracked background task, because the
+    request's own task may already be cancelled and unable to await anything.
+    """
+    from src.features.pipeline import spawn  # local: pipeline is the task registry
+
+    loop = asyncio.get_running_loop()
+    it = frames.__aiter__()
+    pending: Optional[asyncio.Future] = None
+    last_sent = last_poll = loop.time()
+    finished = False
+    try:
+        while True:
+            pending = pending or asyncio.ensure_future(it.__anext__())
+            now = loop.time()
+            wait_s = max(0.0, min(poll_s - (now - last_poll), heartbeat_s - (now - last_sent)))
+            done, _ = await asyncio.wait((pending,), timeout=wait_s)
+            now = loop.time()
+            if now - last_poll >= poll_s:
+                last_poll = now
+                if await request.is_disconnected():
+                    break
+            if not done:
+                if now - last_sent >= heartbeat_s:
+                    last_sent = now
+                    yield HEARTBEAT_FRAME
+                continue
+            try:
+                frame = pending.result()
+            except StopAsyncIteration:
+                finished = True
+                break
+            except Exception:
+                finished = True  # a failing source is not a disconnect
+                raise
+            finally:
+                pending = None
+            last_sent = loop.time()
+            yield frame
+    finally:
+        if not finished:
+            print(json.dumps({"type": "client_disconnected", "path": request.url.path}), flush=True)
+            if on_disconnect is not None:
+                spawn(on_disconnect(), name="on_disconnect")
+        if pending is not None and not pending.done():
+            # `frames` unwinds (running its own finally/cleanup) inside that task;
+            # don't await it here, this task may be cancelled already.
+            pending.cancel()
+        else:
+            aclose = getattr(frames, "aclose", None)
+            if aclose is not None:
+                await aclose()
@@ -0,0 +1,156 @@
+# apps/gateway-fastapi/src/features/store_cache.py
+from __future__ import annotations
+
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from src.utils.ttl_cache import TTLCache, MISSING
+from src.features.store_index import Index, record_put, resolve_index
+
+# Read-through / write-through cache over the LangGraph Store client (client.store).
+#
+# The routers in src/features/ call client.store.get_item on every request
+# (profile on every chat turn, soft-delete checks, ...). with_cached_store(client)
+# returns a client view whose .store serves those reads from a bounded LRU per
+# namespace family, keeps them fresh on put_item/delete_item, and remembers
+# "not found" for a short while. Everything else is delegated to the real client.
+#
+# Only families listed in STORE_CACHE_POLICIES are cached. Items that are
+# read-modify-written (the transcript) are deliberately left out: with several
+# gateway replicas a stale cached copy would turn into a lost update.
+#
+# put_item also fills in the write's `index` from the per-namespace embedding
+# policy in src/features/store_index.py and counts what it will cost.
+#
+# "Not found" is normalized: a cached or fresh 404 is returned as None, which is
+# what every caller already treats as "missing".
+
+STORE_CACHE_ENABLED = os.getenv("STORE_CACHE_ENABLED", "true").lower() == "true"
+STORE_CACHE_NEGATIVE_TTL_S = float(os.getenv("STORE_CACHE_NEGATIVE_TTL_S", "30"))
+
+# family -> (namespace pattern ("*" = any one segment), maxsize, ttl seconds)
+STORE_CACHE_POLICIES: Dict[str, Tuple[Tuple[str, ...], int, float]] = {
+    "profile": (("users", "*"), int(os.getenv("STORE_CACHE_PROFILE_SIZE", "10000")), float(os.getenv("STORE_CACHE_PROFILE_TTL_S", "300"))),
+    "deleted_threads": (("users", "*", "deleted_threads"), int(os.getenv("STORE_CACHE_DELETED_SIZE", "20000")), float(os.getenv("STORE_CACHE_DELETED_TTL_S", "120"))),
+}
+
+_Key = Tuple[Tuple[str, ...], str]
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _is_not_found(e: Exception) -> bool:
+    # langgraph_sdk raises httpx.HTTPStatusError; keep this duck-typed.
+    resp = getattr(e, "response", None)
+    return getattr(resp, "status_code", None) == 404
+
+
+def _family(namespace: Tuple[str, ...]) -> Optional[str]:
+    for name, (pattern, _, _) in STORE_CACHE_POLICIES.items():
+        if len(pattern) == len(namespace) and all(p == "*" or p == n for p, n in zip(pattern, namespace)):
+            return name
+    return None
+
+
+class StoreCache:
+    """One TTLCache per namespace family plus negative-hit counters."""
+
+    def __init__(self) -> None:
+        self.tables: Dict[str, TTLCache[_Key, Optional[dict]]] = {
+            name: TTLCache(maxsize=size if STORE_CACHE_ENABLED else 0, ttl_s=ttl)
+            for name, (_, size, ttl) in STORE_CACHE_POLICIES.items()
+        }
+        self.negative_hits: Dict[str, int] = {name: 0 for name in self.tables}
+
+    def table(self, namespace: Tuple[str, ...]) -> Optional[TTLCache]:
+        fam = _family(namespace)
+        if fam is None:
+            return None
+        t = self.tables[fam]
+        return t if t.enabled else None
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        out: Dict[str, Dict[str, int]] = {}
+        for name, t in self.tables.items():
+            out[name] = {**t.stats(), "negative_hits": self.negative_hits[name]}
+        return out
+
+
+# Shared by every wrapped client in this process
+STORE_CACHE = StoreCache()
+
+
+class CachedStore:
+    """Drop-in for langgraph_sdk's StoreClient (get/put/delete cached; rest delegated)."""
+
+    def __init__(self, store: Any, cache: StoreCache = STORE_CACHE) -> None:
+        self._store = store
+        self._cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._store, name)
+
+    async def get_item(self, namespace: Sequence[str], /, key: str, **kwargs: Any) -> Optional[dict]:
+        ns = tuple(namespace)
+        table = self._cache.table(ns)
+        if table is not None:
+            hit = table.get((ns, key))
+            if hit is not MISSING:
+                if hit is None:
+                    self._cache.negative_hits[_family(ns)] += 1
+                return hit
+        try:
+            item = await self._store.get_item(list(ns), key=key, **kwargs)
+        except Exception as e:
+            if not _is_not_found(e):
+                raise
+            item = None
+        if table is not None:
+            table.put((ns, key), item, ttl_s=None if item is not None else STORE_CACHE_NEGATIVE_TTL_S)
+        return item
+
+    async def put_item(self, namespace: Sequence[str], /, key: str, value: dict, index: Index = None, **kwargs: Any) -> None:
+        ns = tuple(namespace)
+        table = self._cache.table(ns)
+        if table is not None:
+            # Never serve the old value while (or after) the write is in flight
+            table.pop((ns, key))
+        # Embedding is opt-in per namespace family (src/features/store_index.py)
+        index = resolve_index(ns, key, index)
+        await self._store.put_item(list(ns), key=key, value=value, index=index, **kwargs)
+        record_put(ns, key, value, index)
+        if table is not None:
+            now = _now_iso()
+            table.put((ns, key), {"namespace": list(ns), "key": key, "value": value, "created_at": now, "updated_at": now})
+
+    async def delete_item(self, namespace: Sequence[str], /, key: str, **kwargs: Any) -> None:
+        ns = tuple(namespace)
+        table = self._cache.table(ns)
+        if table is not None:
+            table.pop((ns, key))
+        await self._store.delete_item(list(ns), key=key, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return self._cache.stats()
+
+
+class _ClientView:
+    """LangGraph client whose .store is cached; threads/runs/... are the real ones."""
+
+    def __init__(self, client: Any, store: CachedStore) -> None:
+        self._client = client
+        self.store = store
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+def with_cached_store(client: Any, cache: StoreCache = STORE_CACHE) -> Any:
+    return _ClientView(client, CachedStore(client.store, cache))
+
+
+def store_cache_stats() -> Dict[str, Dict[str, int]]:
+    return STORE_CACHE.stats()
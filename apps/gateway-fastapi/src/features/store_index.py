@@ -0,0 +1,137 @@
+# apps/gateway-fastapi/src/features/store_index.py
+from __future__ import annotations
+
+import os
+import json
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple, Union
+
+# Which Store writes get embedded, decided per namespace family.
+#
+# The deployment's store index (apps/agent-langgraph/langgraph.json) embeds
+# every put_item with text-embedding-3-small unless the write says otherwise.
+# Most of what the gateway writes is never searched semantically: profiles,
+# the deleted-thread registry and raw transcripts are only ever read by key.
+# index_for() gives each gateway write its explicit `index` argument:
+#
+#   profile            users/<uid>                      key=profile        off
+#   deleted_threads    users/<uid>/deleted_threads      any key            off
+#   transcript_head    threads/<uid>/<tid>              transcript:head    off
+#   transcript_page    threads/<uid>/<tid>              transcript:p*      TRANSCRIPT_INDEX
+#   memories           users/<uid>/memories/<kind>      any key            ["text"]  (written by the agent)
+#
+# TRANSCRIPT_INDEX=pages embeds each sealed transcript page once, which is the
+# message delta since the previous page. Nothing is re-embedded as a thread
+# grows. The default is off because nothing searches transcripts today.
+#
+# record_put() counts, per family, the writes and the texts/tokens each one
+# sends to the embedder, so /metrics shows what indexing actually costs. Tokens
+# are estimated at ~4 characters each; the embedding API reports real usage to
+# the LangGraph deployment, not to us.
+
+TRANSCRIPT_INDEX = os.getenv("TRANSCRIPT_INDEX", "off").lower()  # off | pages
+# Must match store.index.fields in langgraph.json: applied to writes without an explicit index
+STORE_INDEX_DEFAULT_FIELDS = [f.strip() for f in os.getenv("STORE_INDEX_DEFAULT_FIELDS", "text").split(",") if f.strip()]
+
+_CHARS_PER_TOKEN = 4
+
+Index = Union[Literal[False], List[str], None]
+
+# family -> (namespace pattern ("*" = any one segment), key ("*" = any, "x*" = prefix), index)
+INDEX_POLICIES: List[Tuple[str, Tuple[str, ...], str, Index]] = [
+    ("profile", ("users", "*"), "profile", False),
+    ("deleted_threads", ("users", "*", "deleted_threads"), "*", False),
+    ("transcript_head", ("threads", "*", "*"), "transcript:head", False),
+    ("transcript_page", ("threads", "*", "*"), "transcript:p*",
+     ["messages[*].content"] if TRANSCRIPT_INDEX == "pages" else False),
+    ("memories", ("users", "*", "memories", "*"), "*", ["text"]),
+]
+
+
+def _key_matches(pattern: str, key: str) -> bool:
+    if pattern == "*":
+        return True
+    if pattern.endswith("*"):
+        return key.startswith(pattern[:-1])
+    return key == pattern
+
+
+def _policy(namespace: Sequence[str], key: str) -> Tuple[str, Index]:
+    ns = tuple(namespace)
+    for family, pattern, key_pattern, index in INDEX_POLICIES:
+        if (len(pattern) == len(ns) and all(p == "*" or p == n for p, n in zip(pattern, ns))
+                and _key_matches(key_pattern, key)):
+            return family, index
+    return "other", None
+
+
+def index_for(namespace: Sequence[str], key: str) -> Index:
+    """The `index` argument for a put_item into this namespace/key."""
+    return _policy(namespace, key)[1]
+
+
+def _texts(value: Any, path: str) -> List[str]:
+    # The subset of LangGraph's index paths we use: "$", "field", "a.b", "list[*].field"
+    if path == "$":
+        return [value if isinstance(value, str) else _dump(value)]
+    nodes = [value]
+    for part in path.split("."):
+        name, star = (part[:-3], True) if part.endswith("[*]") else (part, False)
+        nxt: List[Any] = []
+        for node in nodes:
+            if not isinstance(node, dict) or name not in node:
+                continue
+            v = node[name]
+            if star:
+                nxt.extend(v if isinstance(v, list) else [])
+            else:
+                nxt.append(v)
+        nodes = nxt
+    return [n if isinstance(n, str) else _dump(n) for n in nodes if n is not None]
+
+
+def _dump(v: Any) -> str:
+    return json.dumps(v, ensure_ascii=False)
+
+
+class IndexCounters:
+    """Per-family puts and (estimated) embedding work."""
+
+    def __init__(self) -> None:
+        self.puts: Dict[str, int] = {}
+        self.embeds: Dict[str, int] = {}
+        self.tokens: Dict[str, int] = {}
+
+    def record(self, family: str, texts: List[str]) -> None:
+        self.puts[family] = self.puts.get(family, 0) + 1
+        if texts:
+            self.embeds[family] = self.embeds.get(family, 0) + len(texts)
+            chars = sum(len(t) for t in texts)
+            self.tokens[family] = self.tokens.get(family, 0) + -(-chars // _CHARS_PER_TOKEN)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            fam: {"puts": n, "embeddings": self.embeds.get(fam, 0), "tokens": self.tokens.get(fam, 0)}
+            for fam, n in self.puts.items()
+        }
+
+
+INDEX_COUNTERS = IndexCounters()
+
+
+def record_put(namespace: Sequence[str], key: str, value: Dict[str, Any], index: Index) -> None:
+    """Count one put_item and the texts the store will embed for it."""
+    family, _ = _policy(namespace, key)
+    fields = STORE_INDEX_DEFAULT_FIELDS if index is None else (index or [])
+    texts: List[str] = []
+    for path in fields:
+        texts.extend(t for t in _texts(value, path) if t)
+    INDEX_COUNTERS.record(family, texts)
+
+
+def store_index_stats() -> Dict[str, Dict[str, int]]:
+    return INDEX_COUNTERS.stats()
+
+
+def resolve_index(namespace: Sequence[str], key: str, index: Optional[Index]) -> Index:
+    """An explicit index from the caller wins; otherwise the family policy applies."""
+    return index if index is not None else index_for(namespace, key)
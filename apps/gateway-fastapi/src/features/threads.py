@@ -1,12 +1,19 @@
 # apps/gateway-fastapi/src/features/threads.py
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import os
+import json
+import base64
+import hashlib
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel, Field
 
+from src.utils.ttl_cache import TTLCache, MISSING
+from src.features.ownership import owned_thread, remember_thread, forget_thread
+
 # We rely on the LangGraph Python SDK you already use in main.py. (client is injected)
 # Threads primitives we use are documented here:
 #  - create(): make a new thread
@@ -16,6 +23,33 @@ from pydantic import BaseModel, Field
 #  - delete(): delete a thread [may not exist on older SDKs]
 #
 # Our router gracefully falls back to "soft delete" if delete/update are missing.  :contentReference[oaicite:8]{index=8}
+#
+# Store soft-deletes are read through a per-user index (the set of deleted thread
+# ids, loaded with one search_items over the user's deleted_threads namespace and
+# cached for DELETED_INDEX_TTL_S), so listing N threads costs one threads search
+# plus at most one store call instead of N get_item round trips. This replica's
+# own deletes update the index at once; other replicas see them within the TTL.
+
+DELETED_INDEX_TTL_S = float(os.getenv("DELETED_INDEX_TTL_S", "120"))
+DELETED_INDEX_SIZE = int(os.getenv("DELETED_INDEX_SIZE", "10000"))
+DELETED_INDEX_PAGE = 1000  # search_items page size (one page for nearly every user)
+
+# GET /api/threads pages by an opaque cursor over (updated_at, thread_id), newest
+# first; the next page's cursor comes back in X-Next-Cursor. The Threads API only
+# pages by offset, so the cursor also carries the offset it stopped at: the next
+# page searches from a little before it (THREADS_CURSOR_SLACK, in case threads
+# above it were deleted) and skips anything not strictly older than the cursor
+# (threads bumped to the top since). Each search over-fetches by
+# THREADS_OVERFETCH so filtered deleted threads don't leave short pages.
+#
+# The response carries a weak ETag over the page itself (each thread's sort key
+# and title, the next cursor), hashed after the fetch at no extra calls. A
+# matching If-None-Match still costs the page's searches but gets a bodyless 304.
+
+THREADS_PAGE_MAX = int(os.getenv("THREADS_PAGE_MAX", "200"))
+THREADS_OVERFETCH = int(os.getenv("THREADS_OVERFETCH", "10"))
+THREADS_CURSOR_SLACK = int(os.getenv("THREADS_CURSOR_SLACK", "10"))
+THREADS_MAX_SEARCHES = 3  # per page, when many threads in a row are deleted
 
 class ThreadCreate(BaseModel):
     title: Optional[str] = Field(default=None, description="Optional friendly title for the thread")
@@ -37,6 +71,16 @@ def _summarize(t: Dict[str, Any]) -> ThreadSummary:
         updated_at=t.get("updated_at"),
     )
 
+async def latest_or_new_thread(client, user_id: str) -> str:
+    """The user's most recently updated thread, or a new one (API errors propagate)."""
+    results = await client.threads.search(metadata={"user_id": user_id}, limit=1)
+    if results:
+        remember_thread(results[0])
+        return results[0]["thread_id"]
+    created = await client.threads.create(metadata={"user_id": user_id})
+    remember_thread(created)
+    return created["thread_id"]
+
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
@@ -44,29 +88,128 @@ def _deleted_ns(user_id: str) -> list[str]:
     # Fallback soft-delete registry in Store (per-user)
     return ["users", user_id, "deleted_threads"]
 
+# user_id -> ids of threads soft-deleted in the Store registry
+DELETED_INDEX: "TTLCache[str, FrozenSet[str]]" = TTLCache(maxsize=DELETED_INDEX_SIZE, ttl_s=DELETED_INDEX_TTL_S)
+
+def deleted_index_stats() -> Dict[str, int]:
+    return DELETED_INDEX.stats()
+
 async def _mark_deleted_in_store(client, user_id: str, thread_id: str) -> None:
     try:
         await client.store.put_item(
             _deleted_ns(user_id),
             key=thread_id,
             value={"thread_id": thread_id, "deleted_at": _now_iso()},
-            index=["thread_id"],
         )
     except Exception:
-        pass
+        DELETED_INDEX.pop(user_id)
+        return
+    ids = DELETED_INDEX.get(user_id)
+    if ids is MISSING:
+        DELETED_INDEX.pop(user_id)
+    else:
+        DELETED_INDEX.put(user_id, ids | {thread_id})
+
+async def _deleted_thread_ids(client, user_id: str) -> FrozenSet[str]:
+    ids = DELETED_INDEX.get(user_id)
+    if ids is not MISSING:
+        return ids
+    found: set[str] = set()
+    offset = 0
+    try:
+        while True:
+            page = await client.store.search_items(_deleted_ns(user_id), limit=DELETED_INDEX_PAGE, offset=offset)
+            items = (page or {}).get("items") or []
+            found.update(it.get("key") for it in items if it.get("key"))
+            if len(items) < DELETED_INDEX_PAGE:
+                break
+            offset += len(items)
+    except Exception:
+        # Store unavailable: show the threads rather than fail the list (not cached)
+        return frozenset(found)
+    ids = frozenset(found)
+    DELETED_INDEX.put(user_id, ids)
+    return ids
 
 async def _is_deleted_in_store(client, user_id: str, thread_id: str) -> bool:
+    return thread_id in await _deleted_thread_ids(client, user_id)
+
+# ---- Listing: cursor + ETag ----
+
+_Key = Tuple[str, str]
+
+def _sort_key(t: Dict[str, Any]) -> _Key:
+    return (str(t.get("updated_at") or ""), str(t.get("thread_id") or ""))
+
+def _encode_cursor(key: _Key, offset: int) -> str:
+    raw = json.dumps({"u": key[0], "t": key[1], "o": offset}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[_Key, int]:
     try:
-        item = await client.store.get_item(_deleted_ns(user_id), key=thread_id)
-        return item is not None
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        c = json.loads(raw)
+        return (str(c["u"]), str(c["t"])), max(0, int(c["o"]))
     except Exception:
+        raise HTTPException(status_code=400, detail="invalid_cursor")
+
+def _page_etag(out: List[ThreadSummary], next_cursor: Optional[str]) -> str:
+    h = hashlib.sha1()
+    for t in out:
+        h.update(f"{t.updated_at or ''}\0{t.thread_id}\0{t.title or ''}\0{t.status or ''}\n".encode("utf-8"))
+    h.update((next_cursor or "").encode("utf-8"))
+    return f'W/"{h.hexdigest()[:32]}"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
         return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+
+async def _list_page(
+    client, user_id: str, limit: int, after: Optional[Tuple[_Key, int]]
+) -> Tuple[List[ThreadSummary], Optional[str]]:
+    """One page of live threads, newest first, and the cursor for the next (None at the end)."""
+    deleted = await _deleted_thread_ids(client, user_id)
+    after_key, after_offset = after if after else (None, 0)
+    offset = max(0, after_offset - THREADS_CURSOR_SLACK) if after else 0
+    batch = limit + THREADS_OVERFETCH
+    out: List[ThreadSummary] = []
+    last: Optional[Tuple[_Key, int]] = None
+    for _ in range(THREADS_MAX_SEARCHES):
+        items = await client.threads.search(
+            metadata={"user_id": user_id},
+            sort_by="updated_at",
+            sort_order="desc",
+            limit=batch,
+            offset=offset,
+        ) or []
+        for i, t in enumerate(items):
+            remember_thread(t)  # feeds the ownership cache for the per-thread endpoints
+            key = _sort_key(t)
+            if after_key is not None and key >= after_key:
+                continue  # shown on an earlier page (or bumped to the top since)
+            last = (key, offset + i + 1)
+            meta = t.get("metadata") or {}
+            # Exclude soft-deleted threads (metadata flag, or the Store fallback)
+            if meta.get("deleted") is True or t.get("thread_id", "") in deleted:
+                continue
+            out.append(_summarize(t))
+            if len(out) == limit:
+                more = i < len(items) - 1 or len(items) == batch
+                return out, _encode_cursor(*last) if more else None
+        if len(items) < batch:
+            return out, None
+        offset += len(items)
+    # Many deleted threads in a row: return a short page, resume after what we scanned
+    return out, _encode_cursor(*last) if last else None
 
 def make_threads_router(client, get_current_user, user_id_from_claims) -> APIRouter:
     """
     Endpoints:
       POST   /api/threads         -> create a thread (metadata.user_id + optional title)
       GET    /api/threads         -> list threads for current user (newest first; excludes deleted)
+                                     ?limit=&cursor= (X-Next-Cursor), ETag / If-None-Match -> 304
       GET    /api/threads/{id}    -> read one thread (403 if not owned by user)
       PUT    /api/threads/{id}    -> update title (best-effort; 405 if SDK lacks 'update')
       DELETE /api/threads/{id}    -> delete (hard if available; soft-delete fallback)
@@ -85,31 +228,27 @@ def make_threads_router(client, get_current_user, user_id_from_claims) -> APIRou
             meta["title"] = payload.title
 
         t = await client.threads.create(metadata=meta)
+        remember_thread(t)
         return _summarize(t)
 
     @router.get("", response_model=List[ThreadSummary])
-    async def list_threads(request: Request, limit: int = 50):
+    async def list_threads(request: Request, response: Response, limit: int = 50, cursor: Optional[str] = None):
         claims = await get_current_user(request)
         if not claims:
             raise HTTPException(status_code=401, detail="unauthenticated")
         user_id = user_id_from_claims(claims)
 
-        items = await client.threads.search(
-            metadata={"user_id": user_id},
-            sort_by="updated_at",
-            sort_order="desc",
-            limit=limit,
-        )
-        out: List[ThreadSummary] = []
-        for t in items or []:
-            meta = t.get("metadata") or {}
-            # Exclude soft-deleted threads (metadata flag)
-            if meta.get("deleted") is True:
-                continue
-            # Exclude soft-deleted threads recorded in Store fallback
-            if await _is_deleted_in_store(client, user_id, t.get("thread_id", "")):
-                continue
-            out.append(_summarize(t))
+        limit = max(1, min(limit, THREADS_PAGE_MAX))
+        after = _decode_cursor(cursor) if cursor else None
+
+        out, next_cursor = await _list_page(client, user_id, limit, after)
+        etag = _page_etag(out, next_cursor)
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         return out
 
     @router.get("/{thread_id}", response_model=ThreadSummary)
@@ -119,7 +258,10 @@ def make_threads_router(client, get_current_user, user_id_from_claims) -> APIRou
             raise HTTPException(status_code=401, detail="unauthenticated")
         user_id = user_id_from_claims(claims)
 
+        # The thread itself is the payload here (status changes with every run), so
+        # this is a real get; it refreshes the ownership cache for the other endpoints.
         t = await client.threads.get(thread_id)
+        remember_thread(t)
         if not t or (t.get("metadata") or {}).get("user_id") != user_id:
             raise HTTPException(status_code=404, detail="not_found")
 
@@ -136,19 +278,21 @@ def make_threads_router(client, get_current_user, user_id_from_claims) -> APIRou
             raise HTTPException(status_code=401, detail="unauthenticated")
         user_id = user_id_from_claims(claims)
 
-        t = await client.threads.get(thread_id)
-        if not t or (t.get("metadata") or {}).get("user_id") != user_id:
+        if await owned_thread(client, thread_id, user_id) is None:
             raise HTTPException(status_code=404, detail="not_found")
 
         if not payload.title:
+            t = await client.threads.get(thread_id)
+            remember_thread(t)
             return _summarize(t)
 
         if not hasattr(client.threads, "update"):
             raise HTTPException(status_code=405, detail="update_not_supported_by_sdk")
 
-        new_meta = dict(t.get("metadata") or {})
-        new_meta["title"] = payload.title
-        t2 = await client.threads.update(thread_id, metadata=new_meta)
+        # Thread metadata updates merge keys, so only the title is sent
+        forget_thread(thread_id)
+        t2 = await client.threads.update(thread_id, metadata={"title": payload.title})
+        remember_thread(t2)
         return _summarize(t2)
 
     @router.delete("/{thread_id}")
@@ -161,9 +305,9 @@ def make_threads_router(client, get_current_user, user_id_from_claims) -> APIRou
             raise HTTPException(status_code=401, detail="unauthenticated")
         user_id = user_id_from_claims(claims)
 
-        t = await client.threads.get(thread_id)
-        if not t or (t.get("metadata") or {}).get("user_id") != user_id:
+        if await owned_thread(client, thread_id, user_id) is None:
             raise HTTPException(status_code=404, detail="not_found")
+        forget_thread(thread_id)
 
         # 1) Try hard delete
         if hasattr(client.threads, "delete"):
@@ -172,10 +316,8 @@ def make_threads_router(client, get_current_user, user_id_from_claims) -> APIRou
 
         # 2) Try soft-delete via metadata
         if hasattr(client.threads, "update"):
-            new_meta = dict(t.get("metadata") or {})
-            new_meta["deleted"] = True
-            new_meta["deleted_at"] = _now_iso()
-            await client.threads.update(thread_id, metadata=new_meta)
+            t2 = await client.threads.update(thread_id, metadata={"deleted": True, "deleted_at": _now_iso()})
+            remember_thread(t2)
             return {"ok": True, "mode": "soft:metadata"}
 
         # 3) Final fallback: mark in Store registry so list() filters it out
@@ -0,0 +1,66 @@
+# apps/gateway-fastapi/src/features/tracing.py
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+
+from prynai_shared.trace import Tracer, tracer_from_env, format_tree, read_jsonl, trace_file_path
+
+from src.features.metrics import require_ops_token
+
+# Per-request traces for the chat routes (prynai_shared.trace; no collector).
+#
+# StageTimer (src/features/pipeline.py) owns one trace per request: the root span
+# is the request, each stage is a child span, and the agent run gets a span whose
+# id is passed to the agent in config["configurable"] (trace_id, parent_span_id),
+# so chat_node's spans nest under it. The trace id goes back to the client in the
+# X-Trace-Id header and into the chat_stages log line.
+#
+# Export is set by PRYNAI_TRACE_EXPORT / PRYNAI_TRACE_FILE (default: in-memory ring
+# buffer, served below). The agent writes its spans to PRYNAI_TRACE_FILE by
+# default. When that file is visible here (local runs, a shared volume), a trace
+# lookup merges it with the ring, so one response holds both halves of the turn.
+#
+# Traces carry thread and run ids, so /debug/traces always needs Bearer
+# METRICS_TOKEN. Without a token configured it 404s (METRICS_PUBLIC does not
+# open it).
+
+TRACER: Tracer = tracer_from_env("gateway")
+
+
+def _trace_spans(trace_id: str) -> List[Dict[str, Any]]:
+    # Ring spans plus any from the shared JSONL file, each span once
+    spans = {s["span_id"]: s for s in TRACER.get(trace_id)}
+    for s in read_jsonl(trace_file_path(), trace_id):
+        spans.setdefault(s["span_id"], s)
+    return sorted(spans.values(), key=lambda s: s["start"])
+
+
+def make_traces_router() -> APIRouter:
+    """
+    Endpoints (Bearer METRICS_TOKEN; 404 when no token is configured):
+      GET /debug/traces               -> most recent trace ids in the ring buffer
+      GET /debug/traces/{trace_id}    -> spans of one trace, ring + trace file (+ ?format=tree)
+    """
+    router = APIRouter(prefix="/debug/traces", tags=["ops"])
+
+    @router.get("", include_in_schema=False)
+    async def recent_traces(request: Request, limit: int = 20):
+        require_ops_token(request, allow_public=False)
+        if TRACER.ring is None:
+            raise HTTPException(status_code=404, detail="trace_buffer_disabled")
+        return {"trace_ids": TRACER.ring.recent(max(1, min(limit, 200)))}
+
+    @router.get("/{trace_id}", include_in_schema=False)
+    async def get_trace(trace_id: str, request: Request, format: Optional[str] = None):
+        require_ops_token(request, allow_public=False)
+        spans = await asyncio.to_thread(_trace_spans, trace_id)  # file scan off the loop
+        if not spans:
+            raise HTTPException(status_code=404, detail="not_found")
+        if format == "tree":
+            return {"trace_id": trace_id, "tree": format_tree(spans).splitlines()}
+        return {"trace_id": trace_id, "spans": spans}
+
+    return router
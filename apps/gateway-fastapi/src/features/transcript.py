@@ -1,11 +1,78 @@
 from __future__ import annotations
 
-from typing import List, Dict, Any, Optional
+import os
+import sys
+import gzip
+import json
+import asyncio
+from typing import List, Dict, Any, Awaitable, Callable, Optional, Tuple, TypeVar
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel, Field
 
+from src.utils.keyed_lock import KeyedLock
+from src.features.pipeline import StageTimer, spawn
+from src.features.ownership import owned_thread
+from src.features.transcript_checkpoint import thread_window, forget_thread_view
+
+# Transcript storage: append-only pages under ["threads", user_id, thread_id].
+#
+#   transcript:head      {pages, seq, page_size, tail: [...]}
+#   transcript:p000000   {page: 0, messages: [page_size messages]}
+#   transcript:p000001   ...
+#
+# Each message carries a sequence number. New messages go to the head's open
+# `tail`; when it reaches page_size messages it is sealed into the next page
+# item and never rewritten. An append therefore reads and writes at most one
+# page worth of messages however long the thread is. Only sealed pages can be
+# embedded, once each (TRANSCRIPT_INDEX, src/features/store_index.py).
+#
+# Messages are stored in seq order, so reads never sort. The messages API is
+# tail-first: it reads the head, which gives the total count and the newest
+# messages, plus only the sealed pages that overlap the requested window.
+#
+# Threads written before pages existed have one item, key="transcript", holding
+# every message. It is still read as-is, and the first append to such a thread
+# copies it into pages.
+#
+# Writes go through one TranscriptWriter per process:
+# - A per-thread KeyedLock serializes head read-modify-writes. Double submits,
+#   or the files route running next to the plain one, no longer lose updates.
+# - The user turn is appended with hold=True. It waits in an in-memory pending
+#   buffer, and the assistant turn then writes both in one head update: one
+#   store write per turn instead of two. Stream completion without an answer
+#   (flush_transcript), TRANSCRIPT_HOLD_MAX_S and gateway shutdown
+#   (flush_transcripts) flush whatever is still held.
+# - Readers on this replica include pending messages as the newest ones, so the
+#   user turn shows up at once. A replica crash loses held turns. The agent's
+#   checkpoint still has them.
+# - Readers don't take the lock. They read the head, then pair it with the
+#   pending snapshot, and retry if a flush of that thread started meanwhile (it
+#   may have moved messages from pending into the head). A slow store read never
+#   holds up the writer.
+# The lock is per process: appends to one thread racing on different replicas
+# can still lose a head update.
+#
+# TRANSCRIPT_BACKEND=checkpoint switches all of this off. Appends write nothing,
+# and reads project the agent's checkpointed messages instead
+# (src/features/transcript_checkpoint.py).
+
+TRANSCRIPT_PAGE_SIZE = max(1, int(os.getenv("TRANSCRIPT_PAGE_SIZE", "32")))
+MESSAGES_PAGE_DEFAULT = int(os.getenv("MESSAGES_PAGE_DEFAULT", "50"))
+MESSAGES_PAGE_MAX = int(os.getenv("MESSAGES_PAGE_MAX", "500"))
+MESSAGES_GZIP_MIN_BYTES = int(os.getenv("MESSAGES_GZIP_MIN_BYTES", "4096"))
+TRANSCRIPT_HOLD_MAX_S = float(os.getenv("TRANSCRIPT_HOLD_MAX_S", "60"))
+# store: the pages above | checkpoint: derived from the agent's checkpoints, no writes
+TRANSCRIPT_BACKEND = os.getenv("TRANSCRIPT_BACKEND", "store").lower()
+
+HEAD_KEY = "transcript:head"
+PAGE_PREFIX = "transcript:p"
+LEGACY_KEY = "transcript"
+READ_RETRIES = 3  # optimistic reads per request before falling back to the lock
+
+T = TypeVar("T")
+
 
 def _ns(user_id: str, thread_id: str) -> list[str]:
     # Namespace for durable per-thread items
@@ -18,69 +85,389 @@ class TranscriptMessage(BaseModel):
     ts: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
 
-async def _get_transcript(client, user_id: str, thread_id: str) -> list[dict]:
-    """
-    Transcript lives as one item: key="transcript" in the thread namespace.
+def _value(item: Any) -> Optional[dict]:
+    # get_item returns the Item dict ({namespace, key, value, ...}); older SDKs an object
+    if not item:
+        return None
+    val = item.get("value") if isinstance(item, dict) else getattr(item, "value", None)
+    return val if isinstance(val, dict) else None
 
-    NEW (backward-compatible):
-      We now store a self-describing object:
-        { "user_id": ..., "thread_id": ..., "messages": [ {role, content, ts}, ... ] }
 
-      If an older shape exists ({"messages":[...]}), we still read it.
-    """
+def _is_not_found(e: Exception) -> bool:
+    resp = getattr(e, "response", None)
+    return getattr(resp, "status_code", None) == 404
+
+
+async def _get_item(client, user_id: str, thread_id: str, key: str) -> Optional[dict]:
     try:
-        item = await client.store.get_item(_ns(user_id, thread_id), key="transcript")
-        val = getattr(item, "value", item) if item else None
-        if isinstance(val, dict):
-            msgs = list(val.get("messages") or [])
-            return msgs
-    except Exception:
-        pass
-    return []
+        return _value(await client.store.get_item(_ns(user_id, thread_id), key=key))
+    except Exception as e:
+        if _is_not_found(e):
+            return None
+        raise
 
 
-async def append_transcript(client, user_id: str, thread_id: str, msg: TranscriptMessage) -> None:
-    """
-    Append one message to the per-thread transcript. We embed the whole value (index=["$"])
-    to avoid field-mismatch issues and keep search flexible later.
-    """
-    msgs = await _get_transcript(client, user_id, thread_id)
-    msgs.append(msg.model_dump())
+def _page_key(n: int) -> str:
+    return f"{PAGE_PREFIX}{n:06d}"
 
-    value = {
+
+def _new_head(user_id: str, thread_id: str) -> dict:
+    return {
         "user_id": user_id,
         "thread_id": thread_id,
-        "messages": msgs,
+        "version": 2,
+        "page_size": TRANSCRIPT_PAGE_SIZE,
+        "pages": 0,   # sealed pages: transcript:p000000 .. p{pages-1}
+        "seq": 0,     # last sequence number handed out
+        "tail": [],   # the open page, sealed once it holds page_size messages
     }
+
+
+async def _put_page(client, user_id: str, thread_id: str, n: int, msgs: list[dict]) -> None:
     await client.store.put_item(
         _ns(user_id, thread_id),
-        key="transcript",
-        value=value,
-        index=["$"],  # embed whole doc per LangGraph guidance
+        key=_page_key(n),
+        value={"user_id": user_id, "thread_id": thread_id, "page": n, "messages": msgs},
     )
 
 
+async def _put_head(client, user_id: str, thread_id: str, head: dict) -> None:
+    await client.store.put_item(_ns(user_id, thread_id), key=HEAD_KEY, value=head)
+
+
+async def _migrate_legacy(client, user_id: str, thread_id: str) -> dict:
+    """Head for a thread without one, carrying over a legacy single-item transcript."""
+    head = _new_head(user_id, thread_id)
+    legacy = await _get_item(client, user_id, thread_id, LEGACY_KEY)
+    msgs = sorted((legacy or {}).get("messages") or [], key=lambda m: m.get("ts") or "")
+    if not msgs:
+        return head
+    size = head["page_size"]
+    for i, m in enumerate(msgs, start=1):
+        m["seq"] = i
+    sealed = len(msgs) // size
+    for n in range(sealed):
+        await _put_page(client, user_id, thread_id, n, msgs[n * size:(n + 1) * size])
+    head.update(pages=sealed, seq=len(msgs), tail=msgs[sealed * size:])
+    # The legacy item is left in place; readers ignore it once the head exists
+    print(json.dumps({"type": "transcript_migrated", "tid": thread_id, "messages": len(msgs), "pages": sealed}), flush=True)
+    return head
+
+
+async def _get_transcript(client, user_id: str, thread_id: str) -> list[dict]:
+    """All messages in sequence order (sealed pages, the head's tail, then pending)."""
+    msgs, _ = await _read_window(client, user_id, thread_id, limit=sys.maxsize)
+    return msgs
+
+
+async def _read_window(
+    client, user_id: str, thread_id: str, *, limit: int, before: Optional[int] = None, after: Optional[int] = None,
+) -> Tuple[list[dict], int]:
+    """
+    Messages with seq in one window, oldest first, plus the total count.
+
+    Default: the newest `limit`. `before=N`: the newest `limit` with seq < N.
+    `after=N`: the oldest `limit` with seq > N. Only the pages overlapping the
+    window are fetched (none at all when it falls inside the head's tail).
+    Messages still pending in this replica's writer count as the newest ones.
+    """
+    if TRANSCRIPT_BACKEND == "checkpoint":
+        return await thread_window(client, thread_id, lambda total: _window(total, limit, before, after))
+
+    async def read_head() -> Tuple[Optional[dict], Optional[dict]]:
+        head = await _get_item(client, user_id, thread_id, HEAD_KEY)
+        if head is not None:
+            return head, None
+        return None, await _get_item(client, user_id, thread_id, LEGACY_KEY)
+
+    # Head + pending, consistent with each other (see the module comment).
+    # Sealed pages never change, so they are read afterwards.
+    (head, item), pending = await WRITER.read_with_pending((user_id, thread_id), read_head)
+    legacy = None
+    if head is None:
+        # Legacy single item: ordered by ts, sequence numbers are positions
+        legacy = sorted((item or {}).get("messages") or [], key=lambda m: m.get("ts") or "")
+        legacy = [{**m, "seq": i} for i, m in enumerate(legacy, start=1)]
+        stored = len(legacy)
+    else:
+        stored = int(head.get("seq") or 0)
+    pending = [{**m, "seq": stored + i} for i, m in enumerate(pending, start=1)]
+
+    total = stored + len(pending)
+    lo, hi = _window(total, limit, before, after)
+    if hi < lo:
+        return [], total
+    if legacy is not None:
+        msgs = legacy[lo - 1:min(hi, stored)]
+    elif lo <= stored:
+        size = int(head.get("page_size") or TRANSCRIPT_PAGE_SIZE)
+        pages = int(head.get("pages") or 0)
+        first, last = (lo - 1) // size, min(pages, (min(hi, stored) - 1) // size + 1)
+        loaded = await asyncio.gather(*(_get_item(client, user_id, thread_id, _page_key(n)) for n in range(first, last)))
+        msgs = []
+        for page in loaded:
+            msgs.extend((page or {}).get("messages") or [])
+        msgs.extend(head.get("tail") or [])
+        msgs = [m for m in msgs if lo <= int(m.get("seq") or 0) <= hi]
+    else:
+        msgs = []
+    msgs.extend(m for m in pending if lo <= m["seq"] <= hi)
+    return msgs, total
+
+
+async def last_message(client, user_id: str, thread_id: str) -> Optional[dict]:
+    """The thread's newest transcript message (pending ones included), or None."""
+    msgs, _ = await _read_window(client, user_id, thread_id, limit=1)
+    return msgs[-1] if msgs else None
+
+
+def _window(total: int, limit: int, before: Optional[int], after: Optional[int]) -> Tuple[int, int]:
+    # Inclusive seq range [lo, hi]; empty when hi < lo
+    if after is not None:
+        return after + 1, min(total, after + limit)
+    hi = total if before is None else min(total, before - 1)
+    return max(1, hi - limit + 1), hi
+
+
+def _json_response(request: Request, payload: Any, headers: Dict[str, str]) -> Response:
+    # Long threads are mostly prose: gzip shrinks them several-fold
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    headers = {**headers, "Vary": "Accept-Encoding"}
+    if len(body) >= MESSAGES_GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _write(client, user_id: str, thread_id: str, msgs: list[dict]) -> None:
+    """
+    Append messages in one head write (plus a page write per tail that fills up).
+    Callers hold the thread's lock.
+    """
+    head = await _get_item(client, user_id, thread_id, HEAD_KEY)
+    if head is None:
+        head = await _migrate_legacy(client, user_id, thread_id)
+
+    seq = int(head.get("seq") or 0)
+    pages = int(head.get("pages") or 0)
+    size = int(head.get("page_size") or TRANSCRIPT_PAGE_SIZE)
+    tail = list(head.get("tail") or [])
+    for m in msgs:
+        seq += 1
+        tail.append({**m, "seq": seq})
+        if len(tail) >= size:
+            # Seal first: a crash before the head write just rewrites the same page next time
+            await _put_page(client, user_id, thread_id, pages, tail)
+            pages += 1
+            tail = []
+    head.update(seq=seq, pages=pages, tail=tail)
+    await _put_head(client, user_id, thread_id, head)
+
+
+# ---- Write-behind writer ----
+
+class _Read:
+    __slots__ = ("stale",)
+
+    def __init__(self) -> None:
+        self.stale = False
+
+
+class _Pending:
+    __slots__ = ("client", "msgs", "timer")
+
+    def __init__(self, client) -> None:
+        self.client = client
+        self.msgs: list[dict] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class TranscriptWriter:
+    """Per-thread pending buffer + keyed lock; see the module comment."""
+
+    def __init__(self, hold_max_s: float = TRANSCRIPT_HOLD_MAX_S) -> None:
+        self.hold_max_s = hold_max_s
+        self.locks = KeyedLock()
+        self._pending: Dict[Tuple[str, str], _Pending] = {}
+        self._reads: Dict[Tuple[str, str], set[_Read]] = {}
+        self.writes = 0
+        self.read_retries = 0
+        self.messages = 0
+        self.failures = 0
+
+    def pending(self, key: Tuple[str, str]) -> list[dict]:
+        p = self._pending.get(key)
+        return list(p.msgs) if p else []
+
+    async def read_with_pending(self, key: Tuple[str, str], read: Callable[[], Awaitable[T]]) -> Tuple[T, list[dict]]:
+        """
+        `read()` (store reads of what flushes write) plus the pending messages
+        not in it, without holding the thread's lock across the store calls.
+        """
+        for _ in range(READ_RETRIES):
+            if self.locks.locked(key):
+                async with self.locks.hold(key):
+                    pass  # let the flush in progress land first
+            token = _Read()
+            self._reads.setdefault(key, set()).add(token)
+            try:
+                result = await read()
+            finally:
+                readers = self._reads.get(key)
+                if readers is not None:
+                    readers.discard(token)
+                    if not readers:
+                        self._reads.pop(key, None)
+            if not token.stale:
+                return result, self.pending(key)
+            self.read_retries += 1
+        # Flushes kept landing on this thread: read under the lock this once
+        async with self.locks.hold(key):
+            return await read(), self.pending(key)
+
+    async def append(self, client, user_id: str, thread_id: str, msg: TranscriptMessage, *, hold: bool = False) -> None:
+        key = (user_id, thread_id)
+        p = self._pending.get(key)
+        if p is None:
+            p = self._pending[key] = _Pending(client)
+        p.msgs.append(msg.model_dump())
+        if not hold:
+            await self.flush(user_id, thread_id)
+        elif p.timer is None:
+            p.timer = asyncio.get_running_loop().call_later(self.hold_max_s, self._flush_later, key)
+
+    def _flush_later(self, key: Tuple[str, str]) -> None:
+        p = self._pending.get(key)
+        if p is not None:
+            p.timer = None
+        spawn(self._flush_logged(*key), name="transcript_flush")
+
+    async def _flush_logged(self, user_id: str, thread_id: str) -> None:
+        try:
+            await self.flush(user_id, thread_id)
+        except Exception as e:
+            print(json.dumps({"type": "transcript_write_error", "when": "deferred", "tid": thread_id, "err": str(e)}), flush=True)
+
+    async def flush(self, user_id: str, thread_id: str) -> None:
+        """Write everything pending for the thread (no-op if nothing is)."""
+        key = (user_id, thread_id)
+        async with self.locks.hold(key):
+            p = self._pending.get(key)
+            if p is None or not p.msgs:
+                return
+            if p.timer is not None:
+                p.timer.cancel()
+                p.timer = None
+            batch = list(p.msgs)
+            # Readers in flight may have read the head from before this write
+            for token in self._reads.get(key, ()):
+                token.stale = True
+            try:
+                await _write(p.client, user_id, thread_id, batch)
+            except Exception:
+                # Keep them (readers still see them); retried by the next flush
+                self.failures += 1
+                if p.timer is None:
+                    p.timer = asyncio.get_running_loop().call_later(self.hold_max_s, self._flush_later, key)
+                raise
+            # Appends that arrived during the write stay pending
+            del p.msgs[:len(batch)]
+            if not p.msgs:
+                self._pending.pop(key, None)
+            self.writes += 1
+            self.messages += len(batch)
+
+    async def flush_all(self) -> None:
+        """Gateway shutdown: write every thread's pending messages (best-effort)."""
+        for user_id, thread_id in list(self._pending):
+            await self._flush_logged(user_id, thread_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending_threads": len(self._pending),
+            "pending_messages": sum(len(p.msgs) for p in self._pending.values()),
+            "writes": self.writes,
+            "messages": self.messages,
+            "failures": self.failures,
+            "contended": self.locks.contended,
+            "read_retries": self.read_retries,
+        }
+
+
+WRITER = TranscriptWriter()
+
+
+async def append_transcript(client, user_id: str, thread_id: str, msg: TranscriptMessage, *, hold: bool = False) -> None:
+    """
+    Append one message to the thread's transcript. hold=True buffers it (the
+    user turn: the assistant turn, flush_transcript() or TRANSCRIPT_HOLD_MAX_S
+    writes it); otherwise it is written now, together with anything held.
+    """
+    if TRANSCRIPT_BACKEND == "checkpoint":
+        # The checkpointer has the turn already; just stop serving the old projection
+        forget_thread_view(thread_id)
+        return
+    await WRITER.append(client, user_id, thread_id, msg, hold=hold)
+
+
+async def flush_transcript(user_id: str, thread_id: str) -> None:
+    if TRANSCRIPT_BACKEND == "checkpoint":
+        forget_thread_view(thread_id)
+        return
+    await WRITER.flush(user_id, thread_id)
+
+
+async def flush_transcripts() -> None:
+    await WRITER.flush_all()
+
+
+def transcript_writer_stats() -> Dict[str, int]:
+    return WRITER.stats()
+
+
 def make_transcript_router(client, get_current_user, user_id_from_claims) -> APIRouter:
     """
     Adds: GET /api/threads/{thread_id}/messages  (owner-only)
+            ?limit=&before=&after=  newest `limit` by default, oldest first in the body;
+            X-Total-Count, X-Before-Cursor (older messages exist: pass as ?before=)
     """
     router = APIRouter(prefix="/api/threads", tags=["threads"])
 
     @router.get("/{thread_id}/messages")
-    async def list_messages(thread_id: str, request: Request) -> list[dict]:
-        claims = await get_current_user(request)
+    async def list_messages(
+        thread_id: str,
+        request: Request,
+        limit: int = MESSAGES_PAGE_DEFAULT,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+    ):
+        # Stage latencies feed /metrics (route label is the path template)
+        timer = StageTimer("/api/threads/{thread_id}/messages")
+        claims = await timer.run("auth", get_current_user(request))
         if not claims:
             raise HTTPException(status_code=401, detail="unauthenticated")
         user_id = user_id_from_claims(claims)
+        if before is not None and after is not None:
+            raise HTTPException(status_code=400, detail="before_and_after")
+        limit = max(1, min(limit, MESSAGES_PAGE_MAX))
 
-        # Ownership check via Threads API (just like your other endpoints).
-        t = await client.threads.get(thread_id)
-        if not t or (t.get("metadata") or {}).get("user_id") != user_id:
+        # Ownership check (cached; see src/features/ownership.py)
+        if await timer.run("thread", owned_thread(client, thread_id, user_id)) is None:
             raise HTTPException(status_code=404, detail="not_found")
 
-        msgs = await _get_transcript(client, user_id, thread_id)
-        # client.store maintains created_at, but we keep it simple and sort by ts asc
-        msgs.sort(key=lambda m: m.get("ts") or "")
-        return msgs
+        try:
+            msgs, total = await timer.run("transcript_read", _read_window(
+                client, user_id, thread_id, limit=limit,
+                before=max(before, 1) if before is not None else None,
+                after=max(after, 0) if after is not None else None,
+            ))
+        except Exception as e:
+            print(json.dumps({"type": "transcript_read_error", "tid": thread_id, "err": str(e)}), flush=True)
+            raise HTTPException(status_code=502, detail="transcript_read_failed")
+        headers = {"X-Total-Count": str(total), "Cache-Control": "private, no-cache"}
+        if msgs and int(msgs[0].get("seq") or 0) > 1:
+            headers["X-Before-Cursor"] = str(msgs[0]["seq"])
+        timer.finish(tid=thread_id, count=len(msgs), total=total)
+        return _json_response(request, msgs, headers)
 
-    return router
\ No newline at end of file
+    return router
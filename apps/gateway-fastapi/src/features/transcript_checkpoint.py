@@ -0,0 +1,202 @@
+# apps/gateway-fastapi/src/features/transcript_checkpoint.py
+from __future__ import annotations
+
+import os
+import asyncio
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from prynai_shared.streaming import chunk_to_text
+
+from src.utils.ttl_cache import TTLCache, MISSING
+from src.features.moderation import verdicts, MOD_ENABLED, MOD_CACHE_FLAGGED_TTL_S, INPUT_BLOCKED_MESSAGE, OUTPUT_BLOCKED_MESSAGE
+
+# Transcript derived from the agent's checkpoints (TRANSCRIPT_BACKEND=checkpoint).
+#
+# The agent's checkpointer already persists every thread's `messages`. In this
+# mode the gateway writes no transcript items at all. The messages API reads
+# threads.get_state and projects the state into the UI's {role, content, ts, seq}
+# shape:
+# - only human/ai messages with text are kept. System messages (attachment
+#   context from the files route, tool instructions), tool results and
+#   tool-call-only AI turns are dropped;
+# - ts comes from the message's response_metadata.created_at when the model
+#   reports it (None otherwise), and seq is the position in the projection.
+#
+# Caches:
+#   LATEST       thread_id -> checkpoint_id, for CHECKPOINT_VIEW_TTL_S; dropped
+#                by forget_thread_view() when a turn on this replica ends
+#   PROJECTIONS  checkpoint_id -> projected messages (a checkpoint never changes)
+#   MSG_VERDICTS message id + content digest -> moderation verdict
+# A read with LATEST and PROJECTIONS warm costs no get_state call. After a new
+# turn, one get_state call is needed, and an unchanged checkpoint reuses its
+# projection. Other replicas' turns show up within CHECKPOINT_VIEW_TTL_S.
+#
+# The store backend never persisted flagged turns, but a checkpoint keeps
+# whatever reached the agent. So each read moderates the messages it returns,
+# and only those: a page of a 2000-message thread checks its page, not the
+# history. Verdicts are kept per message (MSG_VERDICTS), so later pages, later
+# checkpoints of the thread and other readers reuse them. Misses go out in
+# batched calls (moderation.verdicts), and concurrent reads checking the same
+# message share one check. Flagged messages are replaced with the policy notice.
+# These checks are counted as kind="transcript" in
+# gateway_moderation_flags_total, apart from live input/output.
+#
+# This path fails closed. A message left without a verdict (Moderation API
+# timeout or error) is shown as UNVERIFIED_MESSAGE, and its verdict is not
+# cached, so the next read tries again.
+
+CHECKPOINT_VIEW_TTL_S = float(os.getenv("CHECKPOINT_VIEW_TTL_S", "30"))
+CHECKPOINT_VIEW_SIZE = int(os.getenv("CHECKPOINT_VIEW_SIZE", "2000"))
+CHECKPOINT_VERDICTS_SIZE = int(os.getenv("CHECKPOINT_VERDICTS_SIZE", "100000"))
+CHECKPOINT_VERDICTS_TTL_S = float(os.getenv("CHECKPOINT_VERDICTS_TTL_S", "86400"))
+
+_ROLES = {"human": "user", "user": "user", "ai": "assistant", "assistant": "assistant"}
+
+LATEST: "TTLCache[str, str]" = TTLCache(maxsize=CHECKPOINT_VIEW_SIZE * 5, ttl_s=CHECKPOINT_VIEW_TTL_S)
+PROJECTIONS: "TTLCache[str, List[dict]]" = TTLCache(maxsize=CHECKPOINT_VIEW_SIZE, ttl_s=3600)
+MSG_VERDICTS: "TTLCache[str, bool]" = TTLCache(maxsize=CHECKPOINT_VERDICTS_SIZE, ttl_s=CHECKPOINT_VERDICTS_TTL_S)
+# verdict key -> the check in progress (single-flight across reads)
+_CHECKING: Dict[str, "asyncio.Future[Optional[bool]]"] = {}
+
+ROUTE = "/api/threads/{thread_id}/messages"
+MOD_KIND = "transcript"
+UNVERIFIED_MESSAGE = "This message can't be shown right now. Please try again shortly."
+
+
+def _ts(m: Dict[str, Any]) -> Optional[str]:
+    created = (m.get("response_metadata") or {}).get("created_at")
+    if isinstance(created, (int, float)):
+        return datetime.fromtimestamp(created, tz=timezone.utc).isoformat()
+    return created if isinstance(created, str) else None
+
+
+def _verdict_key(m: Dict[str, Any], text: str) -> Optional[str]:
+    # The id alone isn't enough: add_messages can replace a message under its id
+    mid = m.get("id")
+    if not mid:
+        return None
+    return f"{mid}:{hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]}"
+
+
+def project(values: Any) -> List[dict]:
+    """
+    Checkpoint `values` -> transcript messages, oldest first. Each carries its
+    verdict key under "_vkey" (internal: stripped before it is served).
+    """
+    msgs = (values or {}).get("messages") if isinstance(values, dict) else None
+    out: List[dict] = []
+    for m in msgs or []:
+        if not isinstance(m, dict):
+            continue
+        role = _ROLES.get(m.get("type") or m.get("role"))
+        if role is None:
+            continue
+        text = chunk_to_text(m)
+        if not text or not text.strip():
+            continue
+        out.append({"role": role, "content": text, "ts": _ts(m), "seq": len(out) + 1, "_vkey": _verdict_key(m, text)})
+    return out
+
+
+def _checkpoint_id(state: Dict[str, Any]) -> Optional[str]:
+    cp = state.get("checkpoint") or {}
+    return cp.get("checkpoint_id") or state.get("checkpoint_id")
+
+
+async def _check(msgs: List[dict]) -> List[Optional[bool]]:
+    # Cached verdicts first, then shared checks in progress, then one verdicts() call
+    out: List[Optional[bool]] = [None] * len(msgs)
+    shared: Dict[int, "asyncio.Future[Optional[bool]]"] = {}
+    todo: List[int] = []
+    for i, m in enumerate(msgs):
+        key = m.get("_vkey")
+        hit = MSG_VERDICTS.get(key) if key else MISSING
+        if hit is not MISSING:
+            out[i] = hit
+        elif key in _CHECKING:
+            shared[i] = _CHECKING[key]
+        else:
+            todo.append(i)
+    if todo:
+        loop = asyncio.get_running_loop()
+        mine: Dict[str, "asyncio.Future[Optional[bool]]"] = {}
+        for i in todo:
+            key = msgs[i].get("_vkey")
+            if key and key not in mine:
+                mine[key] = _CHECKING[key] = loop.create_future()
+        try:
+            flags = await verdicts([msgs[i]["content"] for i in todo], kind=MOD_KIND, route=ROUTE)
+            for i, flagged in zip(todo, flags):
+                out[i] = flagged
+                key = msgs[i].get("_vkey")
+                if key and flagged is not None:
+                    MSG_VERDICTS.put(key, flagged, ttl_s=MOD_CACHE_FLAGGED_TTL_S if flagged else None)
+                if key in mine and not mine[key].done():
+                    mine[key].set_result(flagged)
+        finally:
+            for key, fut in mine.items():
+                _CHECKING.pop(key, None)
+                if not fut.done():
+                    fut.set_result(None)  # cancelled: sharers see "no verdict"
+    for i, fut in shared.items():
+        out[i] = await asyncio.shield(fut)
+    return out
+
+
+async def moderate(msgs: List[dict]) -> Tuple[List[dict], bool]:
+    """
+    `msgs` ready to serve: flagged messages replaced by the policy notice and
+    unverified ones by UNVERIFIED_MESSAGE; plus whether every message got a verdict.
+    """
+    flags = await _check(msgs) if MOD_ENABLED and msgs else [False] * len(msgs)
+    out = []
+    for m, flagged in zip(msgs, flags):
+        m = {k: v for k, v in m.items() if k != "_vkey"}
+        if flagged is None:
+            m.update(content=UNVERIFIED_MESSAGE, unverified=True)
+        elif flagged:
+            m.update(content=INPUT_BLOCKED_MESSAGE if m["role"] == "user" else OUTPUT_BLOCKED_MESSAGE, flagged=True)
+        out.append(m)
+    return out, None not in flags
+
+
+async def _projection(client, thread_id: str) -> List[dict]:
+    # The thread's projected (unmoderated) messages; shared list, not to be mutated
+    cid = LATEST.get(thread_id)
+    if cid is not MISSING:
+        hit = PROJECTIONS.get(cid)
+        if hit is not MISSING:
+            return hit
+    state = await client.threads.get_state(thread_id)
+    msgs = project(state.get("values"))
+    cid = _checkpoint_id(state)
+    if cid is not None:
+        LATEST.put(thread_id, cid)
+        PROJECTIONS.put(cid, msgs)
+    return msgs
+
+
+async def thread_window(
+    client, thread_id: str, window: Callable[[int], Tuple[int, int]],
+) -> Tuple[List[dict], int]:
+    """
+    The moderated messages with seq in window(total) (inclusive; empty when
+    hi < lo), oldest first, plus the total count. Only the window is moderated.
+    """
+    msgs = await _projection(client, thread_id)
+    lo, hi = window(len(msgs))
+    if hi < lo:
+        return [], len(msgs)
+    out, _ = await moderate(msgs[lo - 1:hi])
+    return out, len(msgs)
+
+
+def forget_thread_view(thread_id: str) -> None:
+    """A turn on this thread just ended here: the next read fetches the new checkpoint."""
+    LATEST.pop(thread_id)
+
+
+def checkpoint_view_stats() -> Dict[str, Dict[str, int]]:
+    return {"latest": LATEST.stats(), "projections": PROJECTIONS.stats(), "verdicts": MSG_VERDICTS.stats()}
@@ -1,18 +1,21 @@
 # apps/gateway-fastapi/src/features/uploads.py
 from __future__ import annotations
 import io, os, re, json, zipfile, html
-from typing import List, Tuple, Optional, AsyncGenerator, Any
+from typing import List, Tuple, Optional
 
 from fastapi import APIRouter, UploadFile, HTTPException, Request, File, Form
 from fastapi.responses import StreamingResponse
 
-from langgraph_sdk import get_client
-from langgraph.pregel.remote import RemoteGraph
-from openai import OpenAI
+from prynai_shared.streaming import sse_event, DONE_FRAME
 
 from src.features.websearch import ChatIn, build_langgraph_config
 from src.features.profiles import ensure_profile
-from src.features.transcript import append_transcript, TranscriptMessage
+from src.features.moderation import start_input_moderation
+from src.features.ownership import unowned_thread
+from src.features.pipeline import StageTimer, spawn
+from src.features.admission import ADMISSION, AdmissionRejected
+from src.features.metrics import upstream_error
+from src.features.chat_stream import stream_chat_run
 from src.auth.entra import AuthError
 
 # ----------------------------- Limits & helpers ------------------------------
@@ -256,64 +259,15 @@ def build_attachments_system_message(items: List[Tuple[str, str]]) -> str:
 
 # ----------------------------- Router factory --------------------------------
 
-def make_uploads_router(get_current_user, user_id_from_claims) -> APIRouter:
+def make_uploads_router(client, get_current_user, user_id_from_claims) -> APIRouter:
     """
     Returns an APIRouter mounted by main.py at /api/chat.
     Adds: POST /api/chat/stream_files  (multipart: payload(JSON string) + files[])
     """
     router = APIRouter(prefix="/api/chat", tags=["chat+uploads"])
 
-    # Local client/remote (not imported from main.py to avoid circular imports)
-    LANGGRAPH_URL = os.environ["LANGGRAPH_URL"]
+    # `client` is the shared, lifespan-managed LangGraph client injected by main.py
     GRAPH_NAME = os.environ.get("LANGGRAPH_GRAPH", "chat")
-    client = get_client(url=LANGGRAPH_URL)
-    remote = RemoteGraph(GRAPH_NAME, client=client)
-
-    OAI = OpenAI()
-    MOD_ENABLED = os.getenv("MODERATION_ENABLED", "true").lower() == "true"
-    MOD_MODEL = os.getenv("MODERATION_MODEL", "omni-moderation-latest")
-
-    # (helpers identical to /api/chat/stream)
-    def _blocks_to_text(blocks: Any) -> str:
-        if isinstance(blocks, str):
-            return blocks
-        if isinstance(blocks, list):
-            parts: list[str] = []
-            for b in blocks:
-                if isinstance(b, dict):
-                    t = b.get("text") or b.get("input_text") or b.get("output_text")
-                else:
-                    t = getattr(b, "text", None)
-                if t:
-                    parts.append(t)
-            return "".join(parts)
-        return ""
-
-    def _chunk_to_text(chunk: Any) -> str:
-        c = getattr(chunk, "content", None)
-        if c is not None:
-            return _blocks_to_text(c)
-        if isinstance(chunk, dict):
-            if "content" in chunk:
-                return _blocks_to_text(chunk["content"])
-            if "delta" in chunk:
-                d = chunk["delta"]
-                if isinstance(d, dict):
-                    return _blocks_to_text(d.get("content") or d.get("text") or d)
-                return _blocks_to_text(d)
-            if "messages" in chunk and chunk["messages"]:
-                m = chunk["messages"][-1]
-                if isinstance(m, dict):
-                    return _blocks_to_text(m.get("content", m))
-                return _blocks_to_text(getattr(m, "content", m))
-        if isinstance(chunk, str):
-            return chunk
-        return ""
-
-    def _sse_event_from_text(text: str) -> bytes:
-        t = text.replace("\r\n", "\n").replace("\r", "\n")
-        payload = "data: " + t.replace("\n", "\ndata: ")
-        return (payload + "\n\n").encode("utf-8")  # end event (SSE spec)
 
     @router.post("/stream_files")
     async def stream_chat_with_files(
@@ -321,15 +275,16 @@ def make_uploads_router(get_current_user, user_id_from_claims) -> APIRouter:
         payload: str = Form(...),                 # JSON string -> ChatIn
         files: list[UploadFile] = File(default=[]),
     ):
+        route = "/api/chat/stream_files"
+        timer = StageTimer(route)
+
         # ---- AUTHN ----
         try:
-            claims = await get_current_user(request)
+            claims = await timer.run("auth", get_current_user(request))
         except AuthError as e:
             async def auth_error_stream():
-                yield b"event: error\n"
-                yield f"data: auth_error:{str(e)}\n\n".encode("utf-8")
-                yield b"event: done\n"
-                yield b"data: [DONE]\n\n"
+                yield sse_event("error", f"auth_error:{str(e)}")
+                yield DONE_FRAME
             return StreamingResponse(auth_error_stream(), media_type="text/event-stream")
 
         if not claims:
@@ -337,6 +292,12 @@ def make_uploads_router(get_current_user, user_id_from_claims) -> APIRouter:
 
         user_id = user_id_from_claims(claims)
 
+        # ---- Admission: 429 before reading any upload if this couldn't even queue ----
+        try:
+            ADMISSION.check(user_id)
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+
         # ---- Parse payload ----
         try:
             body = json.loads(payload or "{}")
@@ -344,6 +305,20 @@ def make_uploads_router(get_current_user, user_id_from_claims) -> APIRouter:
         except Exception:
             raise HTTPException(status_code=400, detail="invalid_payload")
 
+        # ---- Thread ownership: a client-sent thread_id must be the caller's (cached) ----
+        if p.thread_id:
+            try:
+                unowned = await timer.run("thread_owner", unowned_thread(client, p.thread_id, user_id))
+            except Exception:
+                upstream_error(route, "langgraph")
+                raise HTTPException(status_code=502, detail="thread_lookup_failed")
+            if unowned:
+                raise HTTPException(status_code=404, detail="thread_not_found")
+
+        # ---- Input moderation (concurrent; the stream gates the first tokens on it) ----
+        mod_task = start_input_moderation(p.message, route=route)
+        spawn(timer.run("moderation_input", mod_task), name="moderation_input")
+
         # ---- Early rejection: count & types/sizes ----
         if len(files) > MAX_FILES:
             raise HTTPException(status_code=413, detail=f"Too many files uploaded. Maximum allowed is: {MAX_FILES}.")
@@ -355,84 +330,21 @@ def make_uploads_router(get_current_user, user_id_from_claims) -> APIRouter:
             txt = extract_text(f.filename, f.content_type or "", data)
             attachments.append((f.filename, txt))
 
-        # ---- Ensure minimal profile ----
-        try:
-            await ensure_profile(client, user_id, claims=claims)
-        except Exception:
-            pass
+        # ---- Ensure minimal profile (best-effort, off the critical path) ----
+        spawn(timer.run("profile", ensure_profile(client, user_id, claims=claims)), name="ensure_profile")
 
         # ---- Build agent config & messages ----
         config = build_langgraph_config(p)
         config.setdefault("configurable", {})["user_id"] = user_id
-
         system_msg = {"role": "system", "content": build_attachments_system_message(attachments)}
         user_msg   = {"role": "user",   "content": p.message}
-        thread_id  = (config.get("configurable") or {}).get("thread_id")
 
-        if thread_id:
-            try:
-                await append_transcript(client, user_id, thread_id,
-                                       TranscriptMessage(role="user", content=p.message))
-            except Exception as e:
-                print(json.dumps({
-                    "type": "transcript_write_error",
-                    "when": "user",
-                    "tid": thread_id,
-                    "err": str(e)
-                }), flush=True)
-
-        # ---- Optional moderation of input ----
-        if MOD_ENABLED:
-            try:
-                _ = OAI.moderations.create(model=MOD_MODEL, input=p.message).results[0]
-            except Exception:
-                pass  # best-effort; don't block
+        # ---- User-turn write, run slot, agent run and SSE (shared with /api/chat/stream) ----
+        return stream_chat_run(
+            client, request,
+            route=route, timer=timer, graph=GRAPH_NAME, user_id=user_id,
+            message=p.message, messages=[system_msg, user_msg],
+            config=config, mod_task=mod_task, files=len(attachments),
+        )
 
-        async def event_gen() -> AsyncGenerator[bytes, None]:
-            acc: list[str] = []
-            try:
-                async for item in remote.astream(
-                    {"messages": [system_msg, user_msg]},
-                    config=config,
-                    stream_mode="messages",
-                ):
-                    msg_chunk = item[0] if isinstance(item, tuple) and len(item) == 2 else item
-                    text = _chunk_to_text(msg_chunk)
-                    if text:
-                        acc.append(text)
-                        yield _sse_event_from_text(text)
-
-                if MOD_ENABLED and acc:
-                    try:
-                        out = "".join(acc)
-                        r = OAI.moderations.create(model=MOD_MODEL, input=out).results[0]
-                        if r.flagged:
-                            yield b"event: policy\n"
-                            yield b"data: A safety filter replaced part of the output.\n\n"
-                    except Exception:
-                        pass
-            except Exception as e:
-                yield f"event: error\ndata: {str(e)}\n\n".encode("utf-8")
-            finally:
-                if thread_id and acc:
-                    try:
-                        await append_transcript(client, user_id, thread_id,
-                                                TranscriptMessage(role="assistant", content="".join(acc)))
-                    except Exception as e:
-                        print(json.dumps({
-                            "type": "transcript_write_error",
-                            "when": "assistant",
-                            "tid": thread_id,
-                            "err": str(e)
-                        }), flush=True)
-                yield b"event: done\n"
-                yield b"data: [DONE]\n\n"
-
-        headers = {
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        }
-        return StreamingResponse(event_gen(), media_type="text/event-stream", headers=headers)
-
-    return router
\ No newline at end of file
+    return router
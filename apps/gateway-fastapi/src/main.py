@@ -2,29 +2,61 @@
 from __future__ import annotations
 
 import os
-import json
-from typing import AsyncGenerator, Any
+from contextlib import asynccontextmanager
+from typing import Optional
 
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from langgraph.pregel.remote import RemoteGraph
-from langgraph_sdk import get_client
-
-from openai import OpenAI
+from prynai_shared.streaming import sse_event, DONE_FRAME
 
 from src.features.websearch import ChatIn, build_langgraph_config
 from src.features.profiles import make_profiles_router, ensure_profile
-from src.features.threads import make_threads_router
-from src.features.transcript import (
-    make_transcript_router,
-    append_transcript,
-    TranscriptMessage,
+from src.features.threads import make_threads_router, latest_or_new_thread
+from src.features.ownership import unowned_thread
+from src.features.transcript import make_transcript_router, flush_transcripts
+from src.features.moderation import start_input_moderation
+from src.features.clients import CLIENTS
+from src.features.runs import make_runs_router
+from src.features.background import make_background_runs_router
+from src.features.pipeline import StageTimer, spawn, drain
+from src.features.chat_stream import stream_chat_run
+from src.features.admission import ADMISSION, AdmissionRejected
+from src.features.metrics import make_metrics_router, upstream_error
+from src.features.tracing import make_traces_router
+from src.features.replay import make_replay_router
+from src.auth.entra import (
+    get_current_user,
+    require_user,
+    user_id_from_claims,
+    AuthError,
+    start_key_refresh,
+    stop_key_refresh,
 )
-from src.auth.entra import get_current_user, user_id_from_claims, AuthError
 
-app = FastAPI(title="PrynAI Gateway", version="1.3")
+# ---- Lifecycle ---------------------------------------------------------------
+
+LANGGRAPH_URL = os.environ["LANGGRAPH_URL"]
+GRAPH_NAME = os.environ.get("LANGGRAPH_GRAPH", "chat")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One set of pooled outbound clients (LangGraph, OpenAI, identity) per process
+    await CLIENTS.start(LANGGRAPH_URL)
+    # OIDC discovery + JWKS: warmed now, then refreshed ahead of expiry
+    await start_key_refresh()
+    try:
+        yield
+    finally:
+        await stop_key_refresh()
+        # Let best-effort writes (profile bootstrap, user turns) finish before exit,
+        # then write any transcript turns still held in memory
+        await drain()
+        await flush_transcripts()
+        await CLIENTS.aclose()
+
+app = FastAPI(title="PrynAI Gateway", version="1.3", lifespan=lifespan)
 
 # ---- CORS --------------------------------------------------------------------
 
@@ -40,86 +72,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ---- Moderation --------------------------------------------------------------
-
-OAI = OpenAI()
-MOD_ENABLED = os.getenv("MODERATION_ENABLED", "true").lower() == "true"
-MOD_MODEL = os.getenv("MODERATION_MODEL", "omni-moderation-latest")
-
 # ---- LangGraph client --------------------------------------------------------
 
-LANGGRAPH_URL = os.environ["LANGGRAPH_URL"]
-GRAPH_NAME = os.environ.get("LANGGRAPH_GRAPH", "chat")
-
-client = get_client(url=LANGGRAPH_URL)
-remote = RemoteGraph(GRAPH_NAME, client=client)
+# Injected into every router; resolves to the lifespan-managed client (with the
+# process-wide Store cache in front of .store) on each use.
+client = CLIENTS.langgraph_handle()
 
 # ---- Routers -----------------------------------------------------------------
 
 app.include_router(make_profiles_router(client, get_current_user, user_id_from_claims))
 app.include_router(make_threads_router(client, get_current_user, user_id_from_claims))
 app.include_router(make_transcript_router(client, get_current_user, user_id_from_claims))
+app.include_router(make_runs_router(client, get_current_user, user_id_from_claims))
+app.include_router(make_background_runs_router(client, get_current_user, user_id_from_claims))
+app.include_router(make_metrics_router())
+app.include_router(make_traces_router())
+app.include_router(make_replay_router(get_current_user, user_id_from_claims))
 
 # Optional uploads router (if present)
 try:
     from src.features.uploads import make_uploads_router  # type: ignore
-    app.include_router(make_uploads_router(get_current_user, user_id_from_claims))
+    app.include_router(make_uploads_router(client, get_current_user, user_id_from_claims))
 except Exception:
     pass
 
-
-# ---- Helpers to extract text from streamed LangGraph items -------------------
-
-def _blocks_to_text(blocks: Any) -> str:
-    if isinstance(blocks, str):
-        return blocks
-    if isinstance(blocks, list):
-        parts: list[str] = []
-        for b in blocks:
-            if isinstance(b, dict):
-                t = b.get("text") or b.get("input_text") or b.get("output_text")
-            else:
-                t = getattr(b, "text", None)
-            if t:
-                parts.append(t)
-        return "".join(parts)
-    return ""
-
-def _chunk_to_text(chunk: Any) -> str:
-    c = getattr(chunk, "content", None)
-    if c is not None:
-        return _blocks_to_text(c)
-    if isinstance(chunk, dict):
-        if "content" in chunk:
-            return _blocks_to_text(chunk["content"])
-        if "delta" in chunk:
-            d = chunk["delta"]
-            if isinstance(d, dict):
-                return _blocks_to_text(d.get("content") or d.get("text") or d)
-            return _blocks_to_text(d)
-        if "messages" in chunk and chunk["messages"]:
-            m = chunk["messages"][-1]
-            if isinstance(m, dict):
-                return _blocks_to_text(m.get("content", m))
-            return _blocks_to_text(getattr(m, "content", m))
-    if isinstance(chunk, str):
-        return chunk
-    return ""
-
-# ---- SSE framing (spec-compliant) -------------------------------------------
-
-def _sse_event_from_text(text: str) -> bytes:
-    """
-    Build one SSE event for a whole text chunk.
-    - Normalize to '\n'
-    - Emit multiple 'data:' lines inside a single event to preserve line breaks
-      (per SSE spec: consecutive 'data:' lines are joined with '\n').
-    """
-    t = text.replace("\r\n", "\n").replace("\r", "\n")
-    payload = "data: " + t.replace("\n", "\ndata: ")
-    return (payload + "\n\n").encode("utf-8")  # blank line ends the event (spec)
-# Spec refs: MDN + WHATWG. :contentReference[oaicite:6]{index=6}
-
 # ---- Health & identity -------------------------------------------------------
 
 @app.get("/healthz")
@@ -127,134 +103,91 @@ def healthz():
     return JSONResponse({"ok": True})
 
 @app.get("/api/whoami")
-async def whoami(request: Request):
-    try:
-        claims = await get_current_user(request)
-    except AuthError as e:
-        raise HTTPException(status_code=401, detail=str(e))
-    if not claims:
-        raise HTTPException(status_code=401, detail="unauthenticated")
+async def whoami(claims: dict = Depends(require_user)):
     return {"sub": claims.get("sub"), "iss": claims.get("iss"), "aud": claims.get("aud")}
 
-def _moderate_or_raise(text: str) -> dict:
-    if not MOD_ENABLED:
-        return {"flagged": False}
-    resp = OAI.moderations.create(model=MOD_MODEL, input=text)
-    result = resp.results[0]
-    if result.flagged:
-        print(json.dumps({"type": "moderation_input_flag"}), flush=True)
-        raise ValueError("blocked_by_moderation")
-    return {"flagged": False}
-
 # ---- Chat streaming ----------------------------------------------------------
 
 @app.post("/api/chat/stream")
 async def stream_chat(payload: ChatIn, request: Request):
+    """
+    Staged pre-stream pipeline (TTFT ~= thread resolution, if any, + agent latency):
+      1) auth                      (critical path; then a 429 if the run queue is full)
+      2) input moderation          (concurrent; gates the first tokens in the stream)
+      3) profile bootstrap         (background, best-effort)
+      4) thread resolution         (critical path only when no thread_id was sent)
+      5) user-turn transcript      (background, after the input verdict is clean)
+      6) agent run                 (starts as soon as 1 and 4 are done and a run slot
+                                    is free; a queued request gets SSE `queued` events)
+    """
+    route = "/api/chat/stream"
+    timer = StageTimer(route)
+
     # 1) AUTHN
     try:
-        claims = await get_current_user(request)
+        claims = await timer.run("auth", get_current_user(request))
     except AuthError as e:
         async def auth_error_stream():
-            yield b"event: error\n"
-            yield f"data: auth_error:{str(e)}\n\n".encode("utf-8")
-            yield b"event: done\n"
-            yield b"data: [DONE]\n\n"
+            yield sse_event("error", f"auth_error:{str(e)}")
+            yield DONE_FRAME
         return StreamingResponse(auth_error_stream(), media_type="text/event-stream")
 
     if not claims:
         async def noauth_stream():
-            yield b"event: error\n"
-            yield b"data: unauthenticated\n\n"
-            yield b"event: done\n"
-            yield b"data: [DONE]\n\n"
+            yield sse_event("error", "unauthenticated")
+            yield DONE_FRAME
         return StreamingResponse(noauth_stream(), media_type="text/event-stream")
 
     user_id = user_id_from_claims(claims)
 
-    # 2) Build LangGraph config (thread_id + web_search); attach user_id for agent-side scoping.
-    config = build_langgraph_config(payload)
-    config.setdefault("configurable", {})["user_id"] = user_id
-
-    # 2b) Ensure a profile exists (best-effort)
+    # Fail fast (before any other work) when this request couldn't even queue
     try:
-        await ensure_profile(client, user_id, claims=claims)
-    except Exception:
-        pass
-
-    # 3) Prepare user message
-    user_msg = {"role": "user", "content": payload.message}
+        ADMISSION.check(user_id)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
 
-    # 4) Input moderation (unchanged)
-    if MOD_ENABLED:
+    # A thread_id from the client must be the caller's (cached ownership lookup)
+    if payload.thread_id:
         try:
-            _moderate_or_raise(payload.message)
-        except ValueError:
-            async def blocked():
-                yield b"event: policy\n"
-                yield b"data: Your message appears unsafe. I can't help with that.\n\n"
-                yield b"event: done\n"
-                yield b"data: [DONE]\n\n"
-            return StreamingResponse(blocked(), media_type="text/event-stream")
+            unowned = await timer.run("thread_owner", unowned_thread(client, payload.thread_id, user_id))
+        except Exception:
+            upstream_error(route, "langgraph")
+            raise HTTPException(status_code=502, detail="thread_lookup_failed")
+        if unowned:
+            raise HTTPException(status_code=404, detail="thread_not_found")
 
-    acc: list[str] = []
-    thread_id = (config.get("configurable") or {}).get("thread_id")
+    # 2) Input moderation starts now and runs alongside everything below,
+    #    including the agent run; the stream gates the first tokens on it.
+    mod_task = start_input_moderation(payload.message, route=route)
+    spawn(timer.run("moderation_input", mod_task), name="moderation_input")
 
-    # NEW: resolve a thread id if still missing (defensive)
-    if not thread_id:
-        try:
-            # Try newest for this user
-            results = await client.threads.search(metadata={"user_id": user_id}, limit=1)
-            if results:
-                thread_id = results[0]["thread_id"]
-            else:
-                created = await client.threads.create(metadata={"user_id": user_id})
-                thread_id = created["thread_id"]
-            config.setdefault("configurable", {})["thread_id"] = thread_id
-        except Exception:
-            # If this ever fails, we still stream the model but skip transcript write
-            thread_id = None
+    # 3) Ensure a profile exists (best-effort, off the critical path)
+    spawn(timer.run("profile", ensure_profile(client, user_id, claims=claims)), name="ensure_profile")
 
-    # Write the user turn immediately so it shows after reload
-    if thread_id:
-        try:
-            await append_transcript(
-                client, user_id, thread_id,
-                TranscriptMessage(role="user", content=payload.message)
-            )
-        except Exception as e:
-            print(json.dumps({"type": "transcript_write_error", "when": "user", "tid": thread_id, "err": str(e)}), flush=True)
+    # Build LangGraph config (thread_id + web_search); attach user_id for agent-side scoping.
+    config = build_langgraph_config(payload)
+    config.setdefault("configurable", {})["user_id"] = user_id
+    thread_id = config["configurable"].get("thread_id")
 
-    async def event_gen():
+    # 4) Resolve a thread id if still missing (defensive)
+    async def resolve_thread() -> Optional[str]:
         try:
-            async for item in remote.astream({"messages": [user_msg]}, config=config, stream_mode="messages"):
-                msg_chunk = item[0] if isinstance(item, tuple) and len(item) == 2 else item
-                text = _chunk_to_text(msg_chunk)
-                if text:
-                    acc.append(text)
-                    yield _sse_event_from_text(text)
-
-            if MOD_ENABLED and acc:
-                try:
-                    out = "".join(acc)
-                    r = OAI.moderations.create(model=MOD_MODEL, input=out).results[0]
-                    if r.flagged:
-                        yield b"event: policy\n"
-                        yield b"data: A safety filter replaced part of the output.\n\n"
-                except Exception:
-                    pass
-        except Exception as e:
-            yield f"event: error\ndata: {str(e)}\n\n".encode("utf-8")
-        finally:
-            if thread_id and acc:
-                try:
-                    await append_transcript(
-                        client, user_id, thread_id,
-                        TranscriptMessage(role="assistant", content="".join(acc))
-                    )
-                except Exception as e:
-                    print(json.dumps({"type": "transcript_write_error", "when": "assistant", "tid": thread_id, "err": str(e)}), flush=True)
-            yield b"event: done\n"
-            yield b"data: [DONE]\n\n"
+            # Newest thread for this user (or a new one)
+            return await latest_or_new_thread(client, user_id)
+        except Exception:
+            # If this ever fails, we still stream the model but skip transcript write
+            upstream_error(route, "langgraph")
+            return None
 
-    headers = {"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"}
-    return StreamingResponse(event_gen(), media_type="text/event-stream", headers=headers)
\ No newline at end of file
+    if not thread_id:
+        thread_id = await timer.run("thread", resolve_thread())
+        if thread_id:
+            config["configurable"]["thread_id"] = thread_id
+
+    # 5) + 6) User-turn write, run slot, agent run and SSE (shared with /api/chat/stream_files)
+    return stream_chat_run(
+        client, request,
+        route=route, timer=timer, graph=GRAPH_NAME, user_id=user_id,
+        message=payload.message, messages=[{"role": "user", "content": payload.message}],
+        config=config, mod_task=mod_task,
+    )
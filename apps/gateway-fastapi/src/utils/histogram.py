@@ -0,0 +1,35 @@
+# apps/gateway-fastapi/src/utils/histogram.py
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Dict, Sequence
+
+# Seconds; covers a fast path (ms) up to a long queue wait / slow stream
+DEFAULT_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram (Prometheus semantics: a value lands in the first
+    bucket with value <= upper bound; snapshot() reports cumulative counts).
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_S) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        cumulative: Dict[str, int] = {}
+        running = 0
+        for bound, n in zip(self.buckets, self.counts):
+            running += n
+            cumulative[f"{bound:g}"] = running
+        cumulative["+Inf"] = self.count
+        return {"buckets": cumulative, "sum": round(self.sum, 6), "count": self.count}
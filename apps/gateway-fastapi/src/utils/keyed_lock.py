@@ -0,0 +1,44 @@
+# apps/gateway-fastapi/src/utils/keyed_lock.py
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Hashable, List
+
+
+class KeyedLock:
+    """
+    One asyncio.Lock per key, created on first use and dropped when nobody
+    holds or waits for it (so memory tracks the keys in use, not every key seen).
+
+    - Different keys never block each other; one key is FIFO like asyncio.Lock.
+    - Single-threaded by design: only used from the event loop.
+    """
+
+    def __init__(self) -> None:
+        # key -> [lock, holders + waiters]
+        self._locks: Dict[Hashable, List] = {}
+        self.contended = 0
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def locked(self, key: Hashable) -> bool:
+        entry = self._locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        elif entry[0].locked():
+            self.contended += 1
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(key, None)
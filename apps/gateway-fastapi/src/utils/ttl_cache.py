@@ -0,0 +1,78 @@
+# apps/gateway-fastapi/src/utils/ttl_cache.py
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+# Sentinel for "not in cache" so that None can be cached (negative lookups).
+MISSING: Any = object()
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Bounded in-process LRU with per-entry expiry (monotonic clock).
+
+    - get() returns MISSING on a miss or an expired entry (expired entries are
+      dropped on read, so nothing is ever served past its TTL).
+    - put() accepts a per-entry ttl override; ttl <= 0 or maxsize <= 0 means
+      "don't cache".
+    - Single-threaded by design: the gateway only touches it from the event loop.
+    """
+
+    def __init__(self, maxsize: int, ttl_s: float) -> None:
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[K, Tuple[V, float]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl_s > 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: K, value: V, ttl_s: Optional[float] = None) -> None:
+        ttl = self.ttl_s if ttl_s is None else ttl_s
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from src.features.admission import AdmissionController, AdmissionRejected
+
+
+def _ctl(**kw) -> AdmissionController:
+    opts = dict(enabled=True, max_inflight=1, max_per_user=1, max_queue=8, max_queue_per_user=4, queue_timeout_s=0.05)
+    opts.update(kw)
+    return AdmissionController(**opts)
+
+
+def test_queue_timeout_then_release_keeps_cap():
+    async def run():
+        ctl = _ctl()
+        t1 = ctl.enter("u1")
+        assert t1.admitted and ctl.inflight == 1
+
+        t2 = ctl.enter("u2")
+        with pytest.raises(AdmissionRejected):
+            await t2.wait()
+        t2.release()  # what event_gen's finally does
+        assert ctl.inflight == 1 and ctl.per_user == {"u1": 1}
+
+        t3 = ctl.enter("u3")
+        assert not t3.admitted  # u1 still holds the only slot
+        t1.release()
+        await t3.wait()
+        assert ctl.inflight == 1
+        t3.release()
+        assert ctl.inflight == 0 and ctl.queued == 0
+
+    asyncio.run(run())
+
+
+def test_cancel_while_queued_then_release_keeps_cap():
+    async def run():
+        ctl = _ctl(queue_timeout_s=10)
+        t1 = ctl.enter("u1")
+        t2 = ctl.enter("u2")
+        task = asyncio.ensure_future(t2.wait())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        t2.release()
+        assert ctl.inflight == 1 and ctl.queued == 0 and not ctl.waiting
+
+        t1.release()
+        assert ctl.inflight == 0
+
+    asyncio.run(run())
+
+
+def test_grant_in_same_tick_as_abandon_releases_once():
+    async def run():
+        ctl = _ctl(queue_timeout_s=10)
+        t1 = ctl.enter("u1")
+        t2 = ctl.enter("u2")
+        # The slot is granted to u2 in the same tick its wait() gives up
+        # (timeout/cancel), which then abandons the ticket
+        t1.release()
+        assert ctl.inflight == 1 and ctl.per_user == {"u2": 1}
+        ctl._abandon(t2)
+        assert ctl.inflight == 0
+        # event_gen's finally: must not free the handed-on slot a second time
+        t2.release()
+        assert ctl.inflight == 0 and ctl.per_user == {}
+
+        t3 = ctl.enter("u3")
+        t4 = ctl.enter("u4")
+        assert t3.admitted and not t4.admitted
+
+    asyncio.run(run())
+
+
+def test_release_is_idempotent_for_admitted_ticket():
+    async def run():
+        ctl = _ctl()
+        t1 = ctl.enter("u1")
+        t1.release()
+        t1.release()
+        assert ctl.inflight == 0 and ctl.per_user == {}
+
+    asyncio.run(run())
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+from jose import jwk, jwt
+
+from src.auth import entra
+from src.auth.keys import KeyManager
+from src.utils import ttl_cache
+from src.utils.ttl_cache import TTLCache
+
+DISCOVERY = "https://login.example.test/v2.0/.well-known/openid-configuration"
+JWKS_URI = "https://login.example.test/keys"
+ISSUER = "https://login.example.test/tenant/v2.0"
+AUDIENCE = "api://gateway-test"
+
+
+def _keypair(kid: str):
+    priv = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = priv.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    pub = jwk.construct(priv.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo), "RS256").to_dict()
+    pub.update({"kid": kid, "use": "sig"})
+    return pem, pub
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return _keypair("k1"), _keypair("k2")
+
+
+@pytest.fixture
+def idp(monkeypatch, keys):
+    (pem, pub), (_, other) = keys
+    docs = {DISCOVERY: {"issuer": ISSUER, "jwks_uri": JWKS_URI}, JWKS_URI: {"keys": [other, pub]}}
+
+    async def get_json(url):
+        return docs[url]
+
+    claims = TTLCache(maxsize=16, ttl_s=3600)
+    monkeypatch.setattr(entra, "DISCOVERY", DISCOVERY)
+    monkeypatch.setattr(entra, "AUDIENCE", AUDIENCE)
+    monkeypatch.setattr(entra, "CLAIMS", claims)
+    monkeypatch.setattr(entra, "KEYS", KeyManager(DISCOVERY, get_json, on_rotate=claims.clear))
+
+    decodes = []
+    real_decode = jwt.decode
+
+    def decode(token, *args, **kwargs):
+        decodes.append(token)
+        return real_decode(token, *args, **kwargs)
+
+    monkeypatch.setattr(entra.jwt, "decode", decode)
+
+    def sign(sub="u1", ttl_s=3600, kid="k1"):
+        now = int(time.time())
+        claims = {"sub": sub, "iss": ISSUER, "aud": AUDIENCE, "iat": now, "exp": now + ttl_s}
+        return jwt.encode(claims, pem, algorithm="RS256", headers={"kid": kid})
+
+    return SimpleNamespace(sign=sign, decodes=decodes, docs=docs, claims=claims)
+
+
+def test_same_token_is_verified_once(idp):
+    tok = idp.sign()
+
+    async def run():
+        return [await entra.verify_jwt(tok) for _ in range(3)]
+
+    out = asyncio.run(run())
+    assert all(c["sub"] == "u1" for c in out)
+    assert len(idp.decodes) == 1
+    asyncio.run(entra.verify_jwt(idp.sign(sub="u2")))
+    assert len(idp.decodes) == 2  # another token is another entry
+
+
+def test_cached_claims_expire_with_the_token(idp, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: clock[0])
+    short, long_ = idp.sign(ttl_s=60), idp.sign(sub="u2")
+
+    async def both():
+        await entra.verify_jwt(short)
+        await entra.verify_jwt(long_)
+
+    asyncio.run(both())
+    clock[0] += 61
+    asyncio.run(both())
+    assert idp.decodes == [short, long_, short]
+
+
+def test_bad_tokens_are_not_cached(idp):
+    tok = idp.sign(ttl_s=-10)
+    for _ in range(2):
+        with pytest.raises(entra.AuthError, match="token_expired"):
+            asyncio.run(entra.verify_jwt(tok))
+    assert len(idp.decodes) == 2 and len(idp.claims) == 0
+
+
+def test_jwks_rotation_drops_cached_claims(idp, keys):
+    tok = idp.sign()
+
+    async def run():
+        await entra.verify_jwt(tok)
+        assert len(idp.claims) == 1
+        idp.docs[JWKS_URI] = {"keys": [keys[0][1]]}  # k2 retired
+        await entra.KEYS.jwks.refresh()
+        assert len(idp.claims) == 0
+        await entra.verify_jwt(tok)
+
+    asyncio.run(run())
+    assert len(idp.decodes) == 2
+
+
+def test_disabled_cache_verifies_every_call(idp, monkeypatch):
+    monkeypatch.setattr(entra, "CLAIMS", TTLCache(maxsize=0, ttl_s=3600))
+    tok = idp.sign()
+
+    async def run():
+        for _ in range(3):
+            await entra.verify_jwt(tok)
+
+    asyncio.run(run())
+    assert len(idp.decodes) == 3
+
+
+def _request(headers):
+    return SimpleNamespace(headers=headers, state=SimpleNamespace())
+
+
+def test_request_verifies_at_most_once(idp, monkeypatch):
+    calls = []
+    real_verify = entra.verify_jwt
+
+    async def verify(token):
+        calls.append(token)
+        return await real_verify(token)
+
+    monkeypatch.setattr(entra, "verify_jwt", verify)
+    good = _request({"authorization": f"Bearer {idp.sign()}"})
+    bad = _request({"authorization": "Bearer not-a-jwt"})
+
+    async def run():
+        for _ in range(3):
+            assert (await entra.require_user(good))["sub"] == "u1"
+        for _ in range(2):
+            with pytest.raises(HTTPException) as e:
+                await entra.require_user(bad)
+            assert e.value.status_code == 401 and e.value.detail == "invalid_token"
+        with pytest.raises(HTTPException, match="unauthenticated"):
+            await entra.require_user(_request({}))
+
+    asyncio.run(run())
+    assert len(calls) == 2  # one per request, the auth error memoized too
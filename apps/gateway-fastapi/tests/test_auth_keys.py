@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk
+
+from src.auth import keys as keys_mod
+from src.auth.keys import KeyManager, SharedDoc
+
+DISCOVERY = "https://login.example.test/v2.0/.well-known/openid-configuration"
+JWKS_URI = "https://login.example.test/keys"
+
+
+@pytest.fixture(scope="module")
+def public_jwk():
+    priv = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = priv.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    key = jwk.construct(pem, "RS256").to_dict()
+    key.pop("alg", None)  # unpinned, like most Entra keys
+    return key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    # Only this module's clock: the event loop keeps real time
+    monkeypatch.setattr(keys_mod, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+class _Source:
+    """A remote document: counts fetches, can be held open or made to fail."""
+
+    def __init__(self) -> None:
+        self.version = 0
+        self.fetches = 0
+        self.fail = False
+        self.gate: asyncio.Event | None = None
+
+    async def __call__(self):
+        self.fetches += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail:
+            raise RuntimeError("idp down")
+        self.version += 1
+        return {"v": self.version}
+
+
+def _doc(src: _Source) -> SharedDoc:
+    return SharedDoc("doc", src, ttl_s=100, refresh_ahead_s=10, max_stale_s=50, retry_s=5)
+
+
+def test_concurrent_cold_callers_share_one_fetch(clock):
+    src = _Source()
+
+    async def run():
+        src.gate = asyncio.Event()
+        doc = _doc(src)
+        waiting = asyncio.gather(*(doc.get() for _ in range(20)))
+        await asyncio.sleep(0)
+        src.gate.set()
+        return await waiting, doc
+
+    out, doc = asyncio.run(run())
+    assert out == [{"v": 1}] * 20 and src.fetches == 1
+    assert doc.stats()["waits"] == 20
+
+
+def test_stale_value_is_served_while_one_refresh_runs(clock):
+    src = _Source()
+
+    async def run():
+        doc = _doc(src)
+        await doc.get()
+        src.gate = asyncio.Event()
+        clock[0] += 95  # inside the refresh-ahead window
+        assert [await doc.get() for _ in range(5)] == [{"v": 1}] * 5
+        clock[0] += 10  # past the TTL, still within max_stale
+        assert await doc.get() == {"v": 1}
+        src.gate.set()
+        await asyncio.sleep(0.01)
+        return await doc.get(), doc
+
+    value, doc = asyncio.run(run())
+    assert value == {"v": 2} and src.fetches == 2
+    assert doc.stats()["stale_served"] == 1 and doc.stats()["waits"] == 1
+
+
+def test_failed_refresh_keeps_the_old_copy_and_backs_off(clock):
+    src = _Source()
+
+    async def run():
+        doc = _doc(src)
+        await doc.get()
+        src.fail = True
+        clock[0] += 95
+        assert await doc.get() == {"v": 1}
+        await asyncio.sleep(0)
+        assert doc.failures == 1 and 0 < doc.due_in() <= 5
+        assert await doc.get() == {"v": 1}
+        await asyncio.sleep(0)
+        assert src.fetches == 2  # no retry inside OIDC_RETRY_S
+        clock[0] += 5
+        await doc.get()
+        await asyncio.sleep(0)
+        assert src.fetches == 3
+        clock[0] += 100  # now older than ttl + max_stale: callers wait and see the error
+        with pytest.raises(RuntimeError):
+            await doc.get()
+
+    asyncio.run(run())
+
+
+def _jwks(public_jwk, *kids):
+    return {"keys": [dict(public_jwk, kid=k, use="sig") for k in kids]}
+
+
+def _manager(public_jwk, docs, *, rotated=None):
+    fetched = []
+
+    async def get_json(url):
+        fetched.append(url)
+        return docs[url]
+
+    km = KeyManager(DISCOVERY, get_json, min_forced_refresh_s=30, on_rotate=rotated)
+    return km, fetched
+
+
+def test_unknown_kid_forces_a_rate_limited_refetch(clock, public_jwk):
+    docs = {DISCOVERY: {"issuer": "iss", "jwks_uri": JWKS_URI}, JWKS_URI: _jwks(public_jwk, "k1")}
+    rotations = []
+    km, fetched = _manager(public_jwk, docs, rotated=lambda: rotations.append(1))
+
+    async def run():
+        assert await km.key("k1", "RS256") is not None
+        docs[JWKS_URI] = _jwks(public_jwk, "k1", "k2")  # the IdP rotated in a new key
+        assert await km.key("k2", "RS256") is not None
+        # Forged kids: the first forces a refetch only once the window has passed
+        assert await km.key("forged-1", "RS256") is None
+        assert await km.key("forged-2", "RS256") is None
+        clock[0] += 30
+        assert await km.key("forged-3", "RS256") is None
+
+    asyncio.run(run())
+    assert fetched.count(JWKS_URI) == 3 and fetched.count(DISCOVERY) == 1
+    assert km.stats()["forced_refreshes"] == 2
+    assert rotations == [1]
+
+
+def test_key_index_covers_algorithms_and_skips_encryption_keys(public_jwk):
+    docs = {
+        DISCOVERY: {"jwks_uri": JWKS_URI},
+        JWKS_URI: {"keys": [
+            dict(public_jwk, kid="any", use="sig"),
+            dict(public_jwk, kid="pinned", use="sig", alg="RS256"),
+            dict(public_jwk, kid="enc", use="enc"),
+        ]},
+    }
+    km, _ = _manager(public_jwk, docs)
+    asyncio.run(km.jwks.refresh())
+    assert set(km.keys) == {("any", "RS256"), ("any", "RS512"), ("pinned", "RS256")}
+
+
+def test_start_warms_keys_and_refreshes_in_the_background(public_jwk, monkeypatch):
+    docs = {DISCOVERY: {"jwks_uri": JWKS_URI}, JWKS_URI: _jwks(public_jwk, "k1")}
+    km, fetched = _manager(public_jwk, docs)
+    km.discovery.ttl_s = km.jwks.ttl_s = 0.0  # always due: the loop refreshes every tick
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(keys_mod.asyncio, "sleep", lambda s: real_sleep(0.001))
+
+    async def run():
+        await km.start()
+        assert fetched == [DISCOVERY, JWKS_URI] and ("k1", "RS256") in km.keys
+        await real_sleep(0.05)
+        await km.aclose()
+        n = len(fetched)
+        await real_sleep(0.01)
+        return n
+
+    n = asyncio.run(run())
+    assert n > 2 and len(fetched) == n  # refreshed ahead, and stopped on aclose
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from src.features import background
+from src.features.background import _persist_orphan, _skip_chars
+
+
+async def _texts(*chunks: str):
+    for c in chunks:
+        yield c
+
+
+def _collect(n: int, *chunks: str) -> list:
+    async def run():
+        return [t async for t in _skip_chars(_texts(*chunks), n)]
+    return asyncio.run(run())
+
+
+def test_skip_chars_drops_what_the_client_has():
+    assert _collect(0, "ab", "cd") == ["ab", "cd"]
+    assert _collect(3, "ab", "cd", "ef") == ["d", "ef"]
+    assert _collect(4, "ab", "cd") == []
+
+
+def _run(run_id: str, ended_s_ago: float = 60) -> dict:
+    ended = datetime.now(timezone.utc) - timedelta(seconds=ended_s_ago)
+    return {"run_id": run_id, "status": "success", "updated_at": ended.isoformat()}
+
+
+def _patch(monkeypatch, last):
+    written = []
+
+    async def last_message(client, user_id, thread_id):
+        return last
+
+    async def append_transcript(client, user_id, thread_id, msg, *, hold=False):
+        written.append((msg.role, msg.content))
+
+    monkeypatch.setattr(background, "last_message", last_message)
+    monkeypatch.setattr(background, "append_transcript", append_transcript)
+    return written
+
+
+def test_orphan_answer_written_after_waiting_user_turn(monkeypatch):
+    written = _patch(monkeypatch, {"role": "user", "content": "q"})
+    assert asyncio.run(_persist_orphan(None, "u", "t", _run("r1"), "q", "a"))
+    assert written == [("assistant", "a")]
+    # A second GET does nothing
+    assert not asyncio.run(_persist_orphan(None, "u", "t", _run("r1"), "q", "a"))
+    assert written == [("assistant", "a")]
+
+
+def test_orphan_turn_restores_lost_user_turn(monkeypatch):
+    written = _patch(monkeypatch, {"role": "assistant", "content": "previous"})
+    assert asyncio.run(_persist_orphan(None, "u", "t", _run("r2"), "q", "a"))
+    assert written == [("user", "q"), ("assistant", "a")]
+
+
+def test_orphan_skipped_when_answer_present_or_run_just_ended(monkeypatch):
+    written = _patch(monkeypatch, {"role": "assistant", "content": "a"})
+    assert not asyncio.run(_persist_orphan(None, "u", "t", _run("r3"), "q", "a"))
+    written = _patch(monkeypatch, {"role": "user", "content": "q"})
+    assert not asyncio.run(_persist_orphan(None, "u", "t", _run("r4", ended_s_ago=0), "q", "a"))
+    assert written == []
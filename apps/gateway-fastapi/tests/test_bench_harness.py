@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from benchmarks import fake_langgraph
+from benchmarks.loadgen import LoadGen, RouteStats, parse_mix, percentiles
+
+
+def test_percentiles_and_mix():
+    assert percentiles([]) == {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    p = percentiles([float(i) for i in range(100, 0, -1)])
+    assert (p["p50"], p["p95"], p["p99"], p["max"]) == (51.0, 95.0, 99.0, 100.0)
+
+    assert parse_mix("stream=3, threads , messages=0") == [("stream", 3.0), ("threads", 1.0)]
+    with pytest.raises(SystemExit):
+        parse_mix("stream=1,nope=2")
+
+
+def _sse_app() -> FastAPI:
+    app = FastAPI()
+
+    async def frames():
+        yield b"event: queued\ndata: {}\n\n"
+        for tok in ("a", "b", "c"):
+            yield f"data: {tok}\n\n".encode()
+        yield b"event: policy\ndata: no\n\n"
+        yield b"event: done\ndata: [DONE]\n\n"
+
+    @app.post("/api/chat/stream")
+    async def stream():
+        return StreamingResponse(frames(), media_type="text/event-stream")
+
+    @app.post("/api/chat/stream_files")
+    async def busy():
+        return PlainTextResponse("busy", status_code=429)
+
+    @app.get("/api/threads")
+    async def broken():
+        return PlainTextResponse("boom", status_code=500)
+
+    return app
+
+
+def test_loadgen_counts_frames_events_and_errors():
+    async def run():
+        lg = LoadGen("http://gw", concurrency=1, users=1, mix=parse_mix("stream=1,stream_files=1,threads=1"))
+        await lg.http.aclose()
+        lg.http = httpx.AsyncClient(transport=httpx.ASGITransport(app=_sse_app()), base_url="http://gw")
+        try:
+            for route in ("stream", "stream_files", "threads"):
+                await lg.one(route, lg.users[0])
+        finally:
+            await lg.aclose()
+        return lg.report(1.0)
+
+    report = asyncio.run(run())
+    stream = report["routes"]["stream"]
+    assert (stream["frames"], stream["policy_events"], stream["queued"], stream["errors"]) == (3, 1, 1, 0)
+    assert stream["ttft_ms"]["max"] > 0 and stream["itl_ms"]["max"] >= 0
+    assert report["routes"]["stream_files"]["rejected_429"] == 1
+    assert report["routes"]["stream_files"]["errors"] == 0  # admission rejects aren't errors
+    assert report["routes"]["threads"]["errors"] == 1
+    assert report["routes"]["threads"]["error_samples"] == ["500 boom"]
+    assert "ttft_ms" not in report["routes"]["threads"]
+    assert report["totals"]["requests"] == 3 and report["totals"]["errors"] == 1
+
+
+def test_route_stats_keeps_a_few_error_samples():
+    st = RouteStats()
+    for i in range(8):
+        st.error(f"e{i}")
+    assert st.errors == 8 and st.error_samples == ["e0", "e1", "e2", "e3", "e4"]
+
+
+def _events(body: str) -> list:
+    out = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.split("\n"))
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def test_fake_langgraph_streams_tokens_and_checkpoints(monkeypatch):
+    monkeypatch.setattr(fake_langgraph, "TTFT_MS", 0.0)
+    monkeypatch.setattr(fake_langgraph, "TOKENS", 5)
+    monkeypatch.setattr(fake_langgraph, "TOKEN_RATE", 0.0)
+
+    async def run():
+        transport = httpx.ASGITransport(app=fake_langgraph.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://lg") as http:
+            tid = (await http.post("/threads", json={"metadata": {"user_id": "u"}})).json()["thread_id"]
+            body = {"input": {"messages": [{"role": "user", "content": "hi"}]}, "stream_mode": ["messages-tuple"]}
+            r = await http.post(f"/threads/{tid}/runs/stream", json=body)
+            state = (await http.get(f"/threads/{tid}/state")).json()
+            found = (await http.post("/threads/search", json={"metadata": {"user_id": "u"}})).json()
+            return tid, _events(r.text), state, found
+
+    tid, events, state, found = asyncio.run(run())
+    assert events[0][0] == "metadata"
+    chunks = [data[0] for event, data in events[1:] if event == "messages"]
+    assert len(chunks) == 5 and all(c["type"] == "AIMessageChunk" for c in chunks)
+    msgs = state["values"]["messages"]
+    assert [m["type"] for m in msgs] == ["human", "ai"]
+    assert msgs[1]["content"] == "".join(c["content"] for c in chunks)
+    assert [t["thread_id"] for t in found] == [tid]
+
+
+def test_fake_moderation_flags_the_configured_word():
+    async def run():
+        transport = httpx.ASGITransport(app=fake_langgraph.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://lg") as http:
+            r = await http.post("/v1/moderations", json={"model": "m", "input": ["fine", f"a {fake_langgraph.MOD_FLAG_WORD} b"]})
+            return r.json()["results"]
+
+    results = asyncio.run(run())
+    assert [r["flagged"] for r in results] == [False, True]
+    assert results[1]["categories"]["violence"] is True
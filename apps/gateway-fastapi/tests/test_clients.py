@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+from src.features.clients import _CountingTransport
+
+
+def _transport(handler) -> _CountingTransport:
+    t = _CountingTransport(httpx.Limits(max_connections=4))
+    t._inner = httpx.MockTransport(handler)
+    return t
+
+
+def test_streamed_response_counts_until_closed():
+    async def run():
+        t = _transport(lambda req: httpx.Response(200, content=b"x" * 100))
+        async with httpx.AsyncClient(transport=t, base_url="http://lg") as http:
+            async with http.stream("GET", "/runs/stream") as resp:
+                assert t.in_flight == 1
+                async for _ in resp.aiter_bytes():
+                    pass
+            assert t.in_flight == 0
+            await http.get("/threads")
+        assert t.stats() == {"max_connections": 4, "in_flight": 0, "peak_in_flight": 1, "requests": 2}
+
+    asyncio.run(run())
+
+
+def test_failed_request_is_not_left_in_flight():
+    def handler(req):
+        raise httpx.ConnectError("refused", request=req)
+
+    async def run():
+        t = _transport(handler)
+        async with httpx.AsyncClient(transport=t) as http:
+            try:
+                await http.get("http://lg/threads")
+            except httpx.ConnectError:
+                pass
+        assert t.in_flight == 0 and t.requests == 1
+
+    asyncio.run(run())
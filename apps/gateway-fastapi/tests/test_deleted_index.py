@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.features import threads
+
+
+class _FakeStore:
+    def __init__(self, deleted=()) -> None:
+        self.deleted = list(deleted)
+        self.searches: list[tuple] = []
+        self.fail_search = False
+        self.fail_put = False
+
+    async def search_items(self, namespace, *, limit=10, offset=0):
+        self.searches.append((tuple(namespace), offset))
+        if self.fail_search:
+            raise RuntimeError("store down")
+        return {"items": [{"key": k} for k in self.deleted[offset:offset + limit]]}
+
+    async def put_item(self, namespace, *, key, value):
+        if self.fail_put:
+            raise RuntimeError("store down")
+        self.deleted.append(key)
+
+
+@pytest.fixture
+def store():
+    threads.DELETED_INDEX.clear()
+    yield _FakeStore(["a", "b", "c", "d", "e"])
+    threads.DELETED_INDEX.clear()
+
+
+def _ids(client, user="u"):
+    return asyncio.run(threads._deleted_thread_ids(client, user))
+
+
+def test_index_is_one_search_then_cached(store, monkeypatch):
+    monkeypatch.setattr(threads, "DELETED_INDEX_PAGE", 2)
+    client = SimpleNamespace(store=store)
+    assert _ids(client) == {"a", "b", "c", "d", "e"}
+    # A big registry is paged; then lookups are set checks with no store calls
+    assert store.searches == [(("users", "u", "deleted_threads"), o) for o in (0, 2, 4)]
+    assert asyncio.run(threads._is_deleted_in_store(client, "u", "c"))
+    assert not asyncio.run(threads._is_deleted_in_store(client, "u", "z"))
+    assert len(store.searches) == 3
+
+
+def test_marking_a_delete_updates_the_cached_index(store):
+    client = SimpleNamespace(store=store)
+    _ids(client)
+    asyncio.run(threads._mark_deleted_in_store(client, "u", "f"))
+    assert _ids(client) == {"a", "b", "c", "d", "e", "f"}
+    assert len(store.searches) == 1
+
+
+def test_marking_a_delete_for_an_unloaded_user_does_not_seed_the_index(store):
+    client = SimpleNamespace(store=store)
+    asyncio.run(threads._mark_deleted_in_store(client, "u", "f"))
+    # Not cached as {"f"}: the next read loads the whole registry
+    assert _ids(client) == {"a", "b", "c", "d", "e", "f"}
+    assert len(store.searches) == 1
+
+
+def test_failed_mark_drops_the_cached_index(store):
+    client = SimpleNamespace(store=store)
+    _ids(client)
+    store.fail_put = True
+    asyncio.run(threads._mark_deleted_in_store(client, "u", "f"))
+    _ids(client)
+    assert len(store.searches) == 2
+
+
+def test_store_failure_is_not_cached(store):
+    client = SimpleNamespace(store=store)
+    store.fail_search = True
+    assert _ids(client) == frozenset()  # list the threads rather than fail
+    store.fail_search = False
+    assert _ids(client) == {"a", "b", "c", "d", "e"}
+    assert len(store.searches) == 2
+
+
+def test_index_is_per_user(store):
+    client = SimpleNamespace(store=store)
+    _ids(client, "u1")
+    _ids(client, "u2")
+    _ids(client, "u1")
+    assert [ns for ns, _ in store.searches] == [("users", "u1", "deleted_threads"), ("users", "u2", "deleted_threads")]
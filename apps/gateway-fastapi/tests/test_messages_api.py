@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.features import transcript
+from src.features.transcript import TranscriptWriter, _window
+
+
+class _Threads:
+    def __init__(self) -> None:
+        self.threads: dict = {}
+
+    async def get(self, thread_id: str) -> dict:
+        return self.threads[thread_id]
+
+
+class _FakeStore:
+    def __init__(self) -> None:
+        self.items: dict = {}
+        self.gets: list[str] = []
+
+    async def get_item(self, namespace, *, key):
+        self.gets.append(key)
+        value = copy.deepcopy(self.items.get((tuple(namespace), key)))
+        return {"key": key, "value": value} if value is not None else None
+
+    async def put_item(self, namespace, *, key, value):
+        self.items[(tuple(namespace), key)] = copy.deepcopy(value)
+
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setattr(transcript, "TRANSCRIPT_BACKEND", "store")
+    monkeypatch.setattr(transcript, "TRANSCRIPT_PAGE_SIZE", 4)
+    monkeypatch.setattr(transcript, "WRITER", TranscriptWriter(hold_max_s=60))
+    client = SimpleNamespace(threads=_Threads(), store=_FakeStore())
+    tid = uuid.uuid4().hex  # fresh id: ownership lookups are cached per thread
+    client.threads.threads[tid] = {"thread_id": tid, "metadata": {"user_id": "u"}}
+    msgs = [{"role": "user" if i % 2 else "assistant", "content": f"m{i}", "ts": f"t{i:03d}"} for i in range(1, 11)]
+    asyncio.run(transcript._write(client, "u", tid, msgs))  # pages 1-4, 5-8; tail 9-10
+
+    async def get_current_user(request):
+        return {"sub": request.headers.get("x-user", "u")}
+
+    app = FastAPI()
+    app.include_router(transcript.make_transcript_router(client, get_current_user, lambda c: c["sub"]))
+    client.store.gets.clear()
+    return SimpleNamespace(client=client, tid=tid, http=TestClient(app))
+
+
+def _seqs(r) -> list:
+    return [m["seq"] for m in r.json()]
+
+
+def test_window_bounds():
+    assert _window(10, 3, None, None) == (8, 10)
+    assert _window(10, 3, 5, None) == (2, 4)
+    assert _window(10, 3, 2, None) == (1, 1)
+    assert _window(10, 50, None, None) == (1, 10)
+    assert _window(10, 3, None, 4) == (5, 7)
+    assert _window(10, 3, None, 9) == (10, 10)
+    lo, hi = _window(10, 3, 1, None)
+    assert hi < lo  # nothing before the first message
+    lo, hi = _window(10, 3, None, 10)
+    assert hi < lo
+    lo, hi = _window(0, 3, None, None)
+    assert hi < lo
+
+
+def test_newest_first_page_reads_only_the_head(api):
+    r = api.http.get(f"/api/threads/{api.tid}/messages", params={"limit": 2})
+    assert r.status_code == 200
+    assert _seqs(r) == [9, 10]
+    assert r.headers["x-total-count"] == "10" and r.headers["x-before-cursor"] == "9"
+    assert api.client.store.gets == [transcript.HEAD_KEY]
+
+
+def test_before_cursor_walks_back_to_the_start(api):
+    seen, params = [], {"limit": 3}
+    while True:
+        r = api.http.get(f"/api/threads/{api.tid}/messages", params=params)
+        seen = _seqs(r) + seen
+        if "x-before-cursor" not in r.headers:
+            break
+        params = {"limit": 3, "before": r.headers["x-before-cursor"]}
+    assert seen == list(range(1, 11))
+    assert [m["content"] for m in r.json()] == ["m1"]
+
+
+def test_window_fetches_only_overlapping_pages(api):
+    r = api.http.get(f"/api/threads/{api.tid}/messages", params={"limit": 3, "before": 7})
+    assert _seqs(r) == [4, 5, 6]
+    assert sorted(api.client.store.gets) == [transcript.HEAD_KEY, "transcript:p000000", "transcript:p000001"]
+    api.client.store.gets.clear()
+    r = api.http.get(f"/api/threads/{api.tid}/messages", params={"limit": 3, "after": 4})
+    assert _seqs(r) == [5, 6, 7]
+    assert sorted(api.client.store.gets) == [transcript.HEAD_KEY, "transcript:p000001"]
+
+
+def test_bad_requests(api):
+    url = f"/api/threads/{api.tid}/messages"
+    assert api.http.get(url, params={"before": 5, "after": 1}).status_code == 400
+    assert api.http.get(url, headers={"x-user": "someone-else"}).status_code == 404
+    assert _seqs(api.http.get(url, params={"limit": 0})) == [10]  # clamped to 1
+    assert _seqs(api.http.get(url, params={"after": 10})) == []
+
+
+def test_large_pages_are_gzipped(api, monkeypatch):
+    url = f"/api/threads/{api.tid}/messages"
+    r = api.http.get(url, headers={"accept-encoding": "gzip"})
+    assert "content-encoding" not in r.headers  # below MESSAGES_GZIP_MIN_BYTES
+    monkeypatch.setattr(transcript, "MESSAGES_GZIP_MIN_BYTES", 100)
+    r = api.http.get(url, headers={"accept-encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip" and r.headers["vary"] == "Accept-Encoding"
+    assert _seqs(r) == list(range(1, 11))  # decoded transparently by the client
+    r = api.http.get(url, headers={"accept-encoding": "identity"})
+    assert "content-encoding" not in r.headers
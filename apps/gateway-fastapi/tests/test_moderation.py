@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import asyncio
+import uuid
+
+import pytest
+
+from src.utils import ttl_cache
+from src.utils.ttl_cache import TTLCache
+from src.features import moderation
+from src.features.moderation import InputFlagged, gate_stream
+
+
+class _Source:
+    """An upstream run: yields chunks with a delay and records how far it got."""
+
+    def __init__(self, *chunks: str, delay: float = 0.0) -> None:
+        self.chunks = chunks
+        self.delay = delay
+        self.pulled = 0
+        self.closed = False
+
+    async def _gen(self):
+        for c in self.chunks:
+            await asyncio.sleep(self.delay)
+            self.pulled += 1
+            yield c
+
+    def __aiter__(self):
+        self._it = self._gen()
+        return self._it
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+async def _verdict(flagged: bool, after: float) -> bool:
+    await asyncio.sleep(after)
+    return flagged
+
+
+def _run_gate(source: _Source, flagged: bool, after: float):
+    async def run():
+        verdict = asyncio.ensure_future(_verdict(flagged, after))
+        out = []
+        async for chunk in gate_stream(source, verdict):
+            out.append((chunk, verdict.done()))
+        return out
+
+    return asyncio.run(run())
+
+
+def test_gate_holds_chunks_until_a_clean_verdict():
+    src = _Source("a", "b", "c", delay=0.001)
+    out = _run_gate(src, flagged=False, after=0.05)
+    assert [c for c, _ in out] == ["a", "b", "c"]
+    # The run was streaming during moderation, but nothing left before the verdict
+    assert all(done for _, done in out)
+    assert src.closed
+
+
+def test_gate_flagged_closes_the_run_and_releases_nothing():
+    src = _Source("a", "b", "c", "d", delay=0.01)
+    with pytest.raises(InputFlagged):
+        _run_gate(src, flagged=True, after=0.015)
+    assert src.closed and src.pulled < 4
+
+
+def test_gate_passes_through_after_a_fast_verdict():
+    src = _Source("a", "b", delay=0.01)
+    assert [c for c, _ in _run_gate(src, flagged=False, after=0)] == ["a", "b"]
+
+
+def test_input_moderation_fails_open_and_does_not_cache_errors(monkeypatch):
+    calls = []
+
+    async def moderate(text, *, kind, route=""):
+        calls.append(text)
+        return None  # timeout / API error
+
+    monkeypatch.setattr(moderation, "_moderate", moderate)
+    monkeypatch.setattr(moderation, "MOD_ENABLED", True)
+    text = f"hello {uuid.uuid4().hex}"
+
+    async def run():
+        task = moderation.start_input_moderation(text, route="r")
+        assert not task.done()  # runs alongside the caller
+        return await task
+
+    assert asyncio.run(run()) is False
+    assert asyncio.run(run()) is False
+    assert calls == [text, text]
+
+
+def _patch_is_flagged(monkeypatch, answer, delay: float = 0.0):
+    checked = []
+
+    async def is_flagged(text, *, kind="input", route=""):
+        checked.append(text)
+        await asyncio.sleep(delay)
+        return answer(text)
+
+    monkeypatch.setattr(moderation, "is_flagged", is_flagged)
+    monkeypatch.setattr(moderation, "MOD_ENABLED", True)
+    return checked
+
+
+def test_output_windows_overlap_and_tail_is_checked(monkeypatch):
+    checked = _patch_is_flagged(monkeypatch, lambda t: False)
+
+    async def run():
+        mod = moderation.OutputModerator(window=10, overlap=3, concurrency=4)
+        for chunk in ("abcde", "fghij", "klmno", "pqrst", "uv"):
+            mod.feed(chunk)
+            await asyncio.sleep(0)
+        return await mod.finish(), mod.windows_checked
+
+    flagged, windows = asyncio.run(run())
+    assert not flagged and windows == 3
+    # Each window re-sends only the last `overlap` chars of the previous one
+    assert checked == ["abcdefghij", "hijklmnopqrst", "rstuv"]
+
+
+def test_output_backlog_merges_into_the_next_window(monkeypatch):
+    checked = _patch_is_flagged(monkeypatch, lambda t: False, delay=0.01)
+
+    async def run():
+        mod = moderation.OutputModerator(window=2, overlap=0, concurrency=1)
+        for chunk in ("ab", "cd", "ef", "gh"):
+            mod.feed(chunk)  # one check in flight; the rest waits, merged
+        await mod.finish()
+
+    asyncio.run(run())
+    assert checked == ["ab", "cdefgh"]
+
+
+def test_flagged_output_stops_the_run_between_tokens(monkeypatch):
+    _patch_is_flagged(monkeypatch, lambda t: "bad" in t)
+    src = _Source("fine ", "bad ", "more", "even more", delay=0.02)
+
+    async def run():
+        out = []
+        mod = moderation.OutputModerator(window=4, overlap=0)
+        with pytest.raises(moderation.OutputFlagged):
+            async for chunk in mod.watch(src):
+                out.append(chunk)
+        return out
+
+    out = asyncio.run(run())
+    assert out == ["fine ", "bad "]  # the next token never arrived: the run was closed while waiting
+    assert src.closed and src.pulled == 2
+
+
+def _patch_moderate(monkeypatch, answer):
+    calls = []
+
+    async def moderate(text, *, kind, route=""):
+        calls.append(text)
+        return answer(text)
+
+    monkeypatch.setattr(moderation, "_moderate", moderate)
+    monkeypatch.setattr(moderation, "MOD_ENABLED", True)
+    monkeypatch.setattr(moderation, "VERDICTS", TTLCache(maxsize=16, ttl_s=3600))
+    return calls
+
+
+def test_verdict_cache_hits_on_normalized_text(monkeypatch):
+    calls = _patch_moderate(monkeypatch, lambda t: False)
+    flagged = [asyncio.run(moderation.is_flagged(t)) for t in ("hello  world", " hello\nworld ", "hello world")]
+    assert flagged == [False, False, False]
+    assert calls == ["hello  world"]
+    # Keyed by model too: another model's verdicts don't count
+    monkeypatch.setattr(moderation, "MOD_MODEL", "other-model")
+    asyncio.run(moderation.is_flagged("hello world"))
+    assert len(calls) == 2
+
+
+def test_flagged_verdicts_expire_sooner(monkeypatch):
+    calls = _patch_moderate(monkeypatch, lambda t: "bad" in t)
+    monkeypatch.setattr(moderation, "MOD_CACHE_FLAGGED_TTL_S", 300)
+    clock = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: clock[0])
+
+    assert asyncio.run(moderation.is_flagged("bad text")) is True
+    assert asyncio.run(moderation.is_flagged("good text")) is False
+    clock[0] += 301
+    assert asyncio.run(moderation.is_flagged("bad text")) is True
+    assert asyncio.run(moderation.is_flagged("good text")) is False
+    assert calls == ["bad text", "good text", "bad text"]
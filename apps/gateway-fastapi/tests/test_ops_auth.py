@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from prynai_shared.trace import JsonlExporter, RingBuffer, TraceContext, Tracer, read_jsonl
+
+from src.features import metrics, tracing
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(metrics.make_metrics_router())
+    return TestClient(app)
+
+
+def test_metrics_404_without_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", None)
+    monkeypatch.setattr(metrics, "METRICS_PUBLIC", False)
+    assert _client().get("/metrics").status_code == 404
+
+
+def test_metrics_public_opt_in(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", None)
+    monkeypatch.setattr(metrics, "METRICS_PUBLIC", True)
+    assert _client().get("/metrics").status_code == 200
+
+
+def test_metrics_token_required_when_set(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "s3cret")
+    monkeypatch.setattr(metrics, "METRICS_PUBLIC", True)
+    c = _client()
+    assert c.get("/metrics").status_code == 401
+    assert c.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+
+def _traces_client() -> TestClient:
+    app = FastAPI()
+    app.include_router(tracing.make_traces_router())
+    return TestClient(app)
+
+
+def test_traces_need_token_even_when_metrics_public(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", None)
+    monkeypatch.setattr(metrics, "METRICS_PUBLIC", True)
+    c = _traces_client()
+    assert c.get("/debug/traces").status_code == 404
+    assert c.get("/debug/traces/abc").status_code == 404
+
+
+def test_trace_merges_agent_spans_from_file(monkeypatch, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("PRYNAI_TRACE_FILE", str(path))
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "s3cret")
+    gateway = Tracer("gateway", [RingBuffer()])
+    agent = Tracer("agent", [JsonlExporter(str(path))])
+    monkeypatch.setattr(tracing, "TRACER", gateway)
+
+    ctx = TraceContext.new()
+    with gateway.span("agent_run", ctx) as run_ctx:
+        with agent.span("llm", run_ctx):
+            pass
+
+    c = _traces_client()
+    assert c.get(f"/debug/traces/{ctx.trace_id}").status_code == 401
+    r = c.get(f"/debug/traces/{ctx.trace_id}", headers={"Authorization": "Bearer s3cret"})
+    assert r.status_code == 200
+    spans = r.json()["spans"]
+    assert sorted(s["service"] for s in spans) == ["agent", "gateway"]
+    llm = next(s for s in spans if s["service"] == "agent")
+    assert llm["parent_id"] == next(s for s in spans if s["service"] == "gateway")["span_id"]
+
+
+def test_trace_file_rotates_and_stays_readable(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    exp = JsonlExporter(path, max_bytes=2000)
+    assert not (tmp_path / "traces.jsonl").exists()  # opened on the first span
+    tracer = Tracer("agent", [exp])
+    ctx = TraceContext.new()
+    for i in range(60):
+        tracer.record("step", ctx, start=float(i), duration_ms=1.0, i=i)
+
+    sizes = [p.stat().st_size for p in tmp_path.iterdir()]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["traces.jsonl", "traces.jsonl.1"]
+    assert all(n < 2000 + 400 for n in sizes)
+    # The newest spans survive across the rotation, oldest first
+    spans = read_jsonl(path, ctx.trace_id)
+    assert spans[-1]["attrs"]["i"] == 59
+    assert [s["attrs"]["i"] for s in spans] == sorted(s["attrs"]["i"] for s in spans)
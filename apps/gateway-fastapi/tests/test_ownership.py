@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import asyncio
+import uuid
+
+import httpx
+
+from src.features.ownership import THREAD_INFO, thread_info, unowned_thread
+
+
+class _Threads:
+    def __init__(self) -> None:
+        self.threads: dict = {}
+        self.gets = 0
+
+    async def get(self, thread_id: str) -> dict:
+        self.gets += 1
+        t = self.threads.get(thread_id)
+        if t is None:
+            req = httpx.Request("GET", f"http://lg/threads/{thread_id}")
+            raise httpx.HTTPStatusError("not found", request=req, response=httpx.Response(404, request=req))
+        return t
+
+
+class _Client:
+    def __init__(self) -> None:
+        self.threads = _Threads()
+
+
+def _add(client: _Client, thread_id: str, user_id: str) -> None:
+    client.threads.threads[thread_id] = {"thread_id": thread_id, "metadata": {"user_id": user_id}}
+
+
+def test_missing_thread_is_rejected_for_chat():
+    client = _Client()
+    tid = uuid.uuid4().hex
+    assert asyncio.run(unowned_thread(client, tid, "u1")) is True
+
+
+def test_foreign_and_own_threads():
+    client = _Client()
+    mine, theirs = uuid.uuid4().hex, uuid.uuid4().hex
+    _add(client, mine, "u1")
+    _add(client, theirs, "u2")
+    assert asyncio.run(unowned_thread(client, mine, "u1")) is False
+    assert asyncio.run(unowned_thread(client, theirs, "u1")) is True
+
+
+def test_cached_miss_is_rechecked_once_the_thread_exists():
+    client = _Client()
+    tid = uuid.uuid4().hex
+    assert asyncio.run(thread_info(client, tid)) is None
+    assert THREAD_INFO.get(tid) is None  # negative entry cached
+
+    _add(client, tid, "u1")  # created meanwhile (e.g. on another replica)
+    assert asyncio.run(thread_info(client, tid)) is None  # plain lookups trust the cache
+    assert asyncio.run(unowned_thread(client, tid, "u1")) is False
+    assert THREAD_INFO.get(tid).owner == "u1"
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+
+from src.features.replay import ReplayRegistry
+
+
+def _live_bytes(reg: ReplayRegistry) -> int:
+    return sum(s.nbytes for s in reg.streams.values())
+
+
+def test_evicted_live_stream_stops_counting():
+    async def run():
+        reg = ReplayRegistry(enabled=True, grace_s=10, ttl_s=300, max_bytes=100)
+        gate = asyncio.Event()
+
+        async def frames(n: int):
+            for _ in range(n):
+                yield b"data: " + b"x" * 34 + b"\n\n"  # ~50 bytes with the id line
+                await gate.wait()
+
+        a = reg.start(frames(10), user_id="u1")
+        await asyncio.sleep(0)
+        b = reg.start(frames(10), user_id="u2")
+        await asyncio.sleep(0)
+        c = reg.start(frames(10), user_id="u3")
+        await asyncio.sleep(0)
+        # Over budget: the oldest live stream was dropped
+        assert a.evicted and a.stream_id not in reg.streams
+        assert reg.nbytes == _live_bytes(reg)
+
+        # The evicted stream keeps pumping for its attached readers
+        gate.set()
+        for _ in range(20):
+            await asyncio.sleep(0)
+        assert a.done and len(a.frames) == 10
+        assert reg.nbytes == _live_bytes(reg)
+        assert reg.nbytes <= reg.max_bytes
+
+        for s in (a, b, c):
+            await s._pump
+        assert reg.nbytes == _live_bytes(reg)
+
+        # Later streams are still resumable (an inflated counter evicted them at once)
+        d = reg.start(frames(1), user_id="u4")
+        await d._pump
+        assert reg.get(d.stream_id, "u4") is d
+        assert reg.nbytes == _live_bytes(reg)
+
+    asyncio.run(run())
+
+
+def test_finished_streams_expire_and_keep_counter_exact():
+    async def run():
+        reg = ReplayRegistry(enabled=True, grace_s=10, ttl_s=0, max_bytes=10_000)
+
+        async def frames(n: int):
+            for i in range(n):
+                yield b"data: %d\n\n" % i
+
+        s = reg.start(frames(5), user_id="u1")
+        await s._pump
+        assert reg.get(s.stream_id, "u1") is None
+        assert reg.nbytes == 0 and not reg.streams
+
+    asyncio.run(run())
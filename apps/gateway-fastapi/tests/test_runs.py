@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+from src.features.runs import ACTIVE_RUNS, AgentRun
+
+
+class _Runs:
+    def __init__(self, gate: asyncio.Event) -> None:
+        self.gate = gate
+
+    async def stream(self, *args, **kwargs):
+        yield SimpleNamespace(event="metadata", data={"run_id": "r1"})
+        await self.gate.wait()  # the first token is slow
+        yield SimpleNamespace(event="messages", data=[{"content": "hi"}, {}])
+
+
+def test_run_announced_before_first_token():
+    async def run():
+        gate = asyncio.Event()
+        agent = AgentRun(
+            SimpleNamespace(runs=_Runs(gate)), "chat",
+            user_id="u1", thread_id="t1", input={}, config={},
+        )
+        events = agent.announced(agent.text(lambda m: m["content"]))
+        first = await asyncio.wait_for(events.__anext__(), 1)
+        assert first == ("run", "r1")
+        assert ACTIVE_RUNS["r1"] == ("u1", "t1")
+        gate.set()
+        assert [e async for e in events] == [("text", "hi")]
+        assert "r1" not in ACTIVE_RUNS
+
+    asyncio.run(run())
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from src.features import sse
+from src.features.sse import CoalesceStats, coalesce
+
+
+async def _tokens(*items, fail: bool = False):
+    # str: a token; float: a pause (seconds) before the next one
+    for it in items:
+        if isinstance(it, float):
+            await asyncio.sleep(it)
+        else:
+            yield it
+    if fail:
+        raise RuntimeError("upstream broke")
+
+
+def _collect(source, **kwargs):
+    async def run():
+        stats = CoalesceStats()
+        out = [chunk async for chunk in coalesce(source, stats=stats, **kwargs)]
+        return out, stats
+
+    return asyncio.run(run())
+
+
+def test_first_token_alone_then_a_burst_in_one_frame():
+    out, stats = _collect(_tokens("Hel", "lo", ",", " wor", "ld"), interval_ms=50)
+    assert out == ["Hel", "lo, world"]
+    assert (stats.chunks_in, stats.frames_out, stats.frames_saved) == (5, 2, 3)
+    assert stats.bytes_saved == 3 * sse.SSE_FRAME_OVERHEAD
+
+
+def test_frames_flush_on_size_and_on_interval():
+    out, _ = _collect(_tokens("a", "bb", "cc", "dd", "e"), max_bytes=4, interval_ms=1000)
+    assert out == ["a", "bbcc", "dde"]
+
+    out, _ = _collect(_tokens("a", "b", "c", 0.05, "d"), interval_ms=10)
+    assert out == ["a", "bc", "d"]  # the pause outlived the window: "bc" went out without waiting for "d"
+
+
+def test_buffered_text_goes_out_before_an_upstream_error():
+    async def run():
+        got = []
+        with pytest.raises(RuntimeError):
+            async for chunk in coalesce(_tokens("a", "b", "c", fail=True), interval_ms=1000):
+                got.append(chunk)
+        return got
+
+    assert asyncio.run(run()) == ["a", "bc"]
+
+
+def test_disabled_passes_every_chunk_through(monkeypatch):
+    monkeypatch.setattr(sse, "SSE_COALESCE_ENABLED", False)
+    out, stats = _collect(_tokens("a", "b", "c"))
+    assert out == ["a", "b", "c"] and stats.frames_saved == 0
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from src.features.store_cache import StoreCache, with_cached_store
+
+
+class _FakeStore:
+    def __init__(self) -> None:
+        self.items: dict = {}
+        self.calls: list[tuple] = []
+        self.fail_puts = False
+
+    async def get_item(self, namespace, *, key):
+        self.calls.append(("get", tuple(namespace), key))
+        if (tuple(namespace), key) not in self.items:
+            req = httpx.Request("GET", "http://lg/store/items")
+            raise httpx.HTTPStatusError("not found", request=req, response=httpx.Response(404, request=req))
+        return {"key": key, "value": self.items[(tuple(namespace), key)]}
+
+    async def put_item(self, namespace, *, key, value, index=None):
+        self.calls.append(("put", tuple(namespace), key))
+        if self.fail_puts:
+            raise RuntimeError("store down")
+        self.items[(tuple(namespace), key)] = value
+
+    async def delete_item(self, namespace, *, key):
+        self.calls.append(("delete", tuple(namespace), key))
+        self.items.pop((tuple(namespace), key), None)
+
+    async def search_items(self, namespace, **kwargs):
+        self.calls.append(("search", tuple(namespace)))
+        return {"items": []}
+
+
+def _setup():
+    raw = _FakeStore()
+    client = with_cached_store(SimpleNamespace(store=raw, threads="threads"), StoreCache())
+    return raw, client
+
+
+def _gets(raw) -> int:
+    return sum(1 for c in raw.calls if c[0] == "get")
+
+
+def test_profile_reads_are_served_from_cache():
+    async def run():
+        raw, client = _setup()
+        raw.items[(("users", "u1"), "profile")] = {"name": "A"}
+        a = await client.store.get_item(["users", "u1"], key="profile")
+        b = await client.store.get_item(["users", "u1"], key="profile")
+        assert a["value"] == b["value"] == {"name": "A"}
+        assert _gets(raw) == 1
+        assert client.threads == "threads"  # everything else is the real client
+        assert (await client.store.search_items(["users", "u1"])) == {"items": []}
+
+    asyncio.run(run())
+
+
+def test_not_found_is_none_and_remembered():
+    async def run():
+        raw, client = _setup()
+        assert await client.store.get_item(["users", "u2"], key="profile") is None
+        assert await client.store.get_item(["users", "u2"], key="profile") is None
+        assert _gets(raw) == 1
+        assert client.store.stats()["profile"]["negative_hits"] == 1
+
+    asyncio.run(run())
+
+
+def test_writes_update_the_cache():
+    async def run():
+        raw, client = _setup()
+        assert await client.store.get_item(["users", "u3"], key="profile") is None
+        await client.store.put_item(["users", "u3"], key="profile", value={"name": "B"})
+        got = await client.store.get_item(["users", "u3"], key="profile")
+        assert got["value"] == {"name": "B"} and _gets(raw) == 1
+
+        await client.store.delete_item(["users", "u3"], key="profile")
+        assert await client.store.get_item(["users", "u3"], key="profile") is None
+        assert _gets(raw) == 2
+
+    asyncio.run(run())
+
+
+def test_failed_write_leaves_no_stale_value():
+    async def run():
+        raw, client = _setup()
+        raw.items[(("users", "u4"), "profile")] = {"name": "old"}
+        await client.store.get_item(["users", "u4"], key="profile")
+        raw.fail_puts = True
+        with pytest.raises(RuntimeError):
+            await client.store.put_item(["users", "u4"], key="profile", value={"name": "new"})
+        await client.store.get_item(["users", "u4"], key="profile")
+        assert _gets(raw) == 2  # re-read from the store, not the cached old value
+
+    asyncio.run(run())
+
+
+def test_transcript_items_are_never_cached():
+    async def run():
+        raw, client = _setup()
+        raw.items[(("threads", "u", "t"), "transcript:head")] = {"seq": 1}
+        for _ in range(2):
+            await client.store.get_item(["threads", "u", "t"], key="transcript:head")
+        assert _gets(raw) == 2
+
+    asyncio.run(run())
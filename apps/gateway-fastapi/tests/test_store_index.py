@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.features import store_index
+from src.features.store_cache import StoreCache, with_cached_store
+from src.features.store_index import IndexCounters, index_for, record_put, resolve_index
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    c = IndexCounters()
+    monkeypatch.setattr(store_index, "INDEX_COUNTERS", c)
+    return c
+
+
+def test_policy_per_namespace_family():
+    assert index_for(["users", "u"], "profile") is False
+    assert index_for(["users", "u", "deleted_threads"], "t1") is False
+    assert index_for(["threads", "u", "t"], "transcript:head") is False
+    assert index_for(["users", "u", "memories", "facts"], "m1") == ["text"]
+    # Anything unlisted keeps the deployment default
+    assert index_for(["users", "u"], "settings") is None
+    assert index_for(["threads", "u", "t"], "transcript") is None
+    assert index_for(["threads", "u"], "transcript:head") is None
+
+
+def test_explicit_index_wins():
+    assert resolve_index(["users", "u"], "profile", ["name"]) == ["name"]
+    assert resolve_index(["users", "u"], "profile", None) is False
+
+
+def test_unindexed_writes_cost_no_embeddings(counters):
+    record_put(["users", "u"], "profile", {"name": "A", "text": "x" * 400}, False)
+    record_put(["threads", "u", "t"], "transcript:head", {"tail": [{"content": "hi"}]}, False)
+    stats = store_index.store_index_stats()
+    assert stats["profile"] == {"puts": 1, "embeddings": 0, "tokens": 0}
+    assert stats["transcript_head"] == {"puts": 1, "embeddings": 0, "tokens": 0}
+
+
+def test_embedded_texts_and_tokens_are_counted(counters, monkeypatch):
+    record_put(["users", "u", "memories", "facts"], "m1", {"text": "x" * 10, "kind": "fact"}, ["text"])
+    page = {"messages": [{"content": "a" * 8}, {"content": "b" * 9}, {"content": ""}]}
+    record_put(["threads", "u", "t"], "transcript:p000000", page, ["messages[*].content"])
+    # No explicit index: the deployment's default fields apply
+    monkeypatch.setattr(store_index, "STORE_INDEX_DEFAULT_FIELDS", ["$"])
+    record_put(["misc"], "k", {"a": 1}, None)
+    stats = counters.stats()
+    assert stats["memories"] == {"puts": 1, "embeddings": 1, "tokens": 3}
+    assert stats["transcript_page"] == {"puts": 1, "embeddings": 2, "tokens": 5}
+    assert stats["other"] == {"puts": 1, "embeddings": 1, "tokens": 2}
+
+
+class _RawStore:
+    def __init__(self) -> None:
+        self.puts: list[tuple] = []
+
+    async def put_item(self, namespace, *, key, value, index=None):
+        self.puts.append((tuple(namespace), key, index))
+
+
+def test_gateway_writes_carry_the_policy(counters):
+    raw = _RawStore()
+    client = with_cached_store(SimpleNamespace(store=raw), StoreCache())
+
+    async def run():
+        await client.store.put_item(["users", "u"], key="profile", value={"name": "A"})
+        await client.store.put_item(["users", "u", "deleted_threads"], key="t1", value={"thread_id": "t1"})
+        await client.store.put_item(["users", "u", "memories", "facts"], key="m1", value={"text": "likes tea"})
+
+    asyncio.run(run())
+    assert [index for _, _, index in raw.puts] == [False, False, ["text"]]
+    assert {fam: s["embeddings"] for fam, s in counters.stats().items()} == {
+        "profile": 0, "deleted_threads": 0, "memories": 1,
+    }
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from prynai_shared.streaming import DONE_FRAME, chunk_to_text, sse_data, sse_event
+
+
+def _parse(frame: bytes) -> tuple:
+    # What an EventSource client sees: data lines joined with "\n"
+    assert frame.endswith(b"\n\n")
+    event, data = "message", []
+    for line in frame.decode("utf-8")[:-2].split("\n"):
+        field, _, value = line.partition(": ")
+        if field == "event":
+            event = value
+        else:
+            assert field == "data"
+            data.append(value)
+    return event, "\n".join(data)
+
+
+def test_chunk_to_text_shapes():
+    assert chunk_to_text("tok") == "tok"
+    assert chunk_to_text({"type": "AIMessageChunk", "content": "tok"}) == "tok"
+    # Responses-API content blocks, one or several
+    assert chunk_to_text({"content": [{"type": "text", "text": "a"}]}) == "a"
+    assert chunk_to_text({"content": [{"text": "a"}, {"type": "reasoning"}, {"output_text": "b"}]}) == "ab"
+    assert chunk_to_text(SimpleNamespace(content="obj")) == "obj"
+    assert chunk_to_text(SimpleNamespace(content=[SimpleNamespace(text="x"), {"text": "y"}])) == "xy"
+    assert chunk_to_text({"delta": {"content": "d"}}) == "d"
+    assert chunk_to_text({"delta": "d2"}) == "d2"
+    assert chunk_to_text({"messages": [{"content": "old"}, {"content": "new"}]}) == "new"
+    assert chunk_to_text({"tool_calls": []}) == ""
+    assert chunk_to_text(None) == ""
+
+
+def test_sse_data_single_and_multi_line():
+    assert sse_data("hello") == b"data: hello\n\n"
+    assert sse_data("a\nb") == b"data: a\ndata: b\n\n"
+    assert _parse(sse_data("a\n\nb\n")) == ("message", "a\n\nb\n")
+    assert sse_data("") == b"data: \n\n"
+
+
+def test_sse_data_normalizes_carriage_returns():
+    assert sse_data("a\r\nb") == b"data: a\ndata: b\n\n"
+    assert sse_data("a\rb") == b"data: a\ndata: b\n\n"
+    assert _parse(sse_data("x\r\n\ry\r")) == ("message", "x\n\ny\n")
+    # A raw "\r" would end the field early for the client
+    assert b"\r" not in sse_data("\r\r\n")
+
+
+def test_sse_event_frames():
+    assert sse_event("policy", "no") == b"event: policy\ndata: no\n\n"
+    assert _parse(sse_event("error", "line1\r\nline2")) == ("error", "line1\nline2")
+    assert sse_data("é").decode("utf-8") == "data: é\n\n"
+    assert _parse(DONE_FRAME) == ("done", "[DONE]")
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.features import threads
+
+
+class _FakeThreads:
+    def __init__(self, n: int) -> None:
+        self.calls: list[str] = []
+        self.items = [
+            {"thread_id": f"t{i:03d}", "updated_at": f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}", "metadata": {"user_id": "u"}}
+            for i in range(n)
+        ]
+
+    async def search(self, *, metadata, sort_by=None, sort_order=None, limit=10, offset=0):
+        self.calls.append("search")
+        rows = sorted(self.items, key=threads._sort_key, reverse=True)
+        return [dict(t) for t in rows[offset:offset + limit]]
+
+    async def count(self, *, metadata):
+        self.calls.append("count")
+        return len(self.items)
+
+
+class _FakeStore:
+    def __init__(self, deleted=()) -> None:
+        self.deleted = list(deleted)
+        self.calls = 0
+
+    async def search_items(self, namespace, *, limit=10, offset=0):
+        self.calls += 1
+        return {"items": [{"key": k} for k in self.deleted[offset:offset + limit]]}
+
+
+def _setup(n: int, deleted=()):
+    threads.DELETED_INDEX.clear()
+    client = SimpleNamespace(threads=_FakeThreads(n), store=_FakeStore(deleted))
+
+    async def get_current_user(request):
+        return {"sub": "u"}
+
+    app = FastAPI()
+    app.include_router(threads.make_threads_router(client, get_current_user, lambda c: c["sub"]))
+    return client, TestClient(app)
+
+
+def _all_pages(http, limit: int) -> list[str]:
+    seen, cursor = [], None
+    while True:
+        r = http.get("/api/threads", params={"limit": limit, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200
+        seen += [t["thread_id"] for t in r.json()]
+        cursor = r.headers.get("x-next-cursor")
+        if not cursor:
+            return seen
+
+
+def test_cursor_pages_cover_every_live_thread_once():
+    client, http = _setup(45, deleted=["t044", "t030", "t031"])
+    seen = _all_pages(http, limit=7)
+    expected = [f"t{i:03d}" for i in range(44, -1, -1) if i not in (44, 30, 31)]
+    assert seen == expected
+    assert client.store.calls == 1  # deleted-set loaded once, then cached
+
+
+def test_cursor_skips_threads_bumped_since_the_previous_page():
+    client, http = _setup(20)
+    r = http.get("/api/threads", params={"limit": 5})
+    first = [t["thread_id"] for t in r.json()]
+    # A thread from a later page gets new activity and moves to the top
+    client.threads.items[3]["updated_at"] = "2026-02-01T00:00:00"
+    r2 = http.get("/api/threads", params={"limit": 5, "cursor": r.headers["x-next-cursor"]})
+    second = [t["thread_id"] for t in r2.json()]
+    assert first == ["t019", "t018", "t017", "t016", "t015"]
+    assert second == ["t014", "t013", "t012", "t011", "t010"]
+
+
+def test_bad_cursor_is_400():
+    _, http = _setup(3)
+    assert http.get("/api/threads", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_etag_304_until_the_page_changes():
+    client, http = _setup(10)
+    r = http.get("/api/threads", params={"limit": 5})
+    etag = r.headers["etag"]
+    assert client.threads.calls == ["search"]  # no extra calls for the validator
+
+    r304 = http.get("/api/threads", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert r304.status_code == 304 and r304.content == b""
+    assert r304.headers["etag"] == etag
+
+    client.threads.items[9]["metadata"]["title"] = "renamed"
+    r2 = http.get("/api/threads", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert r2.status_code == 200 and r2.headers["etag"] != etag
+    assert "count" not in client.threads.calls
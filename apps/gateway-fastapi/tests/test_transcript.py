@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+from types import SimpleNamespace
+
+from src.features import transcript
+from src.features.transcript import TranscriptMessage, TranscriptWriter, _read_window
+
+
+class _FakeStore:
+    def __init__(self) -> None:
+        self.items: dict = {}
+        self.gets: list[str] = []
+        self.stall: asyncio.Event | None = None  # holds the next head read
+
+    async def get_item(self, namespace, *, key):
+        self.gets.append(key)
+        value = copy.deepcopy(self.items.get((tuple(namespace), key)))
+        if key == transcript.HEAD_KEY and self.stall is not None:
+            gate, self.stall = self.stall, None
+            await gate.wait()  # returns what the head was when the read started
+        return {"key": key, "value": value} if value is not None else None
+
+    async def put_item(self, namespace, *, key, value):
+        self.items[(tuple(namespace), key)] = copy.deepcopy(value)
+
+
+def _client() -> SimpleNamespace:
+    return SimpleNamespace(store=_FakeStore())
+
+
+def _contents(msgs) -> list:
+    return [(m["seq"], m["content"]) for m in msgs]
+
+
+def test_reader_does_not_block_flush_and_stays_consistent(monkeypatch):
+    async def run():
+        monkeypatch.setattr(transcript, "WRITER", TranscriptWriter(hold_max_s=60))
+        client = _client()
+        w = transcript.WRITER
+        await w.append(client, "u", "t", TranscriptMessage(role="user", content="q1"))
+        await w.append(client, "u", "t", TranscriptMessage(role="user", content="q2"), hold=True)
+
+        gate = asyncio.Event()
+        client.store.stall = gate
+        reader = asyncio.create_task(_read_window(client, "u", "t", limit=10))
+        await asyncio.sleep(0)
+
+        # The stalled read holds no lock: the flush lands at once
+        await asyncio.wait_for(
+            w.append(client, "u", "t", TranscriptMessage(role="assistant", content="a2")), timeout=1)
+        assert w.pending(("u", "t")) == []
+
+        gate.set()
+        msgs, total = await reader
+        # The pre-flush head was discarded and read again: q2 neither lost nor doubled
+        assert _contents(msgs) == [(1, "q1"), (2, "q2"), (3, "a2")]
+        assert total == 3
+        assert w.read_retries == 1
+
+    asyncio.run(run())
+
+
+def test_reader_sees_held_turn_as_newest(monkeypatch):
+    async def run():
+        monkeypatch.setattr(transcript, "WRITER", TranscriptWriter(hold_max_s=60))
+        client = _client()
+        await transcript.WRITER.append(client, "u", "t", TranscriptMessage(role="user", content="q1"))
+        await transcript.WRITER.append(client, "u", "t", TranscriptMessage(role="user", content="q2"), hold=True)
+        msgs, total = await _read_window(client, "u", "t", limit=10)
+        assert _contents(msgs) == [(1, "q1"), (2, "q2")]
+        assert total == 2
+        assert transcript.WRITER.read_retries == 0
+
+    asyncio.run(run())
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from src.features import moderation, transcript_checkpoint as tc
+from src.features.metrics import MODERATION_FLAGS
+
+
+class _Threads:
+    def __init__(self, msgs: list, cid: str) -> None:
+        self.msgs = msgs
+        self.cid = cid
+        self.calls = 0
+
+    async def get_state(self, thread_id: str) -> dict:
+        self.calls += 1
+        await asyncio.sleep(0)
+        return {"values": {"messages": self.msgs}, "checkpoint": {"checkpoint_id": self.cid}}
+
+
+def _client(*texts: str):
+    msgs = [
+        {"type": "human" if i % 2 == 0 else "ai", "content": t, "id": f"m{i}-{uuid.uuid4().hex[:6]}"}
+        for i, t in enumerate(texts)
+    ]
+    return SimpleNamespace(threads=_Threads(msgs, uuid.uuid4().hex))
+
+
+def _patch_verdicts(monkeypatch, answer):
+    calls = []
+
+    async def verdicts(texts, *, kind, route=""):
+        calls.append((list(texts), kind))
+        await asyncio.sleep(0)
+        return [answer(t) for t in texts]
+
+    monkeypatch.setattr(tc, "verdicts", verdicts)
+    monkeypatch.setattr(tc, "MOD_ENABLED", True)
+    return calls
+
+
+def _newest(n: int, before=None):
+    def window(total):
+        hi = total if before is None else min(total, before - 1)
+        return max(1, hi - n + 1), hi
+    return window
+
+
+def _read(client, tid, window):
+    return asyncio.run(tc.thread_window(client, tid, window))
+
+
+def test_only_the_requested_window_is_moderated(monkeypatch):
+    calls = _patch_verdicts(monkeypatch, lambda t: False)
+    client = _client(*(f"msg {i}" for i in range(100)))
+    tid = uuid.uuid4().hex
+
+    msgs, total = _read(client, tid, _newest(10))
+    assert total == 100 and [m["seq"] for m in msgs] == list(range(91, 101))
+    assert calls == [([f"msg {i}" for i in range(90, 100)], "transcript")]
+    assert all("_vkey" not in m for m in msgs)
+
+    # The next page back checks its own messages only; a re-read checks nothing
+    _read(client, tid, _newest(10, before=91))
+    _read(client, tid, _newest(10))
+    assert calls[1] == ([f"msg {i}" for i in range(80, 90)], "transcript")
+    assert len(calls) == 2 and client.threads.calls == 1
+
+
+def test_flagged_replaced_and_verdicts_survive_a_new_checkpoint(monkeypatch):
+    calls = _patch_verdicts(monkeypatch, lambda t: "bad" in t)
+    client = _client("hello", "a bad answer", "thanks")
+    tid = uuid.uuid4().hex
+
+    msgs, _ = _read(client, tid, _newest(10))
+    assert [m.get("flagged", False) for m in msgs] == [False, True, False]
+    assert msgs[1]["content"] == tc.OUTPUT_BLOCKED_MESSAGE
+
+    # A new turn: same messages plus two, under a new checkpoint
+    client.threads.msgs += [{"type": "human", "content": "more", "id": "n1"}, {"type": "ai", "content": "ok", "id": "n2"}]
+    client.threads.cid = uuid.uuid4().hex
+    tc.forget_thread_view(tid)
+    msgs, total = _read(client, tid, _newest(10))
+    assert total == 5 and msgs[1]["flagged"]
+    assert calls[1] == (["more", "ok"], "transcript")
+
+
+def test_unverified_messages_are_hidden_and_rechecked(monkeypatch):
+    calls = _patch_verdicts(monkeypatch, lambda t: None)
+    client = _client("hello", "answer")
+    tid = uuid.uuid4().hex
+
+    msgs, _ = _read(client, tid, _newest(10))
+    assert all(m["unverified"] and m["content"] == tc.UNVERIFIED_MESSAGE for m in msgs)
+    _read(client, tid, _newest(10))
+    assert len(calls) == 2  # no verdict was cached
+
+
+def test_concurrent_reads_share_checks(monkeypatch):
+    calls = _patch_verdicts(monkeypatch, lambda t: False)
+    client = _client("hello", "answer")
+    tid = uuid.uuid4().hex
+    _read(client, tid, lambda total: (1, 0))  # warm the projection only
+    assert calls == []
+
+    async def run():
+        return await asyncio.gather(*(tc.thread_window(client, tid, _newest(10)) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r == results[0] for r in results)
+
+
+def test_verdicts_batches_misses_and_counts_own_kind(monkeypatch):
+    sent = []
+
+    async def moderate_batch(texts, *, kind, route=""):
+        sent.append(list(texts))
+        return ["bad" in t for t in texts]
+
+    monkeypatch.setattr(moderation, "_moderate_batch", moderate_batch)
+    monkeypatch.setattr(moderation, "MOD_ENABLED", True)
+    monkeypatch.setattr(moderation, "MOD_BATCH_SIZE", 2)
+    tag = uuid.uuid4().hex
+    texts = [f"{tag} one", f"{tag} bad", f"{tag} one", f"{tag} three", ""]
+    before = MODERATION_FLAGS.labels("r", "transcript").value
+
+    out = asyncio.run(moderation.verdicts(texts, kind="transcript", route="r"))
+    assert out == [False, True, False, False, False]
+    assert sent == [[f"{tag} one", f"{tag} bad"], [f"{tag} three"]]  # duplicates and blanks not sent
+    assert MODERATION_FLAGS.labels("r", "transcript").value == before + 1
+    assert MODERATION_FLAGS.labels("r", "input").value == 0
+
+    # Cached now: no further calls
+    asyncio.run(moderation.verdicts(texts, kind="transcript", route="r"))
+    assert len(sent) == 2
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+from types import SimpleNamespace
+
+import pytest
+
+from src.features import transcript
+from src.features.transcript import TranscriptMessage, TranscriptWriter, _get_transcript
+
+
+class _FakeStore:
+    def __init__(self) -> None:
+        self.items: dict = {}
+        self.puts: list[str] = []
+
+    async def get_item(self, namespace, *, key):
+        value = copy.deepcopy(self.items.get((tuple(namespace), key)))
+        return {"key": key, "value": value} if value is not None else None
+
+    async def put_item(self, namespace, *, key, value):
+        await asyncio.sleep(0)  # let racing appends interleave
+        self.puts.append(key)
+        self.items[(tuple(namespace), key)] = copy.deepcopy(value)
+
+    def get(self, key):
+        return self.items.get((("threads", "u", "t"), key))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(transcript, "TRANSCRIPT_BACKEND", "store")
+    monkeypatch.setattr(transcript, "TRANSCRIPT_PAGE_SIZE", 4)
+    monkeypatch.setattr(transcript, "WRITER", TranscriptWriter(hold_max_s=60))
+    return SimpleNamespace(store=_FakeStore())
+
+
+def _append(client, *contents):
+    async def run():
+        for c in contents:
+            await transcript.append_transcript(client, "u", "t", TranscriptMessage(role="user", content=c))
+
+    asyncio.run(run())
+
+
+def test_full_tails_are_sealed_into_pages(client):
+    _append(client, *(f"m{i}" for i in range(1, 11)))
+    head = client.store.get(transcript.HEAD_KEY)
+    assert (head["pages"], head["seq"], head["page_size"]) == (2, 10, 4)
+    assert [m["content"] for m in head["tail"]] == ["m9", "m10"]
+    assert [m["seq"] for m in client.store.get("transcript:p000001")["messages"]] == [5, 6, 7, 8]
+    # One head write per append, and each page written once, when it fills
+    assert client.store.puts.count(transcript.HEAD_KEY) == 10
+    assert sorted(k for k in client.store.puts if k != transcript.HEAD_KEY) == ["transcript:p000000", "transcript:p000001"]
+    msgs = asyncio.run(_get_transcript(client, "u", "t"))
+    assert [(m["seq"], m["content"]) for m in msgs] == [(i, f"m{i}") for i in range(1, 11)]
+
+
+def test_append_cost_does_not_grow_with_the_thread(client):
+    _append(client, *(f"m{i}" for i in range(200)))
+    client.store.puts.clear()
+    _append(client, "late")
+    # The head holds at most one page of messages: nothing else is rewritten
+    assert client.store.puts == [transcript.HEAD_KEY]
+    assert len(client.store.get(transcript.HEAD_KEY)["tail"]) < 4
+
+
+def test_racing_appends_keep_every_message(client):
+    async def run():
+        await asyncio.gather(*(
+            transcript.append_transcript(client, "u", "t", TranscriptMessage(role="user", content=f"m{i}"))
+            for i in range(25)
+        ))
+        return await _get_transcript(client, "u", "t")
+
+    msgs = asyncio.run(run())
+    assert sorted(m["content"] for m in msgs) == sorted(f"m{i}" for i in range(25))
+    assert [m["seq"] for m in msgs] == list(range(1, 26))
+
+
+def test_legacy_transcript_is_read_then_migrated_on_append(client):
+    legacy = [
+        {"role": "assistant", "content": "a1", "ts": "2026-01-01T00:00:02"},
+        {"role": "user", "content": "q1", "ts": "2026-01-01T00:00:01"},
+        {"role": "user", "content": "q2", "ts": "2026-01-01T00:00:03"},
+        {"role": "assistant", "content": "a2", "ts": "2026-01-01T00:00:04"},
+        {"role": "user", "content": "q3", "ts": "2026-01-01T00:00:05"},
+    ]
+    client.store.items[(("threads", "u", "t"), transcript.LEGACY_KEY)] = {"messages": legacy}
+
+    before = asyncio.run(_get_transcript(client, "u", "t"))
+    assert [(m["seq"], m["content"]) for m in before] == [(1, "q1"), (2, "a1"), (3, "q2"), (4, "a2"), (5, "q3")]
+    assert client.store.puts == []  # reading never migrates
+
+    _append(client, "a3")
+    head = client.store.get(transcript.HEAD_KEY)
+    assert (head["pages"], head["seq"]) == (1, 6)
+    assert [m["content"] for m in client.store.get("transcript:p000000")["messages"]] == ["q1", "a1", "q2", "a2"]
+    after = asyncio.run(_get_transcript(client, "u", "t"))
+    assert [m["content"] for m in after] == ["q1", "a1", "q2", "a2", "q3", "a3"]
+    assert client.store.get(transcript.LEGACY_KEY) == {"messages": legacy}  # left in place
+
+
+def test_held_user_turn_is_written_with_the_answer(client):
+    async def run():
+        await transcript.append_transcript(client, "u", "t", TranscriptMessage(role="user", content="q"), hold=True)
+        assert client.store.puts == []
+        await transcript.append_transcript(client, "u", "t", TranscriptMessage(role="assistant", content="a"))
+
+    asyncio.run(run())
+    assert client.store.puts == [transcript.HEAD_KEY]
+    assert [m["content"] for m in client.store.get(transcript.HEAD_KEY)["tail"]] == ["q", "a"]
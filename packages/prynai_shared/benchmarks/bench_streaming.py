@@ -0,0 +1,139 @@
+"""
+Microbenchmark: prynai_shared.streaming vs the helpers it replaced.
+
+The legacy functions below are verbatim copies of what apps/gateway-fastapi
+used to carry (in main.py and again inside make_uploads_router). Each case is
+a stream shaped like what the gateway actually receives in messages-tuple mode:
+
+  - ai_str      AIMessageChunk objects with str content (Chat Completions models)
+  - ai_blocks   AIMessageChunk objects with one Responses-API content block
+  - dict_str    the SDK's dict form of a message chunk, str content
+  - dict_blocks the SDK's dict form, list-of-blocks content
+  - multiline   str chunks containing newlines (SSE multi-'data:' path)
+
+Run:  python packages/prynai_shared/benchmarks/bench_streaming.py [--number N]
+Prints one JSON object; outputs of old and new are checked for equality first.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from typing import Any
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from prynai_shared.streaming import chunk_to_text, sse_data  # noqa: E402
+
+
+# ---- Legacy implementations (gateway main.py before the move) ---------------
+
+def _blocks_to_text(blocks: Any) -> str:
+    if isinstance(blocks, str):
+        return blocks
+    if isinstance(blocks, list):
+        parts: list[str] = []
+        for b in blocks:
+            if isinstance(b, dict):
+                t = b.get("text") or b.get("input_text") or b.get("output_text")
+            else:
+                t = getattr(b, "text", None)
+            if t:
+                parts.append(t)
+        return "".join(parts)
+    return ""
+
+
+def _chunk_to_text(chunk: Any) -> str:
+    c = getattr(chunk, "content", None)
+    if c is not None:
+        return _blocks_to_text(c)
+    if isinstance(chunk, dict):
+        if "content" in chunk:
+            return _blocks_to_text(chunk["content"])
+        if "delta" in chunk:
+            d = chunk["delta"]
+            if isinstance(d, dict):
+                return _blocks_to_text(d.get("content") or d.get("text") or d)
+            return _blocks_to_text(d)
+        if "messages" in chunk and chunk["messages"]:
+            m = chunk["messages"][-1]
+            if isinstance(m, dict):
+                return _blocks_to_text(m.get("content", m))
+            return _blocks_to_text(getattr(m, "content", m))
+    if isinstance(chunk, str):
+        return chunk
+    return ""
+
+
+def _sse_event_from_text(text: str) -> bytes:
+    t = text.replace("\r\n", "\n").replace("\r", "\n")
+    payload = "data: " + t.replace("\n", "\ndata: ")
+    return (payload + "\n\n").encode("utf-8")
+
+
+# ---- Recorded-shape streams -------------------------------------------------
+
+class AIMessageChunk:
+    """Stand-in with the attributes the extractors look at."""
+
+    __slots__ = ("content", "id", "type")
+
+    def __init__(self, content: Any) -> None:
+        self.content = content
+        self.id = "run-0"
+        self.type = "AIMessageChunk"
+
+
+_TOKENS = ["Hello", ",", " I", "'m", " Pryn", "AI", ".", " Here", " is", " what", " I", " found", ":", " ñ", " ✓"] * 40
+
+
+def _streams() -> dict[str, list[Any]]:
+    return {
+        "ai_str": [AIMessageChunk(t) for t in _TOKENS],
+        "ai_blocks": [AIMessageChunk([{"type": "text", "text": t, "index": 0}]) for t in _TOKENS],
+        "dict_str": [{"type": "AIMessageChunk", "content": t, "id": "run-0"} for t in _TOKENS],
+        "dict_blocks": [{"type": "AIMessageChunk", "content": [{"type": "output_text", "output_text": t}]} for t in _TOKENS],
+        "multiline": [t + ("\n" if i % 5 == 0 else "") + ("line2\r\n" if i % 17 == 0 else "") for i, t in enumerate(_TOKENS)],
+    }
+
+
+def _pipeline(stream: list[Any], to_text, to_sse) -> list[bytes]:
+    out = []
+    for c in stream:
+        t = to_text(c)
+        if t:
+            out.append(to_sse(t))
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--number", type=int, default=200, help="passes over each stream per repeat")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    results: dict[str, Any] = {"chunks_per_stream": len(_TOKENS), "number": args.number, "cases": {}}
+    for name, stream in _streams().items():
+        old = _pipeline(stream, _chunk_to_text, _sse_event_from_text)
+        new = _pipeline(stream, chunk_to_text, sse_data)
+        assert old == new, f"output mismatch in {name}"
+
+        def best(fn) -> float:
+            return min(timeit.repeat(fn, number=args.number, repeat=args.repeat)) / (args.number * len(stream))
+
+        t_old = best(lambda: _pipeline(stream, _chunk_to_text, _sse_event_from_text))
+        t_new = best(lambda: _pipeline(stream, chunk_to_text, sse_data))
+        results["cases"][name] = {
+            "legacy_ns_per_chunk": round(t_old * 1e9, 1),
+            "shared_ns_per_chunk": round(t_new * 1e9, 1),
+            "speedup": round(t_old / t_new, 2),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
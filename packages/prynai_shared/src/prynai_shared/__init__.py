@@ -1,5 +1,7 @@
 __all__ = ["trace_id"]
+
+
 def trace_id() -> str:
-    # simple placeholder until we thread a real trace header
-    import uuid
-    return f"trace-{uuid.uuid4()}"
\ No newline at end of file
+    """A fresh trace id (same format as prynai_shared.trace.new_trace_id)."""
+    from prynai_shared.trace import new_trace_id
+    return new_trace_id()
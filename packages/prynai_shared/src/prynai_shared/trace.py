@@ -0,0 +1,358 @@
+"""
+Collector-free distributed tracing shared by the gateway and the agent.
+
+- A trace is one user turn: the gateway starts it per chat request, records a span
+  per pre-stream stage, and hands (trace_id, parent span id) to the agent through
+  config["configurable"] (see TraceContext.to_configurable / from_configurable).
+- The agent records its own spans (memory search, LLM call, memory writes) as
+  children of that parent, so both halves of a slow turn show up under one id.
+- Finished spans go to a Tracer's exporters: an in-memory RingBuffer (queryable by
+  trace id, bounded by trace count) and/or an append-only JSONL file.
+
+Configured from env by tracer_from_env():
+  PRYNAI_TRACE_EXPORT   "ring" | "jsonl" | "ring,jsonl" | "off"
+                        (default per service: "ring" for the gateway, "jsonl" for
+                        the agent, whose process has no endpoint to read a ring from)
+  PRYNAI_TRACE_FILE     JSONL path (default $TMPDIR/prynai-traces.jsonl)
+  PRYNAI_TRACE_FILE_MAX_BYTES  rotate the file past this size (default 32 MiB); one
+                        previous generation is kept as <path>.1, so a trace
+                        file never takes more than about twice this on disk
+  PRYNAI_TRACE_MAX_TRACES  ring buffer size in traces (default 1000)
+
+Joining the two halves: the trace id is the join key. The gateway sends it in
+X-Trace-Id, logs it in chat_stages, and passes it to the agent, whose spans carry
+the same trace_id, parented under the gateway's agent run span. With both
+processes on one PRYNAI_TRACE_FILE (local runs, a shared volume), the gateway's
+GET /debug/traces/{trace_id} merges that file with its ring buffer, and
+
+  python -m prynai_shared.trace <trace_id> [--file PATH]
+
+prints the whole turn as an indented span tree. Where the agent runs on separate
+hosts, collect its JSONL file with the gateway's and filter both by trace_id.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import secrets
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Protocol
+
+__all__ = [
+    "new_trace_id",
+    "new_span_id",
+    "Span",
+    "TraceContext",
+    "RingBuffer",
+    "JsonlExporter",
+    "Tracer",
+    "tracer_from_env",
+    "trace_file_path",
+    "read_jsonl",
+    "format_tree",
+]
+
+# configurable keys carried from the gateway into the agent run
+CONFIG_TRACE_ID = "trace_id"
+CONFIG_PARENT_SPAN_ID = "parent_span_id"
+
+MAX_SPANS_PER_TRACE = 512
+
+
+def new_trace_id() -> str:
+    # 128-bit, W3C traceparent compatible
+    return secrets.token_hex(16)
+
+
+def new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    name: str
+    service: str
+    parent_id: Optional[str] = None
+    start: float = 0.0         # epoch seconds
+    duration_ms: float = 0.0
+    status: str = "ok"         # "ok" | "error"
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": self.service,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attrs": self.attrs,
+        }
+
+
+@dataclass(frozen=True)
+class TraceContext:
+    """Where new spans attach: a trace id plus the span that will be their parent."""
+
+    trace_id: str
+    span_id: Optional[str] = None
+
+    @classmethod
+    def new(cls) -> "TraceContext":
+        return cls(new_trace_id(), None)
+
+    def child(self) -> "TraceContext":
+        """Context for a span that hasn't been recorded yet (its id is fixed now)."""
+        return TraceContext(self.trace_id, new_span_id())
+
+    def to_configurable(self) -> Dict[str, str]:
+        out = {CONFIG_TRACE_ID: self.trace_id}
+        if self.span_id:
+            out[CONFIG_PARENT_SPAN_ID] = self.span_id
+        return out
+
+    @classmethod
+    def from_configurable(cls, cfg: Optional[Mapping[str, Any]]) -> Optional["TraceContext"]:
+        tid = (cfg or {}).get(CONFIG_TRACE_ID)
+        if not tid:
+            return None
+        return cls(str(tid), (cfg or {}).get(CONFIG_PARENT_SPAN_ID) or None)
+
+
+# ---- Exporters ---------------------------------------------------------------
+
+class Exporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+
+class RingBuffer:
+    """Last `max_traces` traces in memory; get(trace_id) returns their spans by start time."""
+
+    def __init__(self, max_traces: int = 1000) -> None:
+        self.max_traces = max(1, max_traces)
+        self._traces: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()  # agent nodes may run in worker threads
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            spans = self._traces.get(span.trace_id)
+            if spans is None:
+                spans = self._traces[span.trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            if len(spans) < MAX_SPANS_PER_TRACE:
+                spans.append(span.to_dict())
+
+    def get(self, trace_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            spans = list(self._traces.get(trace_id, ()))
+        return sorted(spans, key=lambda s: s["start"])
+
+    def recent(self, limit: int = 20) -> List[str]:
+        with self._lock:
+            return list(self._traces)[-limit:][::-1]
+
+
+class JsonlExporter:
+    """
+    Appends one JSON object per span; safe to share the file between processes.
+    Past `max_bytes` the file is renamed to <path>.1 (replacing the previous one)
+    and a new one is started. The file is opened on the first span, not at import.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.path = path
+        self.max_bytes = max(1, max_bytes)
+        self._lock = threading.Lock()
+        self._f = None
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), separators=(",", ":"), default=str) + "\n"
+        with self._lock:
+            if self._f is None:
+                # Line-buffered O_APPEND: one write() per span keeps lines whole across processes
+                self._f = open(self.path, "a", encoding="utf-8", buffering=1)
+            else:
+                st = os.fstat(self._f.fileno())
+                if st.st_size >= self.max_bytes or self._moved(st):
+                    self._rotate()
+            self._f.write(line)
+
+    def _moved(self, st: os.stat_result) -> bool:
+        # Rotated by another process: our handle now points at <path>.1
+        try:
+            return os.stat(self.path).st_ino != st.st_ino
+        except OSError:
+            return True
+
+    def _rotate(self) -> None:
+        # Another process sharing the file may have rotated it already (path gone
+        # or replaced): then just reopen instead of rotating its fresh file away
+        self._f.close()
+        try:
+            if os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+        except OSError:
+            pass
+        self._f = open(self.path, "a", encoding="utf-8", buffering=1)
+
+
+def read_jsonl(path: str, trace_id: str) -> List[Dict[str, Any]]:
+    """Spans of one trace from `path` and its rotated generation (<path>.1)."""
+    spans = []
+    for p in (path + ".1", path):
+        try:
+            f = open(p, encoding="utf-8")
+        except FileNotFoundError:
+            continue
+        with f:
+            for line in f:
+                if trace_id in line:
+                    try:
+                        s = json.loads(line)
+                    except ValueError:
+                        continue
+                    if s.get("trace_id") == trace_id:
+                        spans.append(s)
+    return sorted(spans, key=lambda s: s["start"])
+
+
+# ---- Tracer ------------------------------------------------------------------
+
+class Tracer:
+    def __init__(self, service: str, exporters: Optional[List[Exporter]] = None) -> None:
+        self.service = service
+        self.exporters: List[Exporter] = list(exporters or [])
+        self.ring: Optional[RingBuffer] = next((e for e in self.exporters if isinstance(e, RingBuffer)), None)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def record(
+        self,
+        name: str,
+        ctx: Optional[TraceContext],
+        *,
+        start: float,
+        duration_ms: float,
+        span_id: Optional[str] = None,
+        status: str = "ok",
+        **attrs: Any,
+    ) -> Optional[str]:
+        """
+        Export a span measured elsewhere (start = epoch seconds). It becomes a child
+        of ctx.span_id; pass span_id to record a span whose id was handed out earlier.
+        """
+        if ctx is None or not self.exporters:
+            return None
+        span = Span(
+            trace_id=ctx.trace_id,
+            span_id=span_id or new_span_id(),
+            parent_id=ctx.span_id,
+            name=name,
+            service=self.service,
+            start=start,
+            duration_ms=duration_ms,
+            status=status,
+            attrs={k: v for k, v in attrs.items() if v is not None},
+        )
+        for exp in self.exporters:
+            try:
+                exp.export(span)
+            except Exception as e:  # tracing must never break a request
+                print(json.dumps({"type": "trace_export_error", "err": str(e)}), file=sys.stderr, flush=True)
+        return span.span_id
+
+    @contextmanager
+    def span(self, name: str, ctx: Optional[TraceContext], **attrs: Any) -> Iterator[Optional[TraceContext]]:
+        """
+        Time the block as a child of `ctx`; yields the context for nested spans
+        (None when ctx is None, so untraced callers pay nothing).
+        """
+        if ctx is None or not self.exporters:
+            yield None
+            return
+        inner = ctx.child()
+        wall, t0 = time.time(), time.perf_counter()
+        status = "ok"
+        try:
+            yield inner
+        except BaseException as e:
+            status = "error"
+            attrs.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            self.record(
+                name, ctx, start=wall, duration_ms=(time.perf_counter() - t0) * 1000.0,
+                span_id=inner.span_id, status=status, **attrs,
+            )
+
+    def get(self, trace_id: str) -> List[Dict[str, Any]]:
+        return self.ring.get(trace_id) if self.ring is not None else []
+
+
+def trace_file_path() -> str:
+    return os.getenv("PRYNAI_TRACE_FILE") or os.path.join(tempfile.gettempdir(), "prynai-traces.jsonl")
+
+
+def tracer_from_env(service: str, default_export: str = "ring") -> Tracer:
+    """Exporters from PRYNAI_TRACE_EXPORT, or `default_export` when it is unset."""
+    modes = {m.strip() for m in os.getenv("PRYNAI_TRACE_EXPORT", default_export).lower().split(",") if m.strip()}
+    exporters: List[Exporter] = []
+    if "off" not in modes:
+        if "ring" in modes:
+            exporters.append(RingBuffer(int(os.getenv("PRYNAI_TRACE_MAX_TRACES", "1000"))))
+        if "jsonl" in modes:
+            max_bytes = int(os.getenv("PRYNAI_TRACE_FILE_MAX_BYTES", str(32 * 1024 * 1024)))
+            exporters.append(JsonlExporter(trace_file_path(), max_bytes))
+    return Tracer(service, exporters)
+
+
+# ---- CLI ---------------------------------------------------------------------
+
+def format_tree(spans: List[Dict[str, Any]]) -> str:
+    """Indented span tree, children under their parent, ordered by start time."""
+    if not spans:
+        return "(no spans)"
+    ids = {s["span_id"] for s in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for s in spans:
+        parent = s.get("parent_id") if s.get("parent_id") in ids else None
+        children.setdefault(parent, []).append(s)
+    t0 = min(s["start"] for s in spans)
+    lines: List[str] = []
+
+    def walk(parent: Optional[str], depth: int) -> None:
+        for s in sorted(children.get(parent, ()), key=lambda s: s["start"]):
+            offset = (s["start"] - t0) * 1000.0
+            flag = " !" if s.get("status") == "error" else ""
+            lines.append(
+                f"{offset:9.1f}ms {s['duration_ms']:9.1f}ms  {'  ' * depth}{s['service']}:{s['name']}{flag}"
+            )
+            walk(s["span_id"], depth + 1)
+
+    walk(None, 0)
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Print one trace from a PRYNAI_TRACE_FILE as a span tree.")
+    ap.add_argument("trace_id")
+    ap.add_argument("--file", default=trace_file_path())
+    args = ap.parse_args()
+    print("   offset   duration  span")
+    print(format_tree(read_jsonl(args.file, args.trace_id)))